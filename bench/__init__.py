@@ -0,0 +1,7 @@
+"""
+性能基准测试套件（离线运行，不访问真实上游）。
+
+    python -m bench.hotpaths   各热点路径的隔离基准
+    python -m bench.load       端到端负载测试（HTTP + WebSocket 并发客户端）
+    python -m bench.compare    比较两次结果，检测性能回退
+"""
@@ -0,0 +1,364 @@
+"""
+基准测试公共部分：合成数据集、本地假上游、计时与结果输出。
+
+monitor 在导入时即加载状态，因此必须先通过 import_monitor() 把配置文件与数据目录指向临时目录
+（TAO_MONITOR_CONFIG / TAO_MONITOR_DATA_DIR）、把上游 API 指向本地假上游（TAOSTATS_API_BASE / CMC_API_BASE 等），再导入。
+"""
+
+import asyncio
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+RAO_PER_TAO = 1_000_000_000
+
+
+# ---------------------------------------------------------------------------
+# 合成数据集
+# ---------------------------------------------------------------------------
+def synthetic_history(years: float, interval: int, seed: int = 1, end_ts: int | None = None) -> list[tuple[int, int]]:
+    """生成 years 年、间隔 interval 秒的 (epoch 秒, price_rao) 随机游走序列，时间升序"""
+    rnd = random.Random(seed)
+    end_ts = end_ts or int(time.time())
+    n = int(years * 365 * 86400 // interval)
+    price = 500.0
+    points = []
+    for i in range(n):
+        price = min(5000.0, max(1.0, price * (1 + rnd.gauss(0, 0.01))))
+        points.append((end_ts - (n - i) * interval, int(price * RAO_PER_TAO)))
+    return points
+
+
+def synthetic_subnets(n: int, seed: int = 1) -> list[dict[str, Any]]:
+    """生成 n 个与 Taostats subnet/latest 字段相近的子网记录"""
+    rnd = random.Random(seed)
+    return [
+        {
+            "netuid": netuid,
+            "name": f"SN{netuid}",
+            "registration_timestamp": datetime.fromtimestamp(
+                1_700_000_000 + netuid * 86400, timezone.utc
+            ).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "registration_cost": str(rnd.randint(100, 5000) * RAO_PER_TAO),
+            "emission": str(rnd.randint(0, 10**9)),
+            "active_keys": rnd.randint(0, 256),
+            "active_validators": rnd.randint(0, 64),
+            "active_miners": rnd.randint(0, 192),
+            "neuron_registration_cost": str(rnd.randint(1, 10**10)),
+            "recycled_24_hours": str(rnd.randint(0, 10**12)),
+        }
+        for netuid in range(1, n + 1)
+    ]
+
+
+def synthetic_thresholds(n: int, seed: int = 1) -> list[dict[str, Any]]:
+    rnd = random.Random(seed)
+    return [
+        {"price_tao": round(rnd.uniform(1, 5000), 2), "type": rnd.choice(["above", "below"]), "label": f"t{i}"}
+        for i in range(n)
+    ]
+
+
+def iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+# ---------------------------------------------------------------------------
+# 本地假上游（Taostats + CoinMarketCap）
+# ---------------------------------------------------------------------------
+class FakeUpstream:
+    """
+    模拟 Taostats stats / subnet / stats-history 与 CoinMarketCap 报价接口。
+
+    价格每次请求随机游走；new_subnet_every > 0 时每隔若干次子网请求新增一个子网。
+    既可作为 httpx.MockTransport 在进程内使用，也可用 uvicorn 在本地端口上提供服务。
+    """
+
+    def __init__(
+        self,
+        history: list[tuple[int, int]],
+        subnets: list[dict[str, Any]],
+        latency: float = 0.0,
+        new_subnet_every: int = 0,
+        seed: int = 1,
+    ) -> None:
+        self.history = history
+        self.subnets = list(subnets)
+        self.latency = latency
+        self.new_subnet_every = new_subnet_every
+        self.rnd = random.Random(seed)
+        self.price_rao = history[-1][1] if history else 500 * RAO_PER_TAO
+        self.requests = 0
+        self._subnet_calls = 0
+
+    def handle(self, path: str, params: dict[str, str]) -> tuple[int, Any]:
+        self.requests += 1
+        if path.endswith("/api/stats/latest/v1"):
+            self.price_rao = max(RAO_PER_TAO, int(self.price_rao * (1 + self.rnd.gauss(0, 0.005))))
+            return 200, {"data": [{"subnet_registration_cost": str(self.price_rao), "subnets": len(self.subnets)}]}
+        if path.endswith("/api/subnet/latest/v1"):
+            self._subnet_calls += 1
+            if self.new_subnet_every and self._subnet_calls % self.new_subnet_every == 0:
+                self.subnets.append(synthetic_subnets(len(self.subnets) + 1, seed=self._subnet_calls)[-1])
+            return 200, {"data": self.subnets}
+        if path.endswith("/api/stats/history/v1"):
+            return 200, self._history_page(params)
+        if path.endswith("/v1/cryptocurrency/quotes/latest"):
+            return 200, {"data": {"TAO": {"quote": {"USD": {"price": 400 + self.rnd.uniform(-5, 5)}}}}}
+        if path.endswith("/api/v3/simple/price"):
+            return 200, {"bittensor": {"usd": 400 + self.rnd.uniform(-5, 5)}}
+        if path.endswith("/api/v3/ticker/price"):
+            return 200, {"symbol": "TAOUSDT", "price": f"{400 + self.rnd.uniform(-5, 5):.2f}"}
+        return 404, {"error": "not found"}
+
+    def _history_page(self, params: dict[str, str]) -> dict[str, Any]:
+        rows = self.history
+        if "timestamp_start" in params:
+            start = int(params["timestamp_start"])
+            rows = [r for r in rows if r[0] >= start]
+        if params.get("order", "timestamp_desc") == "timestamp_desc":
+            rows = rows[::-1]
+        limit = int(params.get("limit", 200))
+        page = int(params.get("page", 1))
+        total_pages = max(1, -(-len(rows) // limit))
+        data = [
+            {"timestamp": iso(ts), "subnet_registration_cost": str(rao)}
+            for ts, rao in rows[(page - 1) * limit:page * limit]
+        ]
+        return {"pagination": {"current_page": page, "total_pages": total_pages}, "data": data}
+
+    def mock_transport(self) -> httpx.MockTransport:
+        def handler(request: httpx.Request) -> httpx.Response:
+            status, body = self.handle(request.url.path, dict(request.url.params))
+            return httpx.Response(status, json=body)
+
+        return httpx.MockTransport(handler)
+
+    def asgi_app(self) -> Starlette:
+        async def endpoint(request: Request) -> JSONResponse:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            status, body = self.handle(request.url.path, dict(request.query_params))
+            return JSONResponse(body, status_code=status)
+
+        return Starlette(routes=[Route("/{path:path}", endpoint)])
+
+
+class ServerThread:
+    """在后台线程中运行 uvicorn（用于假上游）"""
+
+    def __init__(self, app: Any, port: int) -> None:
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_http(url: str, proc: subprocess.Popen, timeout: float, interval: float = 0.05) -> float:
+    """轮询 url 直到返回 200，返回等待耗时（秒）；进程提前退出或超时则抛出异常"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"monitor 进程提前退出，返回码 {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    raise TimeoutError(f"{url} 在 {timeout} 秒内未就绪")
+
+
+# ---------------------------------------------------------------------------
+# monitor 的隔离导入与测试数据写入
+# ---------------------------------------------------------------------------
+def monitor_env(data_dir: Path, upstream_url: str = "http://127.0.0.1:9") -> dict[str, str]:
+    """
+    指向临时数据目录与本地假上游的环境变量（默认上游地址不可达，保证不会访问外网）。
+    配置文件也放在临时数据目录中，基准测试不会读取或改写仓库里真实的 config.json。
+    """
+    return {
+        "TAO_MONITOR_CONFIG": str(data_dir / "config.json"),
+        "TAO_MONITOR_DATA_DIR": str(data_dir),
+        "TAOSTATS_API_BASE": upstream_url,
+        "CMC_API_BASE": upstream_url,
+        "COINGECKO_API_BASE": upstream_url,
+        "BINANCE_API_BASE": upstream_url,
+    }
+
+
+def import_monitor(data_dir: Path, upstream_url: str = "http://127.0.0.1:9") -> ModuleType:
+    os.environ.update(monitor_env(data_dir, upstream_url))
+    if str(REPO_DIR) not in sys.path:
+        sys.path.insert(0, str(REPO_DIR))
+    return importlib.import_module("monitor")
+
+
+def write_dataset(
+    data_dir: Path,
+    history: list[tuple[int, int]],
+    live_days: float,
+    live_interval: int = 30,
+    seed: int = 1,
+) -> None:
+    """
+    在 data_dir 中写入 monitor 的磁盘格式：Taostats 历史二进制缓存、同步元数据，
+    以及 live_days 天、间隔 live_interval 秒的本地价格历史快照。
+    在子进程中执行，避免在当前进程导入 monitor。
+    """
+    data_dir.mkdir(parents=True, exist_ok=True)
+    live = synthetic_history(live_days / 365, live_interval, seed=seed)
+    script = (
+        "import json, sys\n"
+        "from datetime import datetime, timezone\n"
+        "import monitor as m\n"
+        "hist, live = json.load(sys.stdin)\n"
+        "series = m.HistoricalSeries.from_points(map(tuple, hist))\n"
+        "m._atomic_write_bytes(m.HISTORICAL_CACHE_PATH, series.to_bytes())\n"
+        "m._atomic_write_text(m.HISTORICAL_CACHE_META_PATH, json.dumps({\n"
+        "    'high_water': series.times[-1] if series.times else None, 'count': len(series),\n"
+        "    'last_sync': datetime.now(timezone.utc).isoformat(), 'complete': True}))\n"
+        "m._save_history(m.HistoryData(price_history=[\n"
+        "    m.PriceRecord(timestamp=datetime.fromtimestamp(ts, timezone.utc).isoformat(),\n"
+        "                  price_rao=rao, price_tao=round(rao / m.RAO_PER_TAO, 4), subnet_count=128)\n"
+        "    for ts, rao in live]))\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        input=json.dumps([history, live]),
+        text=True,
+        cwd=REPO_DIR,
+        env={**os.environ, **monitor_env(data_dir)},
+        check=True,
+        capture_output=True,
+    )
+
+
+# ---------------------------------------------------------------------------
+# 计时与结果
+# ---------------------------------------------------------------------------
+def summarize(samples: list[float], **extra: Any) -> dict[str, Any]:
+    """把一组耗时（秒）汇总为统计量"""
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+        "unit": "s",
+        **extra,
+    }
+
+
+def measure(
+    fn: Callable[[], Any],
+    repeat: int,
+    setup: Callable[[], Any] | None = None,
+    **extra: Any,
+) -> dict[str, Any]:
+    """执行 fn repeat 次（每次之前执行不计时的 setup），返回统计量"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, **extra)
+
+
+async def ameasure(
+    fn: Callable[[], Awaitable[Any]],
+    repeat: int,
+    setup: Callable[[], Any] | None = None,
+    **extra: Any,
+) -> dict[str, Any]:
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples, **extra)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def write_results(suite: str, params: dict[str, Any], results: dict[str, Any], output: str | None) -> Path:
+    """写出机器可读的结果（JSON），默认为 bench/results/<suite>-<时间>.json"""
+    doc = {
+        "suite": suite,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        # 可选加速依赖是否可用，影响编码与压缩相关的结果
+        "accelerators": {name: importlib.util.find_spec(name) is not None for name in ("orjson", "brotli")},
+        "params": params,
+        "results": results,
+    }
+    if output:
+        path = Path(output)
+    else:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = RESULTS_DIR / f"{suite}-{stamp}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(doc, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return path
+
+
+def print_results(results: dict[str, Any]) -> None:
+    for name, r in results.items():
+        if "median" in r:
+            print(f"{name:<32} median {r['median'] * 1000:10.3f} ms   p95 {r['p95'] * 1000:10.3f} ms   runs {r['runs']}")
+        else:
+            print(f"{name:<32} {json.dumps(r, ensure_ascii=False)}")
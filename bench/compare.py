@@ -0,0 +1,60 @@
+"""
+比较两次基准测试结果，发现回归。
+
+    python -m bench.compare bench/results/hotpaths-旧.json bench/results/hotpaths-新.json --threshold 0.10
+
+逐项比较两份结果中都存在的中位数（median）；新结果比基线慢超过 threshold（相对值）时
+标记为回归，存在回归则以返回码 1 退出，便于在 CI 中使用。
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+
+def load(path: str) -> dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def compare(base: dict[str, Any], head: dict[str, Any], threshold: float) -> tuple[list[tuple], list[str]]:
+    """返回 [(名称, 基线中位数, 新中位数, 相对变化)] 与回归项名称列表"""
+    rows, regressions = [], []
+    for name, old in base["results"].items():
+        new = head["results"].get(name)
+        if not new or "median" not in old or "median" not in new or old["median"] <= 0:
+            continue
+        change = new["median"] / old["median"] - 1
+        rows.append((name, old["median"], new["median"], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="比较两次基准测试结果")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="视为回归的相对变慢幅度")
+    args = parser.parse_args()
+
+    base, head = load(args.baseline), load(args.candidate)
+    if base.get("suite") != head.get("suite"):
+        print(f"警告：套件不同（{base.get('suite')} vs {head.get('suite')}）", file=sys.stderr)
+    params = [{k: v for k, v in doc.get("params", {}).items() if k != "output"} for doc in (base, head)]
+    if params[0] != params[1]:
+        print("警告：两次运行的参数不同，结果可能不可比", file=sys.stderr)
+
+    rows, regressions = compare(base, head, args.threshold)
+    for name, old, new, change in rows:
+        flag = "  <-- 回归" if name in regressions else ""
+        print(f"{name:<32} {old * 1000:10.3f} ms -> {new * 1000:10.3f} ms  {change:+7.1%}{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} 项回归超过 {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\n无超过 {args.threshold:.0%} 的回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+热点路径的隔离基准测试（进程内，离线）。
+
+    python -m bench.hotpaths --years 3 --subnets 256 --thresholds 5000 --ws-clients 1000
+
+覆盖：冷启动（导入 monitor、后台加载磁盘数据）、K 线构建、/api/kline、/api/history 与当前数据接口、
+WebSocket 广播扇出、_trim_history、告警评估、_poll_once（进程内假上游）、主来源缓慢时的
+TAO/USD 价格获取（对冲请求 vs 单一来源）与 history.json 快照写入。
+结果写入 bench/results/hotpaths-<时间>.json（或 --output 指定的路径）。
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import httpx
+
+from bench.common import (
+    REPO_DIR,
+    FakeUpstream,
+    ameasure,
+    import_monitor,
+    measure,
+    monitor_env,
+    print_results,
+    summarize,
+    synthetic_history,
+    synthetic_subnets,
+    synthetic_thresholds,
+    write_dataset,
+    write_results,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="热点路径基准测试")
+    parser.add_argument("--years", type=float, default=3, help="Taostats 历史缓存覆盖的年数")
+    parser.add_argument("--history-interval", type=int, default=21600, help="历史缓存点间隔（秒）")
+    parser.add_argument("--live-days", type=float, default=8, help="本地 30 秒价格历史的天数")
+    parser.add_argument("--subnets", type=int, default=256)
+    parser.add_argument("--thresholds", type=int, default=5000)
+    parser.add_argument("--ws-clients", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--slow-source-latency", type=float, default=2.0, help="USD 价格基准中主来源（CMC）的延迟（秒）"
+    )
+    parser.add_argument("--output", help="结果 JSON 路径")
+    return parser.parse_args()
+
+
+class NullWebSocket:
+    """只计数的 WebSocket 替身，用于测量纯扇出开销"""
+
+    client = None
+
+    def __init__(self) -> None:
+        self.sent = 0
+
+    async def send_text(self, data: str) -> None:
+        self.sent += 1
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+def bench_cold_start(data_dir: Path, repeat: int) -> dict[str, Any]:
+    """在子进程中分别测量 import monitor 与后台存储加载（_load_from_disk）的耗时"""
+    script = (
+        "import asyncio, time\n"
+        "t = time.perf_counter()\n"
+        "import monitor\n"
+        "t1 = time.perf_counter()\n"
+        "asyncio.run(monitor._load_from_disk(monitor.state.history_log))\n"
+        "print(t1 - t, time.perf_counter() - t1)\n"
+    )
+    imports, loads = [], []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=REPO_DIR,
+            env={**os.environ, **monitor_env(data_dir)},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        import_s, load_s = out.stdout.strip().splitlines()[-1].split()
+        imports.append(float(import_s))
+        loads.append(float(load_s))
+    return {"cold_start_import": summarize(imports), "cold_start_storage_load": summarize(loads)}
+
+
+async def bench_endpoints(m: ModuleType, args: argparse.Namespace) -> dict[str, Any]:
+    results = {}
+    routes = {
+        "kline_1d_json": "/api/kline?granularity=1d&days=1095",
+        "kline_5m_json": f"/api/kline?granularity=5m&days={int(args.years * 365)}",
+        "kline_5m_columnar": f"/api/kline?granularity=5m&days={int(args.years * 365)}&format=columnar",
+        "history_24h_json": "/api/history?hours=24",
+        "history_7d_json": "/api/history?hours=168",
+        "history_7d_lttb": "/api/history?hours=168&max_points=1000",
+        "subnets_json": "/api/subnets",
+        "current_json": "/api/current",
+        "tao_usd_json": "/api/tao-usd",
+    }
+    transport = httpx.ASGITransport(app=m.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, url in routes.items():
+            resp = await client.get(url)
+            resp.raise_for_status()
+
+            async def get(url: str = url) -> None:
+                (await client.get(url)).raise_for_status()
+
+            async def revalidate(url: str = url, etag: str = resp.headers["etag"]) -> None:
+                assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+            # 不计时地清空响应缓存：测的是实际计算与序列化的耗时
+            results[name] = await ameasure(
+                get, args.repeat, setup=m.response_cache.invalidate, payload_bytes=len(resp.content)
+            )
+            if url.startswith(m.RESPONSE_CACHE_PATHS):
+                results[f"{name}_cached"] = await ameasure(get, args.repeat, payload_bytes=len(resp.content))
+            results[f"{name}_304"] = await ameasure(revalidate, args.repeat)
+    return results
+
+
+async def bench_broadcast(m: ModuleType, args: argparse.Namespace) -> dict[str, Any]:
+    state = m.state
+    for _ in range(args.ws_clients):
+        ws = NullWebSocket()
+        state.ws_clients[ws] = m.WSClient(ws)
+    message = {
+        "type": "price_update",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "price_rao": 500 * m.RAO_PER_TAO,
+        "price_tao": 500.0,
+        "price_usd": 200000.0,
+        "tao_usd_rate": 400.0,
+        "subnet_count": args.subnets,
+    }
+    result = await ameasure(
+        lambda: m._broadcast_ws(message, "price", conflate=True), args.repeat * 10, clients=args.ws_clients
+    )
+    state.ws_clients.clear()
+    return {"broadcast_ws_conflated": result}
+
+
+def bench_trim(m: ModuleType, args: argparse.Namespace) -> dict[str, Any]:
+    base = list(m.state.history.price_history)
+    ctx: dict[str, Any] = {}
+
+    def setup() -> None:
+        history = m.HistoryData.model_construct(price_history=list(base), new_subnet_events=[])
+        ctx.update(history=history, index=m.HistoryIndex(history), rollups=m.RollupStore())
+
+    def trim() -> None:
+        m._trim_history(ctx["history"], ctx["index"], ctx["rollups"], m.state.config)
+
+    setup()
+    trim()
+    expired = len(base) - len(ctx["history"].price_history)
+    return {
+        "trim_history_batch": measure(trim, args.repeat, setup=setup, expired_records=expired),
+        # 稳态：已裁剪过，每次轮询只检查（几乎）无过期数据
+        "trim_history_steady": measure(trim, args.repeat * 10),
+    }
+
+
+def bench_alerts(m: ModuleType, args: argparse.Namespace) -> dict[str, Any]:
+    thresholds = [m.AlertThreshold(**t) for t in synthetic_thresholds(args.thresholds)]
+    engine = m.AlertEngine([], thresholds, set())
+    rnd = random.Random(2)
+    prices, price = [], 500.0
+    for _ in range(1000):
+        price = min(5000.0, max(1.0, price * (1 + rnd.gauss(0, 0.005))))
+        prices.append(price)
+
+    def evaluate() -> None:
+        for i, price in enumerate(prices):
+            engine.evaluate(i * 30, price)
+
+    return {"alert_evaluate_x1000": measure(evaluate, args.repeat, thresholds=args.thresholds)}
+
+
+async def bench_poll(m: ModuleType, args: argparse.Namespace, history: list[tuple[int, int]]) -> dict[str, Any]:
+    state = m.state
+    state.alerts.set_thresholds([m.AlertThreshold(**t) for t in synthetic_thresholds(args.thresholds)])
+    now = datetime.now(timezone.utc)
+    state.last_history_fetch = now
+    state.last_usd_fetch = now
+    upstream = FakeUpstream(history, synthetic_subnets(args.subnets))
+    async with httpx.AsyncClient(transport=upstream.mock_transport()) as client:
+        await m._poll_once(client)  # 预热：初始化已知子网集合
+        result = await ameasure(lambda: m._poll_once(client), args.repeat, subnets=args.subnets)
+    return {"poll_once": result}
+
+
+async def bench_usd_price(m: ModuleType, args: argparse.Namespace, history: list[tuple[int, int]]) -> dict[str, Any]:
+    """主来源（CMC）响应缓慢时获取 TAO/USD 价格的耗时：按配置对冲请求 vs 只请求 CMC"""
+    upstream = FakeUpstream(history, [])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/v1/cryptocurrency/quotes/latest"):
+            await asyncio.sleep(args.slow_source_latency)
+        status, body = upstream.handle(request.url.path, dict(request.url.params))
+        return httpx.Response(status, json=body)
+
+    cfg = m.state.config
+    sources = cfg.usd_price_sources
+    repeat = min(args.repeat, 5)
+    results: dict[str, Any] = {}
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for name, configured in (("usd_price_hedged", sources), ("usd_price_cmc_only", ["cmc"])):
+            cfg.usd_price_sources = configured
+            results[name] = await ameasure(
+                lambda: m._fetch_tao_usd_price(client),
+                repeat,
+                setup=lambda: setattr(m.usd_prices, "accepted", None),
+                slow_source_latency=args.slow_source_latency,
+            )
+        await asyncio.gather(*m._usd_stragglers)
+    cfg.usd_price_sources = sources
+    return results
+
+
+async def run_inprocess(m: ModuleType, args: argparse.Namespace, history: list[tuple[int, int]]) -> dict[str, Any]:
+    await m._load_from_disk(m.state.history_log)
+    state = m.state
+    results: dict[str, Any] = {}
+    live = m._live_price_points(state.history)
+    results["candles_build"] = measure(
+        lambda: m.CandleEngine.build(state.historical_cache, live, state.rollups),
+        args.repeat,
+        points=len(state.historical_cache) + len(live),
+    )
+    results.update(await bench_endpoints(m, args))
+    results.update(await bench_broadcast(m, args))
+    results.update(bench_trim(m, args))
+    results.update(bench_alerts(m, args))
+    results.update(await bench_poll(m, args, history))
+    results.update(await bench_usd_price(m, args, history))
+    results["save_history_snapshot"] = measure(
+        lambda: m._save_history(state.history), args.repeat, records=len(state.history.price_history)
+    )
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="tao-bench-") as tmp:
+        data_dir = Path(tmp) / "data"
+        history = synthetic_history(args.years, args.history_interval)
+        write_dataset(data_dir, history, args.live_days)
+
+        results = bench_cold_start(data_dir, max(3, args.repeat // 2))
+
+        m = import_monitor(data_dir)
+        # 告警与请求日志会淹没输出并计入耗时
+        logging.getLogger("tao-monitor").setLevel(logging.ERROR)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        try:
+            results.update(asyncio.run(run_inprocess(m, args, history)))
+        finally:
+            m.persistence.flush()
+            m.state.history_log.close()
+
+    path = write_results("hotpaths", vars(args), results, args.output)
+    print_results(results)
+    print(f"结果已写入 {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+端到端负载测试：真实的 monitor 进程 + 本地假上游 + 并发 HTTP 与 WebSocket 客户端（离线）。
+
+    python -m bench.load --duration 30 --ws-clients 1000 --http-concurrency 32 --workers 1
+
+流程：生成合成数据集并写入临时数据目录，在本地端口上启动假上游，以子进程运行
+``python monitor.py``（数据目录与上游地址通过环境变量指向上述位置），然后同时：
+  - 保持 N 个 WebSocket 连接，统计收到的 price_update 数与推送延迟（服务端时间戳 → 客户端接收）；
+  - 以 C 个并发 worker 按权重轮流请求各 REST 端点，统计各路由延迟、错误数与吞吐。
+结果写入 bench/results/load-<时间>.json（或 --output 指定的路径）。
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+import websockets
+
+from bench.common import (
+    REPO_DIR,
+    FakeUpstream,
+    ServerThread,
+    free_port,
+    wait_http,
+    monitor_env,
+    print_results,
+    summarize,
+    synthetic_history,
+    synthetic_subnets,
+    write_dataset,
+    write_results,
+)
+
+# (名称, 路径, 权重)
+ROUTES = [
+    ("current", "/api/current", 10),
+    ("history_24h", "/api/history?hours=24&max_points=500", 4),
+    ("history_7d", "/api/history?hours=168&max_points=500", 2),
+    ("kline_1h", "/api/kline?interval=1h", 4),
+    ("kline_1d", "/api/kline?interval=1d", 2),
+    ("kline_5m_columnar", "/api/kline?interval=5m&format=columnar", 2),
+    ("subnets", "/api/subnets", 3),
+    ("tao_usd", "/api/tao-usd", 3),
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="端到端 HTTP / WebSocket 负载测试")
+    parser.add_argument("--years", type=float, default=3, help="Taostats 历史缓存覆盖的年数")
+    parser.add_argument("--history-interval", type=int, default=21600, help="历史缓存点间隔（秒）")
+    parser.add_argument("--live-days", type=float, default=8, help="本地 30 秒价格历史的天数")
+    parser.add_argument("--subnets", type=int, default=256)
+    parser.add_argument("--new-subnet-every", type=int, default=10, help="每隔多少次子网请求新增一个子网，0 为不新增")
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="假上游每个请求的延迟（秒）")
+    parser.add_argument("--poll-interval", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="monitor 工作进程数（WORKERS）")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--ws-clients", type=int, default=1000)
+    parser.add_argument("--http-concurrency", type=int, default=32)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", help="结果 JSON 路径")
+    return parser.parse_args()
+
+
+async def ws_client(url: str, stats: dict[str, Any]) -> None:
+    """保持连接直到被取消，统计消息数与 price_update 的推送延迟"""
+    try:
+        async with websockets.connect(url, open_timeout=30, max_queue=None) as ws:
+            stats["connected"] += 1
+            async for raw in ws:
+                stats["messages"] += 1
+                if '"price_update"' not in raw:
+                    continue
+                stats["price_updates"] += 1
+                ts = raw.split('"timestamp": "', 1)[-1].split('"', 1)[0]
+                try:
+                    stats["latencies"].append(time.time() - datetime.fromisoformat(ts).timestamp())
+                except ValueError:
+                    pass
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        stats["errors"] += 1
+        stats["last_error"] = repr(exc)
+
+
+async def http_worker(
+    client: httpx.AsyncClient, deadline: float, rnd: random.Random, stats: dict[str, dict[str, Any]]
+) -> None:
+    names = [r[0] for r in ROUTES]
+    weights = [r[2] for r in ROUTES]
+    paths = {r[0]: r[1] for r in ROUTES}
+    while time.time() < deadline:
+        name = rnd.choices(names, weights)[0]
+        entry = stats[name]
+        start = time.perf_counter()
+        try:
+            resp = await client.get(paths[name])
+            await resp.aread()
+            if resp.status_code != 200:
+                entry["errors"] += 1
+                continue
+        except httpx.HTTPError:
+            entry["errors"] += 1
+            continue
+        entry["samples"].append(time.perf_counter() - start)
+        entry["bytes"] += len(resp.content)
+
+
+async def run_load(base_url: str, args: argparse.Namespace) -> dict[str, Any]:
+    ws_url = base_url.replace("http://", "ws://") + "/ws"
+    ws_stats: dict[str, Any] = {
+        "connected": 0, "messages": 0, "price_updates": 0, "errors": 0, "latencies": [], "last_error": None,
+    }
+    http_stats = {name: {"samples": [], "errors": 0, "bytes": 0} for name, _, _ in ROUTES}
+
+    # 先建立全部 WebSocket 连接（分批，避免瞬时握手风暴），连接完成后清零计数再开始计时
+    ws_tasks = []
+    for i in range(args.ws_clients):
+        ws_tasks.append(asyncio.create_task(ws_client(ws_url, ws_stats)))
+        if i % 100 == 99:
+            await asyncio.sleep(0.2)
+    while ws_stats["connected"] + ws_stats["errors"] < args.ws_clients:
+        await asyncio.sleep(0.1)
+    ws_stats.update(messages=0, price_updates=0, latencies=[])
+
+    deadline = time.time() + args.duration
+
+    limits = httpx.Limits(max_connections=args.http_concurrency, max_keepalive_connections=args.http_concurrency)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(
+            http_worker(client, deadline, random.Random(i), http_stats) for i in range(args.http_concurrency)
+        ))
+    elapsed = time.perf_counter() - start
+    for task in ws_tasks:
+        task.cancel()
+    await asyncio.gather(*ws_tasks, return_exceptions=True)
+
+    results: dict[str, Any] = {}
+    total = 0
+    for name, entry in http_stats.items():
+        total += len(entry["samples"])
+        if entry["samples"]:
+            results[f"http_{name}"] = summarize(
+                entry["samples"],
+                errors=entry["errors"],
+                requests_per_sec=len(entry["samples"]) / elapsed,
+                avg_bytes=entry["bytes"] // len(entry["samples"]),
+            )
+        else:
+            results[f"http_{name}"] = {"errors": entry["errors"], "requests": 0}
+    results["http_total"] = {
+        "requests": total,
+        "errors": sum(e["errors"] for e in http_stats.values()),
+        "requests_per_sec": total / elapsed,
+    }
+    ws_summary = {
+        "clients": args.ws_clients,
+        "connected": ws_stats["connected"],
+        "errors": ws_stats["errors"],
+        "messages": ws_stats["messages"],
+        "price_updates": ws_stats["price_updates"],
+        "messages_per_sec": ws_stats["messages"] / elapsed,
+    }
+    if ws_stats["last_error"]:
+        ws_summary["last_error"] = ws_stats["last_error"]
+    results["ws_clients"] = ws_summary
+    if ws_stats["latencies"]:
+        results["ws_push_latency"] = summarize(ws_stats["latencies"])
+    return results
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="tao-load-") as tmp:
+        data_dir = Path(tmp) / "data"
+        history = synthetic_history(args.years, args.history_interval)
+        write_dataset(data_dir, history, args.live_days)
+
+        upstream = FakeUpstream(
+            history,
+            synthetic_subnets(args.subnets),
+            latency=args.upstream_latency,
+            new_subnet_every=args.new_subnet_every,
+        )
+        upstream_port, port = free_port(), free_port()
+        with ServerThread(upstream.asgi_app(), upstream_port):
+            env = {
+                **os.environ,
+                **monitor_env(data_dir, f"http://127.0.0.1:{upstream_port}"),
+                "POLL_INTERVAL_SECONDS": str(args.poll_interval),
+                "PORT": str(port),
+                "WORKERS": str(args.workers),
+            }
+            log_path = Path(tmp) / "monitor.log"
+            with open(log_path, "wb") as log:
+                proc = subprocess.Popen(
+                    [sys.executable, "monitor.py"], cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    ready = wait_http(f"{base_url}/readyz", proc, args.startup_timeout)
+                    results = {"startup_until_ready": {"seconds": ready}}
+                    results.update(asyncio.run(run_load(base_url, args)))
+                    results["upstream"] = {"requests": upstream.requests}
+                except Exception:
+                    sys.stderr.write(log_path.read_text(encoding="utf-8", errors="replace")[-4000:])
+                    raise
+                finally:
+                    proc.terminate()
+                    try:
+                        proc.wait(timeout=15)
+                    except subprocess.TimeoutExpired:
+                        proc.kill()
+
+    path = write_results("load", vars(args), results, args.output)
+    print_results(results)
+    print(f"结果已写入 {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+启动耗时基准测试（离线）：以子进程运行 ``python monitor.py``，测量从启动进程到
+
+  - /healthz 返回 200（开始接受连接，滚动重启时的存活探针）；
+  - /readyz 返回 200（后台存储加载完成，就绪探针）；
+  - /api/current 出现第一个价格（首次轮询完成）
+
+的耗时。数据目录为合成的多年历史，上游为本地假上游。
+
+    python -m bench.startup --years 3 --live-days 8 --repeat 5
+
+结果写入 bench/results/startup-<时间>.json（或 --output 指定的路径）。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from bench.common import (
+    REPO_DIR,
+    FakeUpstream,
+    ServerThread,
+    free_port,
+    monitor_env,
+    print_results,
+    summarize,
+    synthetic_history,
+    synthetic_subnets,
+    wait_http,
+    write_dataset,
+    write_results,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--years", type=float, default=3, help="Taostats 历史缓存覆盖的年数")
+    parser.add_argument("--history-interval", type=int, default=21600, help="历史缓存点间隔（秒）")
+    parser.add_argument("--live-days", type=float, default=8, help="本地 30 秒价格历史的天数")
+    parser.add_argument("--subnets", type=int, default=256)
+    parser.add_argument("--storage-backend", default="json", choices=["json", "sqlite"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="结果 JSON 路径")
+    return parser.parse_args()
+
+
+def wait_first_price(base_url: str, proc: subprocess.Popen, timeout: float) -> None:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"monitor 进程提前退出，返回码 {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/current", timeout=2).json().get("price_tao"):
+                return
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{timeout} 秒内未完成首次轮询")
+
+
+def run_once(data_dir: Path, upstream_url: str, args: argparse.Namespace, log_path: Path) -> dict[str, float]:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        **monitor_env(data_dir, upstream_url),
+        "PORT": str(port),
+        "STORAGE_BACKEND": args.storage_backend,
+    }
+    with open(log_path, "wb") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "monitor.py"], cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        try:
+            wait_http(f"{base_url}/healthz", proc, args.timeout, interval=0.01)
+            healthy = time.perf_counter() - start
+            wait_http(f"{base_url}/readyz", proc, args.timeout, interval=0.01)
+            ready = time.perf_counter() - start
+            wait_first_price(base_url, proc, args.timeout)
+            first_price = time.perf_counter() - start
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return {"healthy": healthy, "ready": ready, "first_price": first_price}
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="tao-startup-") as tmp:
+        data_dir = Path(tmp) / "data"
+        history = synthetic_history(args.years, args.history_interval)
+        write_dataset(data_dir, history, args.live_days)
+
+        upstream = FakeUpstream(history, synthetic_subnets(args.subnets))
+        upstream_port = free_port()
+        samples: dict[str, list[float]] = {"healthy": [], "ready": [], "first_price": []}
+        log_path = Path(tmp) / "monitor.log"
+        with ServerThread(upstream.asgi_app(), upstream_port):
+            for _ in range(args.repeat):
+                try:
+                    run = run_once(data_dir, f"http://127.0.0.1:{upstream_port}", args, log_path)
+                except Exception:
+                    sys.stderr.write(log_path.read_text(encoding="utf-8", errors="replace")[-4000:])
+                    raise
+                for name, value in run.items():
+                    samples[name].append(value)
+
+    results: dict[str, Any] = {
+        "startup_until_healthy": summarize(samples["healthy"]),
+        "startup_until_ready": summarize(samples["ready"]),
+        "startup_until_first_price": summarize(samples["first_price"]),
+    }
+    path = write_results("startup", vars(args), results, args.output)
+    print_results(results)
+    print(f"结果已写入 {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,31 +4,67 @@ TAO 子网注册价格监控后端服务
 功能概述：
 - 定时轮询 Taostats API 获取子网注册费用
 - 检测新子网上线
-- 价格历史记录持久化到 data/history.json
+- 价格历史记录持久化到 data/history.json（快照）+ data/history.log（追加写日志）
 - WebSocket 实时推送价格更新
-- 阈值告警，触发 macOS 通知
+- 阈值告警，异步通知分发（macOS 通知 / Webhook / 本地命令 / 文件）
 - 获取 TAO/USD 实时价格（CoinGecko）
-- 从 Taostats 加载3年历史数据（缓存到 data/historical_cache.json）
+- 从 Taostats 加载3年历史数据（列式二进制缓存 data/historical_cache.bin，可 mmap）
 - 提供 K 线 OHLC 数据接口（5m/1h/4h/1d/1w 颗粒度）
+- 多进程部署：文件锁选出唯一的轮询主节点，其余进程通过本地 Unix socket 同步状态与广播
 """
 
 import asyncio
+import bisect
+import hashlib
+import heapq
 import json
 import logging
+import math
+import mmap
 import os
-import subprocess
+import random
+import shlex
+import sqlite3
+import struct
 import sys
+import threading
+import time
+import uuid
+from array import array
+from collections import deque
+from collections.abc import Awaitable, Callable, Iterable, Sequence
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Any
+from urllib.parse import parse_qsl, urlencode
 
 import httpx
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from starlette.datastructures import Headers
+
+try:
+    import fcntl
+except ImportError:  # Windows 无 fcntl，退化为单进程模式
+    fcntl = None
+
+# orjson / brotli 已列入 requirements.txt；缺失时（如平台没有对应的 wheel）回退，
+# 启动时记录实际使用的实现
+try:
+    import orjson
+except ImportError:  # 未安装时回退到标准库 json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 未安装时只提供 gzip 压缩
+    brotli = None
 
 # ---------------------------------------------------------------------------
 # 日志配置
@@ -44,22 +80,97 @@ logger = logging.getLogger("tao-monitor")
 # 路径常量
 # ---------------------------------------------------------------------------
 BASE_DIR = Path(__file__).resolve().parent
-CONFIG_PATH = BASE_DIR / "config.json"
-HISTORY_PATH = BASE_DIR / "data" / "history.json"
-HISTORICAL_CACHE_PATH = BASE_DIR / "data" / "historical_cache.json"
+# 配置文件与数据目录可通过环境变量 TAO_MONITOR_CONFIG / TAO_MONITOR_DATA_DIR 指定
+# （容器挂载卷、测试与基准测试隔离）
+CONFIG_PATH = Path(os.environ.get("TAO_MONITOR_CONFIG") or BASE_DIR / "config.json")
+DATA_DIR = Path(os.environ.get("TAO_MONITOR_DATA_DIR") or BASE_DIR / "data")
+HISTORY_PATH = DATA_DIR / "history.json"
+HISTORY_LOG_PATH = DATA_DIR / "history.log"
+HISTORICAL_CACHE_PATH = DATA_DIR / "historical_cache.bin"
+LEGACY_HISTORICAL_CACHE_PATH = DATA_DIR / "historical_cache.json"
+HISTORICAL_CACHE_META_PATH = DATA_DIR / "historical_cache.meta.json"
+SQLITE_PATH = DATA_DIR / "monitor.db"
+ROLLUPS_PATH = DATA_DIR / "rollups.bin"
+ALERT_RULES_PATH = DATA_DIR / "alert_rules.json"
+POLLER_LOCK_PATH = DATA_DIR / "poller.lock"
+PUBSUB_SOCKET_PATH = DATA_DIR / "pubsub.sock"
 STATIC_DIR = BASE_DIR / "static"
 
 # RAO 到 TAO 的转换系数
 RAO_PER_TAO = 1_000_000_000
 
-# Taostats API 端点
-STATS_API_URL = "https://api.taostats.io/api/stats/latest/v1"
-SUBNETS_API_URL = "https://api.taostats.io/api/subnet/latest/v1"
-TAOSTATS_HISTORY_URL = "https://api.taostats.io/api/stats/history/v1"
+# Taostats API 端点（TAOSTATS_API_BASE 可指向本地假上游，用于离线基准测试）
+TAOSTATS_API_BASE = os.environ.get("TAOSTATS_API_BASE", "https://api.taostats.io").rstrip("/")
+STATS_API_URL = f"{TAOSTATS_API_BASE}/api/stats/latest/v1"
+SUBNETS_API_URL = f"{TAOSTATS_API_BASE}/api/subnet/latest/v1"
+TAOSTATS_HISTORY_URL = f"{TAOSTATS_API_BASE}/api/stats/history/v1"
+TAOSTATS_HISTORY_PAGE_SIZE = 200
 
-# CoinMarketCap TAO/USD 价格
-CMC_PRICE_URL = "https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest"
+# TAO/USD 价格来源（*_API_BASE 同上）
+CMC_API_BASE = os.environ.get("CMC_API_BASE", "https://pro-api.coinmarketcap.com").rstrip("/")
+CMC_PRICE_URL = f"{CMC_API_BASE}/v1/cryptocurrency/quotes/latest"
 CMC_API_KEY = os.environ.get("CMC_API_KEY", "fffa65cf-bf4f-4405-9f95-89d3109511cb")
+COINGECKO_API_BASE = os.environ.get("COINGECKO_API_BASE", "https://api.coingecko.com").rstrip("/")
+COINGECKO_PRICE_URL = f"{COINGECKO_API_BASE}/api/v3/simple/price"
+BINANCE_API_BASE = os.environ.get("BINANCE_API_BASE", "https://api.binance.com").rstrip("/")
+BINANCE_PRICE_URL = f"{BINANCE_API_BASE}/api/v3/ticker/price"
+
+# WebSocket 每个客户端的发送队列长度与单次发送超时（秒），溢出或超时即断开
+WS_QUEUE_SIZE = 64
+WS_SEND_TIMEOUT = 5.0
+
+# 多进程部署：进程间广播单行上限、主节点对单个从节点的发送缓冲上限（字节）
+PUBSUB_LINE_LIMIT = 16 * 1024 * 1024
+PUBSUB_MAX_BUFFER = 16 * 1024 * 1024
+
+# 通知分发：队列长度、突发合并窗口（秒）、相同通知去重窗口（秒）、单次发送超时（秒）、并发 worker 数
+NOTIFY_QUEUE_SIZE = 256
+NOTIFY_BATCH_WINDOW = 2.0
+NOTIFY_DEDUP_SECONDS = 300.0
+NOTIFY_TIMEOUT = 5.0
+NOTIFY_WORKERS = 2
+
+# WebSocket 订阅主题：price / subnets / alerts / status（上游熔断状态）/ candles:<颗粒度>
+# 未发送 subscribe 的客户端默认订阅除 K 线以外的全部主题
+WS_DEFAULT_TOPICS = frozenset({"price", "subnets", "alerts", "status"})
+
+# 后台写盘的防抖窗口（秒）：窗口内对同一文件的多次写入只落盘最后一次
+PERSIST_DEBOUNCE_SECONDS = 1.0
+
+# 追加写日志累计多少行后折叠进 history.json 快照
+HISTORY_COMPACT_EVERY = 500
+
+# 加载 history.json 时每次校验的记录数
+HISTORY_LOAD_CHUNK = 2000
+
+# 降采样结果缓存条数（按 窗口 + max_points 缓存）
+DOWNSAMPLE_CACHE_SIZE = 64
+# /api/kline?granularity=auto 未指定 max_points 时的蜡烛数上限
+KLINE_AUTO_MAX_POINTS = 1000
+
+# 响应压缩：小于该字节数的响应不压缩；超过线程阈值的压缩放到线程中执行
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_THREAD_MIN_SIZE = 128 * 1024
+
+# 轮询失败后指数退避的基础等待（秒）
+POLL_BACKOFF_BASE = 10.0
+# 退避指数的上限：2^16 × 10 秒已远超 poll_backoff_max_seconds，长时间连续失败时不会溢出
+POLL_BACKOFF_MAX_EXPONENT = 16
+
+# 事件循环延迟采样间隔（秒）
+LOOP_LAG_INTERVAL = 0.5
+
+# 响应缓存：缓存的只读接口（路径前缀）与条目数上限，总大小上限见 AppConfig
+RESPONSE_CACHE_PATHS = ("/api/history", "/api/kline", "/api/subnet-registrations", "/api/subnet-metrics")
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+# SQLite 后端时在库上查询的接口，其缓存条目还绑定库的提交计数
+RESPONSE_CACHE_DB_PATHS = ("/api/kline",)
+# 未指定 from 时按相对时间窗口（hours / days）查询的接口，其缓存条目还绑定当前轮询间隔
+RESPONSE_CACHE_RELATIVE_PATHS = ("/api/history", "/api/kline", "/api/subnet-metrics")
+
+# 列式二进制响应的媒体类型与魔数（格式见 _encode_columnar）
+COLUMNAR_MEDIA_TYPE = "application/vnd.tao.columnar"
+_COLUMNAR_MAGIC = b"TAOCOL01"
 
 # K 线颗粒度（秒）
 GRANULARITY_SECONDS: dict[str, int] = {
@@ -71,21 +182,311 @@ GRANULARITY_SECONDS: dict[str, int] = {
 }
 
 
+# ---------------------------------------------------------------------------
+# 运行指标（Prometheus 文本格式，须在各模块前定义）
+# ---------------------------------------------------------------------------
+# 耗时（秒）与响应体大小（字节）直方图的桶上界
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _render_histogram(
+    lines: list[str],
+    name: str,
+    labelnames: Sequence[str],
+    labels: Sequence[str],
+    buckets: Sequence[float],
+    counts: Sequence[int],
+    total: float,
+) -> None:
+    cumulative = 0
+    for bound, count in zip((*buckets, math.inf), counts):
+        cumulative += count
+        le = f'le="{_format_value(bound)}"'
+        lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+    lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(total)}")
+    lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+
+
+class _Timer:
+    __slots__ = ("_hist", "_labels", "_start")
+
+    def __init__(self, hist: "Histogram", labels: tuple[str, ...]) -> None:
+        self._hist = hist
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._hist.observe(time.perf_counter() - self._start, *self._labels)
+
+
+class Histogram:
+    """
+    固定桶直方图。observe 只做一次二分查找和几次加法，不加锁：
+    偶发的线程竞争最多丢一次计数，对监控指标可以接受。
+    """
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], list] = {}  # labels -> [counts, sum]
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, *labels: str) -> _Timer:
+        """with hist.time("label"): ... 记录代码块耗时"""
+        return _Timer(self, labels)
+
+    def render(self, lines: list[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.doc}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for labels, (counts, total) in sorted(self._series.items()):
+            _render_histogram(lines, self.name, self.labelnames, labels, self.buckets, counts, total)
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, lines: list[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.doc}")
+        lines.append(f"# TYPE {self.name} counter")
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+
+
+class StageTimer:
+    """按阶段分段计时：每次 mark(stage) 记录距上一次 mark 的耗时"""
+
+    __slots__ = ("_hist", "_last")
+
+    def __init__(self, hist: Histogram) -> None:
+        self._hist = hist
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._hist.observe(now - self._last, stage)
+        self._last = now
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表。直方图与计数器在热路径上即时更新（开销为常数级）；
+    仪表（gauge）与按客户端的分布只在抓取时通过回调计算，没人抓取时零开销。
+    多进程部署时每个工作进程各自报告本进程的指标。
+    """
+
+    def __init__(self) -> None:
+        self._metrics: list[Histogram | Counter] = []
+        self._gauges: list[tuple[str, str, Callable[[], Iterable[tuple[tuple[str, ...], float]]], tuple[str, ...]]] = []
+        self._collectors: list[Callable[[list[str]], None]] = []
+
+    def histogram(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, doc, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, doc, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, doc: str, fn: Callable[[], float]) -> None:
+        """无标签仪表，抓取时调用 fn()"""
+        self._gauges.append((name, doc, lambda: [((), fn())], ()))
+
+    def labeled_gauge(
+        self, name: str, doc: str, labelnames: Sequence[str], fn: Callable[[], Iterable[tuple[tuple[str, ...], float]]]
+    ) -> None:
+        """带标签仪表，抓取时 fn() 返回 [(标签值, 数值)]"""
+        self._gauges.append((name, doc, fn, tuple(labelnames)))
+
+    def collector(self, fn: Callable[[list[str]], None]) -> None:
+        """抓取时调用 fn(lines) 直接追加文本（用于抓取时才计算的直方图）"""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            metric.render(lines)
+        for name, doc, fn, labelnames in self._gauges:
+            try:
+                values = list(fn())
+            except Exception:
+                logger.exception("计算指标失败: %s", name)
+                continue
+            lines.append(f"# HELP {name} {doc}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        for fn in self._collectors:
+            try:
+                fn(lines)
+            except Exception:
+                logger.exception("计算指标失败")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+METRIC_UPSTREAM_SECONDS = metrics.histogram(
+    "tao_monitor_upstream_request_duration_seconds", "上游 API 请求耗时", ["source"]
+)
+METRIC_UPSTREAM_ERRORS = metrics.counter(
+    "tao_monitor_upstream_request_errors_total", "上游 API 请求失败次数", ["source"]
+)
+METRIC_UPSTREAM_REJECTED = metrics.counter(
+    "tao_monitor_upstream_circuit_rejections_total", "熔断器打开期间被直接拒绝的上游请求次数", ["source"]
+)
+METRIC_USD_PRICE_SECONDS = metrics.histogram(
+    "tao_monitor_usd_price_seconds", "获取 TAO/USD 价格的总耗时（含对冲请求，不含缓存命中）"
+)
+METRIC_USD_PRICE_ANSWERS = metrics.counter(
+    "tao_monitor_usd_price_answers_total", "被采用的 TAO/USD 报价来源", ["source"]
+)
+METRIC_USD_PRICE_OUTLIERS = metrics.counter(
+    "tao_monitor_usd_price_outliers_total", "因偏离其他来源而未被采用的 TAO/USD 报价", ["source"]
+)
+METRIC_RESPONSE_CACHE = metrics.counter(
+    "tao_monitor_response_cache_requests_total", "可缓存接口的请求结果（hit/shared/miss/not_modified）", ["result"]
+)
+METRIC_POLL_SECONDS = metrics.histogram("tao_monitor_poll_duration_seconds", "各轮询任务单次运行耗时", ["job"])
+METRIC_POLL_RUNS = metrics.counter("tao_monitor_poll_runs_total", "轮询任务运行次数", ["job", "outcome"])
+METRIC_POLL_STAGE_SECONDS = metrics.histogram(
+    "tao_monitor_poll_stage_duration_seconds", "轮询任务内各阶段耗时", ["stage"]
+)
+METRIC_SAVE_HISTORY_SECONDS = metrics.histogram("tao_monitor_save_history_duration_seconds", "history.json 快照写入耗时")
+METRIC_WS_FANOUT_SECONDS = metrics.histogram(
+    "tao_monitor_ws_fanout_duration_seconds", "WebSocket 广播扇出耗时（投递到各客户端队列）", ["topic"]
+)
+METRIC_HTTP_SECONDS = metrics.histogram(
+    "tao_monitor_http_request_duration_seconds", "HTTP 请求耗时", ["method", "route", "status"]
+)
+METRIC_HTTP_RESPONSE_BYTES = metrics.histogram(
+    "tao_monitor_http_response_size_bytes", "HTTP 响应体大小（压缩后）", ["method", "route"], SIZE_BUCKETS
+)
+METRIC_LOOP_LAG_SECONDS = metrics.histogram("tao_monitor_event_loop_lag_seconds", "事件循环调度延迟")
+
+
 # ---------------------------------------------------------------------------
 # 数据模型
 # ---------------------------------------------------------------------------
 class AlertThreshold(BaseModel):
+    id: str = ""  # 稳定标识，为空时由 AlertEngine 分配；触发状态按它保存
     price_tao: float
     type: str  # "below" | "above"
-    triggered: bool = False
+    triggered: bool = False  # 仅作首次迁移的旧数据读取；对外返回时由告警引擎的触发状态填充
+    label: str = ""
+
+
+class AlertRule(BaseModel):
+    """
+    告警规则（告警引擎使用；config.json 中的 alert_thresholds 会转换为 above/below 规则）。
+
+    kind:
+      "above" / "below"：注册费高于 / 低于 price_tao
+      "pct_change"：window_seconds 内涨跌幅达到 pct（正数为涨，负数为跌，单位 %）
+      "eta"：按 window_seconds 内的下降趋势，预计 eta_seconds 内降至 price_tao
+    """
+    id: str = ""
+    owner: str = ""
+    kind: str
+    price_tao: float = 0.0
+    pct: float = 0.0
+    window_seconds: int = 3600
+    eta_seconds: int = 0
     label: str = ""
 
 
 class AppConfig(BaseModel):
     api_key: str = ""
     alert_thresholds: list[AlertThreshold] = []
+    # 轮询调度：各上游独立的间隔（秒），poll_interval_seconds 为 Stats（注册费）的间隔
     poll_interval_seconds: int = 30
+    subnets_poll_interval_seconds: int = 60
+    usd_poll_interval_seconds: int = 300
+    history_refresh_interval_seconds: int = 21600
+    # 注册费与任一价格告警阈值相差不足 fast_poll_proximity_pct% 时，Stats 改用 fast_poll_interval_seconds
+    fast_poll_interval_seconds: int = 10
+    fast_poll_proximity_pct: float = 2.0
+    # 成功后间隔的随机抖动比例；失败后指数退避的上限（秒）
+    poll_jitter: float = 0.1
+    poll_backoff_max_seconds: int = 900
+    # 熔断：某上游连续失败 circuit_failure_threshold 次后打开，circuit_reset_seconds 内直接失败、不再发请求
+    circuit_failure_threshold: int = 3
+    circuit_reset_seconds: int = 60
+    # 数据距上次成功更新超过 stale_after_intervals 个轮询间隔即标记为过期（stale）
+    stale_after_intervals: float = 3.0
+    # TAO/USD 价格来源（"cmc" | "coingecko" | "binance"），按顺序对冲请求：
+    # 前一个来源 usd_hedge_delay_seconds 内没有返回可用报价时再请求下一个
+    usd_price_sources: list[str] = ["cmc", "coingecko", "binance"]
+    usd_hedge_delay_seconds: float = 0.5
+    # 报价有效期（秒）；与其他来源有效报价的中位数偏离超过 usd_outlier_pct% 的报价不采用
+    usd_price_ttl_seconds: int = 120
+    usd_outlier_pct: float = 5.0
+    # 只读接口（历史、K 线、子网注册历史与指标）的响应缓存
+    response_cache_enabled: bool = True
+    response_cache_max_mb: int = 64
     notification_enabled: bool = True
+    # 存储后端："json"（快照 + 追加日志 + 二进制缓存）| "sqlite"（data/monitor.db），重启后生效
+    storage_backend: str = "json"
+    # 通知后端："osascript" | "webhook" | "command" | "file"，可同时启用多个
+    notification_backends: list[str] = ["osascript"]
+    notification_webhook_url: str = ""
+    notification_command: str = ""  # 以 title、message 作为追加参数执行
+    notification_file: str = ""  # 以 JSON Lines 追加写入
+    # 历史数据全量回填：并发页数、每秒请求上限、单页重试次数
+    history_fetch_concurrency: int = 4
+    history_requests_per_second: float = 4.0
+    history_fetch_retries: int = 3
+    # 子网指标时间序列：记录的数值字段与保留时长
+    subnet_metric_fields: list[str] = [
+        "emission",
+        "active_keys",
+        "active_validators",
+        "active_miners",
+        "neuron_registration_cost",
+        "recycled_24_hours",
+    ]
+    subnet_metrics_retention_hours: int = 24
+    # 分层保留：原始样本保留小时数，过期后降采样为 5m OHLC，再过期后并入 1h OHLC（0 表示永久保留）
+    raw_retention_hours: int = 168
+    rollup_5m_retention_days: int = 30
+    rollup_1h_retention_days: int = 0
 
 
 class PriceRecord(BaseModel):
@@ -137,564 +538,3988 @@ def _load_config() -> AppConfig:
     if env_poll.isdigit():
         config.poll_interval_seconds = int(env_poll)
 
+    # STORAGE_BACKEND 可选覆盖："json" | "sqlite"
+    env_storage = os.environ.get("STORAGE_BACKEND", "").strip()
+    if env_storage:
+        config.storage_backend = env_storage
+
     return config
 
 
+def _atomic_write_bytes(path: Path, data: bytes) -> None:
+    """先写临时文件再 rename，避免写到一半崩溃导致文件损坏"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+def _atomic_write_text(path: Path, text: str) -> None:
+    _atomic_write_bytes(path, text.encode("utf-8"))
+
+
+class PersistenceService:
+    """
+    后台写盘线程，让所有非日志类写盘离开请求与轮询热路径。
+
+    schedule() 只登记「路径 -> 生成内容的函数」；同一路径在防抖窗口内的多次登记
+    合并为最后一次，到期后在后台线程中生成内容并原子写入。schedule_task() 登记任意写盘任务
+    （如 SQLite 批量提交），按相同的键合并规则执行。关闭时 flush() 落盘全部待写内容，
+    flush(keys) 只立即写出指定的键，其余仍按防抖窗口写盘。
+    """
+
+    def __init__(self, debounce: float = PERSIST_DEBOUNCE_SECONDS) -> None:
+        self.debounce = debounce
+        self._pending: dict[Any, tuple[float, Callable[[], None]]] = {}
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def schedule(self, path: Path, producer: Callable[[], bytes]) -> None:
+        self.schedule_task(path, lambda: _atomic_write_bytes(path, producer()))
+
+    def schedule_task(self, key: Any, task: Callable[[], None]) -> None:
+        with self._cond:
+            # 保留首次登记的到期时间，持续更新的文件也会按窗口周期落盘
+            due = self._pending[key][0] if key in self._pending else time.monotonic() + self.debounce
+            self._pending[key] = (due, task)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self, keys: Iterable[Any] | None = None) -> None:
+        """立即写出待写内容：keys 为 None 时写出全部（关闭时调用），否则只写出指定的键"""
+        with self._io_lock:
+            with self._cond:
+                if keys is None:
+                    items = list(self._pending.items())
+                    self._pending.clear()
+                else:
+                    items = [(key, self._pending.pop(key)) for key in keys if key in self._pending]
+            for key, (_, task) in items:
+                self._write(key, task)
+
+    def _write(self, key: Any, task: Callable[[], None]) -> None:
+        try:
+            task()
+        except Exception:
+            logger.exception("后台写盘失败: %s", key)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pending:
+                        self._cond.wait()
+                        continue
+                    wait = min(t for t, _ in self._pending.values()) - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+            # _io_lock 保证与 flush() 不会并发写同一文件，也不会把旧内容写在新内容之后
+            with self._io_lock:
+                with self._cond:
+                    now = time.monotonic()
+                    due = [(key, task) for key, (t, task) in self._pending.items() if t <= now]
+                    for key, _ in due:
+                        del self._pending[key]
+                for key, task in due:
+                    self._write(key, task)
+
+
+persistence = PersistenceService()
+
+
 def _save_config(config: AppConfig) -> None:
-    """将配置写入 config.json"""
-    CONFIG_PATH.write_text(
-        json.dumps(config.model_dump(), ensure_ascii=False, indent=2) + "\n",
-        encoding="utf-8",
-    )
-    logger.info("配置已保存: %s", CONFIG_PATH)
+    """将配置写入 config.json（后台防抖写入）；触发状态保存在 data/alert_rules.json，不写入配置"""
+    data = config.model_dump(exclude={"alert_thresholds": {"__all__": {"triggered"}}})
+
+    def write() -> None:
+        _atomic_write_bytes(CONFIG_PATH, (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+        logger.info("配置已保存: %s", CONFIG_PATH)
+
+    persistence.schedule_task(CONFIG_PATH, write)
+
+
+class HistoryLog:
+    """
+    价格记录与子网事件的追加写日志。
 
+    每次轮询只向 data/history.log 追加一行紧凑 JSON（O(1) 写入），
+    累计 compact_every 行后把内存中的 HistoryData 折叠成 history.json 快照并清空日志。
+    启动时由 _load_history 回放「快照 + 日志尾部」。
 
-def _load_history() -> HistoryData:
-    """从 data/history.json 加载历史数据"""
+    折叠分两步：rotate() 在事件循环中把当前日志改名为 history.log.compacting，之后的追加
+    写入新的日志文件；调用方随即（不经 await）复制快照，再在线程中 compact() 写快照并删除
+    改名后的日志。折叠期间并发的追加（如子网任务的事件）既不会被截断丢失，也不会写到已关闭的文件。
+    """
+
+    def __init__(self, path: Path, compact_every: int = HISTORY_COMPACT_EVERY) -> None:
+        self.path = path
+        self.rotated_path = path.with_name(path.name + ".compacting")
+        self.compact_every = compact_every
+        self.pending = 0  # 上次折叠以来追加的行数
+        self._fh = None
+
+    def append(self, kind: str, item: BaseModel) -> None:
+        """追加一条记录，kind 为 "price" 或 "event" """
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.path.open("a", encoding="utf-8")
+        line = json.dumps(
+            {"k": kind, **item.model_dump()},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        self._fh.write(line + "\n")
+        self._fh.flush()
+        self.pending += 1
+
+    def should_compact(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def replay(self, history: HistoryData) -> int:
+        """
+        把日志中尚未进入快照的记录回放到 history，返回回放条数。
+        依次读取折叠中遗留的 .compacting 日志与当前日志；折叠时若在写完快照、删除日志之前崩溃，
+        日志会与快照重叠，这里按时间戳去重。
+        """
+        paths = [p for p in (self.rotated_path, self.path) if p.exists()]
+        if not paths:
+            return 0
+
+        last_price_ts = history.price_history[-1].timestamp if history.price_history else ""
+        known_events = {(e.timestamp, e.subnet_id) for e in history.new_subnet_events}
+        replayed = 0
+
+        for path in paths:
+            with path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        raw = json.loads(line)
+                        kind = raw.pop("k")
+                        if kind == "price":
+                            record = PriceRecord(**raw)
+                            if record.timestamp <= last_price_ts:
+                                continue
+                            history.price_history.append(record)
+                            last_price_ts = record.timestamp
+                        elif kind == "event":
+                            event = SubnetEvent(**raw)
+                            if (event.timestamp, event.subnet_id) in known_events:
+                                continue
+                            history.new_subnet_events.append(event)
+                            known_events.add((event.timestamp, event.subnet_id))
+                        else:
+                            continue
+                        replayed += 1
+                    except Exception:
+                        # 崩溃时最后一行可能只写了一半，跳过即可
+                        logger.warning("跳过无法解析的历史日志行: %s", line[:200])
+
+        self.pending = replayed
+        return replayed
+
+    def rotate(self) -> None:
+        """
+        折叠第一步（在事件循环中调用）：关闭并改名当前日志，之后的追加写入新文件。
+        上次折叠失败遗留的 .compacting 文件保留，当前日志接在其后。
+        """
+        self.close()
+        if self.path.exists():
+            if self.rotated_path.exists():
+                with self.rotated_path.open("a", encoding="utf-8") as out:
+                    out.write(self.path.read_text(encoding="utf-8"))
+                self.path.unlink()
+            else:
+                self.path.replace(self.rotated_path)
+        self.pending = 0
+
+    def compact(self, history: HistoryData) -> None:
+        """折叠第二步：把 rotate() 时复制的历史写成快照，再删除改名后的日志（在线程中执行）"""
+        _save_history(history)
+        self.rotated_path.unlink(missing_ok=True)
+        logger.info("历史日志已折叠进快照: %d 条价格记录", len(history.price_history))
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _load_history(log: HistoryLog | None = None) -> HistoryData:
+    """从 data/history.json 快照加载历史数据，并回放 data/history.log 中的增量"""
+    history = HistoryData()
     if HISTORY_PATH.exists():
         try:
             raw = json.loads(HISTORY_PATH.read_text(encoding="utf-8"))
-            logger.info("历史数据已加载，共 %d 条价格记录", len(raw.get("price_history", [])))
-            return HistoryData(**raw)
+            # 分块校验：后台线程加载时每块之间可释放 GIL，不长时间阻塞事件循环
+            prices = raw.pop("price_history", [])
+            history = HistoryData(**raw)
+            for i in range(0, len(prices), HISTORY_LOAD_CHUNK):
+                history.price_history += HistoryData(price_history=prices[i:i + HISTORY_LOAD_CHUNK]).price_history
+            logger.info("历史数据已加载，共 %d 条价格记录", len(history.price_history))
         except Exception:
             logger.exception("加载历史数据失败，使用空数据")
-    return HistoryData()
+
+    if log is not None:
+        replayed = log.replay(history)
+        if replayed:
+            logger.info("已回放历史日志: %d 条", replayed)
+    return history
 
 
 def _save_history(history: HistoryData) -> None:
-    """将历史数据写入 data/history.json"""
-    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
-    HISTORY_PATH.write_text(
-        json.dumps(history.model_dump(), ensure_ascii=False, indent=2) + "\n",
-        encoding="utf-8",
-    )
+    """将历史数据快照写入 data/history.json"""
+    with METRIC_SAVE_HISTORY_SECONDS.time():
+        _atomic_write_text(
+            HISTORY_PATH,
+            json.dumps(history.model_dump(), ensure_ascii=False, separators=(",", ":")) + "\n",
+        )
+
+
+def _parse_ts(ts_str: str) -> int | None:
+    """把 ISO8601 时间戳（可带 Z / 毫秒 / 时区）解析为 epoch 秒，失败返回 None"""
+    if not ts_str:
+        return None
+    try:
+        ts_str_clean = ts_str.rstrip("Z").split(".")[0]
+        if "+" not in ts_str_clean and len(ts_str_clean) == 19:
+            ts_str_clean += "+00:00"
+        ts = datetime.fromisoformat(ts_str_clean)
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return int(ts.timestamp())
+    except ValueError:
+        return None
+
+
+# 二进制缓存格式：8 字节魔数 + uint64 条数，之后依次是
+# int64 times[n]、int64 price_rao[n]、float64 price_tao[n]（小端）
+_HIST_MAGIC = b"TAOHIST1"
+_HIST_HEADER = struct.Struct("<8sQ")
+
+
+def _to_array(typecode: str, col: Sequence) -> array:
+    """把列（array 或 memoryview）复制为可变 array"""
+    if isinstance(col, array):
+        return array(typecode, col)
+    out = array(typecode)
+    out.frombytes(memoryview(col).cast("B"))
+    return out
+
+
+class HistoricalSeries:
+    """
+    Taostats 历史数据的列式存储。
 
+    三列平行数组：epoch 秒（int64，升序）、price_rao（int64）、price_tao（float64），
+    每个点 24 字节。从磁盘加载时直接 mmap，列是指向映射区的 memoryview，
+    需要修改时才复制成 array。
+    """
+
+    def __init__(
+        self,
+        times: Sequence[int] | None = None,
+        price_rao: Sequence[int] | None = None,
+        price_tao: Sequence[float] | None = None,
+    ) -> None:
+        self.times: Sequence[int] = times if times is not None else array("q")
+        self.price_rao: Sequence[int] = price_rao if price_rao is not None else array("q")
+        self.price_tao: Sequence[float] = price_tao if price_tao is not None else array("d")
+        self._mmap: mmap.mmap | None = None
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_points(cls, points: Iterable[tuple[int, int]]) -> "HistoricalSeries":
+        """由 (epoch 秒, price_rao) 序列构建，按时间排序"""
+        series = cls()
+        for ts, rao in sorted(points):
+            if series.times and ts == series.times[-1]:
+                continue
+            series.times.append(ts)
+            series.price_rao.append(rao)
+            series.price_tao.append(round(rao / RAO_PER_TAO, 6))
+        return series
+
+    def extend(self, points: Iterable[tuple[int, int]]) -> int:
+        """
+        合并新数据点：只对新数据排序后追加到尾部，不重排已有数据。
+        不晚于当前最后一条的点被丢弃，返回实际追加的条数。
+        """
+        self.ensure_mutable()
+        last_ts = self.times[-1] if self.times else None
+        added = 0
+        for ts, rao in sorted(points):
+            if last_ts is not None and ts <= last_ts:
+                continue
+            self.times.append(ts)
+            self.price_rao.append(rao)
+            self.price_tao.append(round(rao / RAO_PER_TAO, 6))
+            last_ts = ts
+            added += 1
+        return added
+
+    def merge(self, other: "HistoricalSeries") -> "HistoricalSeries":
+        """与另一段有序数据按时间归并为新序列，重复时间戳只保留一条"""
+        series = HistoricalSeries()
+        for ts, rao, tao in heapq.merge(
+            zip(self.times, self.price_rao, self.price_tao), zip(other.times, other.price_rao, other.price_tao)
+        ):
+            if series.times and ts == series.times[-1]:
+                continue
+            series.times.append(ts)
+            series.price_rao.append(rao)
+            series.price_tao.append(tao)
+        return series
+
+    def covers(self, times: Sequence[int]) -> bool:
+        """times 中的每个时间戳都已存在（二分查找）"""
+        for ts in times:
+            i = bisect.bisect_left(self.times, ts)
+            if i == len(self.times) or self.times[i] != ts:
+                return False
+        return True
+
+    def tail(self, n: int = 1) -> "HistoricalSeries":
+        """最后 n 个点的副本"""
+        if n <= 0:
+            return HistoricalSeries()
+        return HistoricalSeries(
+            array("q", self.times[-n:]), array("q", self.price_rao[-n:]), array("d", self.price_tao[-n:])
+        )
 
-def _load_historical_cache() -> list[dict]:
-    """加载 Taostats 历史数据缓存（可能有3年的数据）"""
+    def start_index(self, start_ts: int) -> int:
+        """返回第一个 time >= start_ts 的下标"""
+        return bisect.bisect_left(self.times, start_ts)
+
+    def ensure_mutable(self) -> None:
+        """mmap 只读列在修改前复制为 array"""
+        if self._mmap is None:
+            return
+        self.times = _to_array("q", self.times)
+        self.price_rao = _to_array("q", self.price_rao)
+        self.price_tao = _to_array("d", self.price_tao)
+        self._mmap = None
+
+    def to_bytes(self) -> bytes:
+        cols = (self.times, self.price_rao, self.price_tao)
+        if sys.byteorder != "little":
+            cols = tuple(_to_array(code, col) for code, col in zip("qqd", cols))
+            for col in cols:
+                col.byteswap()
+        return _HIST_HEADER.pack(_HIST_MAGIC, len(self.times)) + b"".join(col.tobytes() for col in cols)
+
+    @classmethod
+    def load(cls, path: Path) -> "HistoricalSeries":
+        """mmap 打开二进制缓存；大端机器上退化为复制加载"""
+        with path.open("rb") as fh:
+            header = fh.read(_HIST_HEADER.size)
+            magic, count = _HIST_HEADER.unpack(header)
+            if magic != _HIST_MAGIC:
+                raise ValueError(f"历史缓存魔数不匹配: {magic!r}")
+            if count == 0:
+                return cls()
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        col_bytes = count * 8
+        base = _HIST_HEADER.size
+        if len(mm) < base + 3 * col_bytes:
+            raise ValueError("历史缓存文件被截断")
+        view = memoryview(mm)
+        times = view[base:base + col_bytes].cast("q")
+        rao = view[base + col_bytes:base + 2 * col_bytes].cast("q")
+        tao = view[base + 2 * col_bytes:base + 3 * col_bytes].cast("d")
+
+        if sys.byteorder != "little":
+            cols = [_to_array(code, col) for code, col in zip("qqd", (times, rao, tao))]
+            for col in cols:
+                col.byteswap()
+            return cls(*cols)
+
+        series = cls(times, rao, tao)
+        series._mmap = mm
+        return series
+
+
+def _load_historical_cache(migrate: bool = True) -> HistoricalSeries:
+    """
+    加载 Taostats 历史数据缓存（可能有3年的数据），兼容迁移旧版 JSON 缓存。
+    migrate 为 False（从节点）时只读取旧版缓存，不写出二进制缓存，迁移由主节点完成。
+    """
     if HISTORICAL_CACHE_PATH.exists():
         try:
-            raw = json.loads(HISTORICAL_CACHE_PATH.read_text(encoding="utf-8"))
-            if isinstance(raw, list):
-                logger.info("历史缓存已加载: %d 条记录", len(raw))
-                return raw
+            series = HistoricalSeries.load(HISTORICAL_CACHE_PATH)
+            logger.info("历史缓存已加载: %d 条记录", len(series))
+            return series
         except Exception:
             logger.exception("加载历史缓存失败")
-    return []
+
+    if LEGACY_HISTORICAL_CACHE_PATH.exists():
+        try:
+            raw = json.loads(LEGACY_HISTORICAL_CACHE_PATH.read_text(encoding="utf-8"))
+            if isinstance(raw, list):
+                points = []
+                for r in raw:
+                    ts = _parse_ts(r.get("timestamp", ""))
+                    if ts is not None and r.get("price_rao"):
+                        points.append((ts, int(r["price_rao"])))
+                series = HistoricalSeries.from_points(points)
+                if not migrate:
+                    logger.info("旧版 JSON 历史缓存已加载（由主节点迁移）: %d 条记录", len(series))
+                    return series
+                _save_historical_cache(series)
+                logger.info("旧版 JSON 历史缓存已迁移为二进制格式: %d 条记录", len(series))
+                return series
+        except Exception:
+            logger.exception("迁移旧版历史缓存失败")
+    return HistoricalSeries()
 
 
-def _save_historical_cache(records: list[dict]) -> None:
-    """将 Taostats 历史数据保存到缓存文件"""
-    HISTORICAL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    HISTORICAL_CACHE_PATH.write_text(
-        json.dumps(records, ensure_ascii=False) + "\n",
-        encoding="utf-8",
-    )
-    logger.info("历史缓存已保存: %d 条记录", len(records))
+def _save_historical_cache(series: HistoricalSeries) -> None:
+    """将 Taostats 历史数据以列式二进制格式保存到缓存文件（后台防抖写入）"""
+    # 在调用方线程里复制出字节（内存拷贝），后台线程只负责写盘
+    data = series.to_bytes()
+    persistence.schedule(HISTORICAL_CACHE_PATH, lambda: data)
+    logger.info("历史缓存已提交保存: %d 条记录", len(series))
+
+
+def _load_history_sync_meta() -> tuple[datetime | None, bool]:
+    """
+    读取上次同步 Taostats 历史数据的时间与回填是否完整。
+    冷启动时据此判断缓存是否仍新鲜、是否需要重新全量回填。
+    """
+    if HISTORICAL_CACHE_META_PATH.exists():
+        try:
+            raw = json.loads(HISTORICAL_CACHE_META_PATH.read_text(encoding="utf-8"))
+            return datetime.fromisoformat(raw["last_sync"]), bool(raw.get("complete", True))
+        except Exception:
+            logger.warning("历史缓存元数据无效，将重新同步")
+    return None, True
+
+
+def _save_history_sync_meta(series: HistoricalSeries, synced_at: datetime, complete: bool) -> None:
+    """持久化高水位（最新缓存时间戳）、同步时间与回填完整性（后台防抖写入）"""
+    meta = {
+        "high_water": series.times[-1] if series.times else None,
+        "count": _historical_count(),
+        "last_sync": synced_at.isoformat(),
+        "complete": complete,
+    }
+    persistence.schedule(HISTORICAL_CACHE_META_PATH, lambda: (json.dumps(meta) + "\n").encode("utf-8"))
 
 
 # ---------------------------------------------------------------------------
-# 全局状态
+# OHLC K 线聚合（须在 MonitorState 前定义）
 # ---------------------------------------------------------------------------
-class MonitorState:
-    """运行时状态容器，避免可变全局变量"""
+class CandleSeries:
+    """
+    单一颗粒度的物化 OHLC 序列（平行数组，time 升序）。
+
+    开盘价取前一蜡烛的收盘价（标准日K处理方式）：当每个时间区间只有1个数据点时
+    （如每日快照），这能使蜡烛显示方向（涨/跌）而不是扁平线。
+    """
+
+    def __init__(self, granularity_seconds: int) -> None:
+        self.granularity_seconds = granularity_seconds
+        self.times = array("q")
+        self.open = array("d")
+        self.high = array("d")
+        self.low = array("d")
+        self.close = array("d")
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def add(self, ts: int, price: float) -> bool:
+        """追加一个价格点，O(1)；早于最后一根蜡烛的迟到数据被忽略，返回是否有更新"""
+        return self.add_candle(ts, price, price, price, price)
+
+    def add_candle(self, ts: int, o: float, h: float, lo: float, c: float) -> bool:
+        """并入一根更细颗粒度的蜡烛（单个价格点即 o = h = lo = c），规则与 add 相同"""
+        if c <= 0:
+            return False
+        bucket = ts // self.granularity_seconds * self.granularity_seconds
+
+        if self.times and bucket == self.times[-1]:
+            if h > self.high[-1]:
+                self.high[-1] = h
+            if lo < self.low[-1]:
+                self.low[-1] = lo
+            self.close[-1] = c
+            return True
+
+        if self.times and bucket < self.times[-1]:
+            return False
+
+        open_price = self.close[-1] if self.close else o
+        self.times.append(bucket)
+        self.open.append(open_price)
+        self.high.append(max(h, open_price))
+        self.low.append(min(lo, open_price))
+        self.close.append(c)
+        return True
+
+    def rows(self, lo: int = 0, hi: int | None = None) -> Iterable[tuple[int, float, float, float, float]]:
+        """按时间顺序迭代 (time, open, high, low, close)"""
+        hi = len(self.times) if hi is None else hi
+        return zip(self.times[lo:hi], self.open[lo:hi], self.high[lo:hi], self.low[lo:hi], self.close[lo:hi])
+
+    def trim_before(self, cutoff_ts: int) -> list[tuple[int, float, float, float, float]]:
+        """删除起始时间早于 cutoff_ts 的蜡烛，返回被删除的蜡烛"""
+        n = bisect.bisect_left(self.times, cutoff_ts)
+        removed = list(self.rows(0, n))
+        if n:
+            for col in (self.times, self.open, self.high, self.low, self.close):
+                del col[:n]
+        return removed
+
+    def candle(self, i: int) -> dict:
+        return {
+            "time": self.times[i],
+            "open": round(self.open[i], 6),
+            "high": round(self.high[i], 6),
+            "low": round(self.low[i], 6),
+            "close": round(self.close[i], 6),
+        }
+
+    def bucket_start(self, ts: int) -> int:
+        return ts // self.granularity_seconds * self.granularity_seconds
+
+
+# 降采样数据格式：8 字节魔数 + int64 已降采样的最后一个原始样本时间，之后每个层级为
+# uint64 条数 + int64 times[n] + float64 open/high/low/close[n]（小端）
+_ROLLUP_MAGIC = b"TAORLUP1"
+_ROLLUP_HEADER = struct.Struct("<8sq")
+_ROLLUP_COUNT = struct.Struct("<Q")
+
+
+class RollupStore:
+    """
+    本地实时数据的分层保留：原始样本过期后降采样为 5m OHLC，5m 过期后并入 1h OHLC。
+
+    降采样随裁剪增量进行（每次只处理刚过期的样本），每个层级有各自的保留期，
+    从而在内存与磁盘有界的前提下，以粗粒度永久保留本地的高频历史。
+    watermark 记录已降采样的最后一个原始样本时间，重启后快照中残留的样本不会被重复计入。
+    """
+
+    TIERS = ("5m", "1h")
 
     def __init__(self) -> None:
-        self.config: AppConfig = _load_config()
-        self.history: HistoryData = _load_history()
-        self.historical_cache: list[dict] = _load_historical_cache()
-        self.current_price_rao: int = 0
-        self.current_price_tao: float = 0.0
-        self.current_price_usd: float = 0.0
-        self.current_subnet_count: int = 0
-        self.known_subnet_ids: set[int] = set()
-        self.subnets_list: list[dict[str, Any]] = []
-        self.ws_clients: set[WebSocket] = set()
-        self.poll_task: asyncio.Task | None = None
-        self.last_usd_fetch: datetime | None = None
-        self.last_history_fetch: datetime | None = None
+        self.tiers: dict[str, CandleSeries] = {name: CandleSeries(GRANULARITY_SECONDS[name]) for name in self.TIERS}
+        self.watermark = 0
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self.tiers.values())
+
+    def add_raw(self, points: Iterable[tuple[int, float]]) -> int:
+        """把过期的原始样本并入 5m 层级，返回并入条数"""
+        tier = self.tiers["5m"]
+        added = 0
+        for ts, price in points:
+            if ts <= self.watermark:
+                continue
+            tier.add(ts, price)
+            self.watermark = ts
+            added += 1
+        if added:
+            self.dirty = True
+        return added
+
+    def age_out(self, now_ts: int, retention_5m_days: int, retention_1h_days: int) -> None:
+        """5m 层级中过期的蜡烛并入 1h 层级；1h 层级按保留期删除（0 为永久保留）"""
+        hourly = self.tiers["1h"]
+        expired = self.tiers["5m"].trim_before(now_ts - retention_5m_days * 86400)
+        for candle in expired:
+            hourly.add_candle(*candle)
+        dropped = hourly.trim_before(now_ts - retention_1h_days * 86400) if retention_1h_days > 0 else []
+        if expired or dropped:
+            self.dirty = True
+
+    def candles(self) -> Iterable[tuple[int, float, float, float, float]]:
+        """按时间顺序迭代所有层级的蜡烛（1h 层级在前，时间上早于 5m 层级）"""
+        return heapq.merge(self.tiers["1h"].rows(), self.tiers["5m"].rows(), key=lambda c: c[0])
+
+    def to_bytes(self) -> bytes:
+        parts = [_ROLLUP_HEADER.pack(_ROLLUP_MAGIC, self.watermark)]
+        for name in self.TIERS:
+            series = self.tiers[name]
+            parts.append(_ROLLUP_COUNT.pack(len(series)))
+            for col in (series.times, series.open, series.high, series.low, series.close):
+                if sys.byteorder != "little":
+                    col = array(col.typecode, col)
+                    col.byteswap()
+                parts.append(col.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RollupStore":
+        magic, watermark = _ROLLUP_HEADER.unpack_from(data)
+        if magic != _ROLLUP_MAGIC:
+            raise ValueError("降采样数据格式不匹配")
+        store = cls()
+        store.watermark = watermark
+        offset = _ROLLUP_HEADER.size
+        for name in cls.TIERS:
+            series = store.tiers[name]
+            (n,) = _ROLLUP_COUNT.unpack_from(data, offset)
+            offset += _ROLLUP_COUNT.size
+            for col in (series.times, series.open, series.high, series.low, series.close):
+                col.frombytes(data[offset:offset + 8 * n])
+                if sys.byteorder != "little":
+                    col.byteswap()
+                offset += 8 * n
+        return store
+
+
+class CandleEngine:
+    """
+    为 GRANULARITY_SECONDS 中的每个颗粒度维护物化 K 线。
 
+    历史缓存刷新时整体重建（build），每次轮询的新 PriceRecord 以 O(1) 追加（add），
+    /api/kline 只需切片。
+    """
 
-state = MonitorState()
+    def __init__(self) -> None:
+        self.series: dict[str, CandleSeries] = {
+            name: CandleSeries(secs) for name, secs in GRANULARITY_SECONDS.items()
+        }
+
+    def add(self, ts: int, price: float) -> None:
+        for series in self.series.values():
+            series.add(ts, price)
+
+    def tails(self) -> "CandleEngine":
+        """只保留每个颗粒度最后一根蜡烛的副本（其余已持久化到 SQLite）"""
+        engine = CandleEngine()
+        for name, series in self.series.items():
+            if series:
+                tail = engine.series[name]
+                for src, dst in ((series.times, tail.times), (series.open, tail.open), (series.high, tail.high),
+                                 (series.low, tail.low), (series.close, tail.close)):
+                    dst.append(src[-1])
+        return engine
+
+    @classmethod
+    def build(
+        cls,
+        hist: HistoricalSeries,
+        live: list[tuple[int, float]],
+        rollups: RollupStore | None = None,
+    ) -> "CandleEngine":
+        """
+        由 Taostats 历史缓存、本地降采样数据与本地实时历史按时间归并构建
+        （同一时刻依次为历史缓存、降采样、实时）
+        """
+        engine = cls()
+        sources = [((ts, p, p, p, p) for ts, p in zip(hist.times, hist.price_tao))]
+        if rollups is not None:
+            sources.append(rollups.candles())
+        sources.append((ts, p, p, p, p) for ts, p in live)
+        for candle in heapq.merge(*sources, key=lambda c: c[0]):
+            for series in engine.series.values():
+                series.add_candle(*candle)
+        return engine
+
+
+def _live_price_points(history: HistoryData) -> list[tuple[int, float]]:
+    """把本地实时历史转为 (epoch 秒, price_tao) 列表"""
+    points = []
+    for r in history.price_history:
+        ts = _parse_ts(r.timestamp)
+        if ts is not None:
+            points.append((ts, r.price_tao))
+    return points
 
 
 # ---------------------------------------------------------------------------
-# macOS 通知
+# 时间索引与分页（须在 MonitorState 前定义）
 # ---------------------------------------------------------------------------
-def _send_macos_notification(title: str, message: str) -> None:
-    """通过 osascript 发送 macOS 桌面通知"""
-    if not state.config.notification_enabled:
-        logger.debug("通知已禁用，跳过: %s", message)
-        return
+class HistoryIndex:
+    """
+    state.history 的时间索引：与 price_history / new_subnet_events 平行的 epoch 秒数组。
+
+    两个列表都按时间追加，索引保持升序，范围查询与裁剪都用二分定位。
+    """
+
+    def __init__(self, history: HistoryData) -> None:
+        self.price_times = array("q", (_parse_ts(r.timestamp) or 0 for r in history.price_history))
+        self.event_times = array("q", (_parse_ts(e.timestamp) or 0 for e in history.new_subnet_events))
+
+    def trim_before(self, history: HistoryData, cutoff_ts: int) -> tuple[int, int]:
+        """原地删除 cutoff_ts 之前的记录，返回 (删除的价格记录数, 删除的事件数)"""
+        n_prices = bisect.bisect_left(self.price_times, cutoff_ts)
+        if n_prices:
+            del history.price_history[:n_prices]
+            del self.price_times[:n_prices]
+        n_events = bisect.bisect_left(self.event_times, cutoff_ts)
+        if n_events:
+            del history.new_subnet_events[:n_events]
+            del self.event_times[:n_events]
+        return n_prices, n_events
+
+
+def _encode_cursor(times: Sequence[int], i: int) -> str:
+    """游标 = 下一条记录的 epoch 秒 + 同一秒内已跳过的条数，裁剪旧数据后仍然有效"""
+    ts = times[i]
+    return f"{ts}.{i - bisect.bisect_left(times, ts)}"
+
+
+def _parse_cursor(cursor: str) -> tuple[int, int]:
     try:
-        escaped_msg = message.replace('"', '\\"')
-        escaped_title = title.replace('"', '\\"')
-        script = (
-            f'display notification "{escaped_msg}" '
-            f'with title "{escaped_title}" sound name "default"'
-        )
-        subprocess.run(
-            ["osascript", "-e", script],
-            capture_output=True,
-            timeout=5,
-        )
-        logger.info("macOS 通知已发送: [%s] %s", title, message)
-    except Exception:
-        logger.exception("发送 macOS 通知失败")
+        ts_str, skip_str = cursor.split(".")
+        return int(ts_str), int(skip_str)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的游标: {cursor}") from None
+
+
+def _decode_cursor(times: Sequence[int], cursor: str) -> int:
+    ts, skip = _parse_cursor(cursor)
+    return bisect.bisect_left(times, ts) + skip
+
+
+def _page_range(
+    times: Sequence[int],
+    start_ts: int,
+    end_ts: int | None,
+    limit: int | None,
+    cursor: str | None,
+) -> tuple[int, int, str | None]:
+    """
+    在升序时间数组上定位 [start_ts, end_ts] 的一页。
+
+    返回 (lo, hi, next_cursor)，代价为 O(log n)，与总数据量无关。
+    """
+    lo = bisect.bisect_left(times, start_ts)
+    if cursor:
+        lo = max(lo, _decode_cursor(times, cursor))
+    hi = bisect.bisect_right(times, end_ts) if end_ts is not None else len(times)
+    hi = max(hi, lo)
+
+    next_cursor = None
+    if limit is not None and hi - lo > limit:
+        hi = lo + limit
+        next_cursor = _encode_cursor(times, hi)
+    return lo, hi, next_cursor
 
 
 # ---------------------------------------------------------------------------
-# Taostats API 请求
+# SQLite 存储后端（须在 MonitorState 前定义）
 # ---------------------------------------------------------------------------
-def _build_headers() -> dict[str, str]:
-    """构造 API 请求头，含可选的 API Key"""
-    headers: dict[str, str] = {"Accept": "application/json"}
-    if state.config.api_key:
-        headers["Authorization"] = state.config.api_key
-    return headers
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_history (
+    ts INTEGER NOT NULL,
+    timestamp TEXT NOT NULL UNIQUE,
+    price_rao INTEGER NOT NULL,
+    price_tao REAL NOT NULL,
+    price_usd REAL NOT NULL,
+    subnet_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS price_history_ts ON price_history (ts);
+CREATE TABLE IF NOT EXISTS subnet_events (
+    ts INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    subnet_id INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (timestamp, subnet_id)
+);
+CREATE INDEX IF NOT EXISTS subnet_events_ts ON subnet_events (ts);
+CREATE TABLE IF NOT EXISTS historical_points (
+    ts INTEGER PRIMARY KEY,
+    price_rao INTEGER NOT NULL,
+    price_tao REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS candles (
+    granularity TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    open REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (granularity, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS blobs (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+"""
 
 
-async def _fetch_stats(client: httpx.AsyncClient) -> dict[str, Any] | None:
-    """获取 Taostats 最新统计数据"""
-    try:
-        resp = await client.get(STATS_API_URL, headers=_build_headers(), timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-        logger.debug("Stats API 原始响应: %s", json.dumps(data, ensure_ascii=False)[:500])
-        return data
-    except httpx.HTTPStatusError as exc:
-        logger.error("Stats API 请求失败 (HTTP %d): %s", exc.response.status_code, exc)
-    except Exception:
-        logger.exception("Stats API 请求异常")
-    return None
+class SqliteStore:
+    """
+    可选的 SQLite 存储后端（storage_backend = "sqlite"，数据文件 data/monitor.db）。
+
+    价格记录、子网事件、Taostats 历史点与各颗粒度 K 线存放在按时间索引的表中（WAL 模式）。
+    写入先在内存中缓冲，由 PersistenceService 在后台线程以单个事务批量提交；
+    /api/kline 直接在库上做范围查询（合并尚未提交的蜡烛），进程内只保留每个颗粒度的最后一根蜡烛，
+    Taostats 历史点也只在内存中保留最后一个（增量同步的高水位），启动耗时与历史总量无关。
+    价格记录与子网事件在库中的保留期与内存中的近期窗口相同（raw_retention_hours），
+    库只用于持久化，/api/history 由内存中的 state.history 提供。
+    对外提供与 HistoryLog 相同的 append / should_compact / rotate / compact / close 接口，可直接替换。
+    """
 
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = self._connect()  # 只在后台写盘线程（及启动迁移）中使用
+        self._db.executescript(_SQLITE_SCHEMA)
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        self._buf_lock = threading.Lock()
+        self._prices: list[tuple] = []
+        self._events: list[tuple] = []
+        self._candles: dict[tuple[str, int], tuple] = {}
+        self._flushing_candles: dict[tuple[str, int], tuple] = {}  # 正在提交的蜡烛，提交完成前读取时合并
+        self._historical_new: list[tuple] = []  # 增量同步新增的历史点
+        self._historical: HistoricalSeries | None = None  # 非 None 时整表替换（行在写盘线程中生成）
+        self._all_candles: "CandleEngine | None" = None  # 非 None 时整表替换（行在写盘线程中生成）
+        self.historical_count = 0
+        self.commits = 0  # 已提交的批次数，在库上查询的响应缓存以此判断结果是否仍有效
+        self._trim_ts: int | None = None
+        self._blobs: dict[str, bytes] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    # ---- 写入（缓冲后批量提交）----
+    def append(self, kind: str, item: BaseModel) -> None:
+        """缓冲一条记录，kind 为 "price" 或 "event" """
+        ts = _parse_ts(item.timestamp) or 0
+        with self._buf_lock:
+            if kind == "price":
+                self._prices.append(
+                    (ts, item.timestamp, item.price_rao, item.price_tao, item.price_usd, item.subnet_count)
+                )
+            elif kind == "event":
+                self._events.append((ts, item.timestamp, item.subnet_id, item.event))
+        self._schedule()
+
+    def upsert_candles(self, engine: "CandleEngine") -> None:
+        """登记每个颗粒度最后一根蜡烛的最新值（每次追加价格后调用）"""
+        with self._buf_lock:
+            for name, series in engine.series.items():
+                if series:
+                    ts = series.times[-1]
+                    self._candles[(name, ts)] = (
+                        name, ts, series.open[-1], series.high[-1], series.low[-1], series.close[-1]
+                    )
+        self._schedule()
+
+    def replace_historical(self, series: HistoricalSeries, engine: "CandleEngine") -> None:
+        """
+        Taostats 历史缓存全量加载后整体替换历史点与 K 线。
+        只登记引用，行在写盘线程中生成；调用方此后不得再修改 series 与 engine。
+        """
+        with self._buf_lock:
+            self._historical = series
+            self._historical_new = []
+            self._all_candles = engine
+            self._candles.clear()
+            self.historical_count = len(series)
+        self._schedule()
+
+    def extend_historical(self, series: HistoricalSeries) -> None:
+        """登记增量同步新增的历史点（INSERT OR IGNORE），之后应调用 rebuild_candles"""
+        with self._buf_lock:
+            self._historical_new.extend(zip(series.times, series.price_rao, series.price_tao))
+            self.historical_count += len(series)
+        self._schedule()
+
+    def rebuild_candles(
+        self, since_ts: int, live: list[tuple[int, float]], rollups: RollupStore
+    ) -> "CandleEngine":
+        """
+        历史点增量同步后，从 since_ts 所在的周起重建各颗粒度 K 线，登记为待提交并返回（在工作线程中调用）。
+        周边界同时是所有颗粒度的桶边界；每个颗粒度以边界前的最后一根蜡烛为种子，开盘价规则与 build 一致。
+        """
+        week = GRANULARITY_SECONDS["1w"]
+        start = since_ts // week * week
+        with self._buf_lock:
+            pending = [(ts, tao) for ts, _, tao in self._historical_new if ts >= start]
+        hist = self._query("SELECT ts, price_tao FROM historical_points WHERE ts >= ? ORDER BY ts", (start,))
+        points = sorted(dict([*hist, *pending]).items())
+
+        engine = CandleEngine()
+        for name, series in engine.series.items():
+            rows = self._query(
+                "SELECT ts, open, high, low, close FROM candles WHERE granularity = ? AND ts < ? "
+                "ORDER BY ts DESC LIMIT 1",
+                (name, start),
+            )
+            for ts, o, h, l, c in rows:
+                series.times.append(ts)
+                series.open.append(o)
+                series.high.append(h)
+                series.low.append(l)
+                series.close.append(c)
+        sources = [
+            ((ts, p, p, p, p) for ts, p in points),
+            (c for c in rollups.candles() if c[0] >= start),
+            ((ts, p, p, p, p) for ts, p in live if ts >= start),
+        ]
+        for candle in heapq.merge(*sources, key=lambda c: c[0]):
+            for series in engine.series.values():
+                series.add_candle(*candle)
+
+        rows = {
+            (name, values[0]): (name, *values)
+            for name, series in engine.series.items()
+            for values in series.rows()
+        }
+        with self._buf_lock:
+            self._candles.update(rows)
+        self._schedule()
+        return engine
+
+    def trim_before(self, cutoff_ts: int) -> None:
+        """删除 cutoff_ts 之前的价格记录与子网事件（随下一批提交执行）"""
+        with self._buf_lock:
+            self._trim_ts = cutoff_ts
+        self._schedule()
+
+    def save_blob(self, key: str, value: bytes) -> None:
+        """整体替换一个二进制值（如降采样数据），同一批内只保留最后一次"""
+        with self._buf_lock:
+            self._blobs[key] = value
+        self._schedule()
+
+    def _schedule(self) -> None:
+        persistence.schedule_task(self.path, self.flush)
+
+    def flush(self) -> None:
+        """在一个事务中提交所有缓冲的写入"""
+        with self._buf_lock:
+            prices, self._prices = self._prices, []
+            events, self._events = self._events, []
+            self._flushing_candles, self._candles = self._candles, {}
+            candles = list(self._flushing_candles.values())
+            historical, self._historical = self._historical, None
+            historical_new, self._historical_new = self._historical_new, []
+            all_candles, self._all_candles = self._all_candles, None
+            trim_ts, self._trim_ts = self._trim_ts, None
+            blobs, self._blobs = list(self._blobs.items()), {}
+
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR IGNORE INTO price_history VALUES (?, ?, ?, ?, ?, ?)", prices)
+            db.executemany("INSERT OR IGNORE INTO subnet_events VALUES (?, ?, ?, ?)", events)
+            if historical is not None:
+                db.execute("DELETE FROM historical_points")
+                db.executemany(
+                    "INSERT INTO historical_points VALUES (?, ?, ?)",
+                    zip(historical.times, historical.price_rao, historical.price_tao),
+                )
+            db.executemany("INSERT OR IGNORE INTO historical_points VALUES (?, ?, ?)", historical_new)
+            if all_candles is not None:
+                db.execute("DELETE FROM candles")
+                db.executemany(
+                    "INSERT INTO candles VALUES (?, ?, ?, ?, ?, ?)",
+                    ((name, *values) for name, series in all_candles.series.items() for values in series.rows()),
+                )
+            db.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?)", candles)
+            if trim_ts is not None:
+                db.execute("DELETE FROM price_history WHERE ts < ?", (trim_ts,))
+                db.execute("DELETE FROM subnet_events WHERE ts < ?", (trim_ts,))
+            db.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?)", blobs)
+            db.execute("COMMIT")
+            self.commits += 1
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            with self._buf_lock:
+                self._flushing_candles = {}
 
-async def _fetch_subnets(client: httpx.AsyncClient) -> list[dict[str, Any]] | None:
-    """获取子网列表"""
-    try:
-        resp = await client.get(SUBNETS_API_URL, headers=_build_headers(), timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-        logger.debug("Subnets API 原始响应长度: %d", len(json.dumps(data)))
-        return data
-    except httpx.HTTPStatusError as exc:
-        logger.error("Subnets API 请求失败 (HTTP %d): %s", exc.response.status_code, exc)
-    except Exception:
-        logger.exception("Subnets API 请求异常")
-    return None
+    def should_compact(self) -> bool:
+        return False
 
+    def rotate(self) -> None:
+        pass
 
-async def _fetch_tao_usd_price(client: httpx.AsyncClient) -> float | None:
-    """从 CoinMarketCap 获取 TAO/USD 实时价格"""
-    try:
-        resp = await client.get(
-            CMC_PRICE_URL,
-            headers={"X-CMC_PRO_API_KEY": CMC_API_KEY, "Accept": "application/json"},
-            params={"symbol": "TAO", "convert": "USD"},
-            timeout=10,
+    def compact(self, history: HistoryData) -> None:
+        pass
+
+    def close(self) -> None:
+        self._db.close()
+        self._reader.close()
+
+    # ---- 读取 ----
+    def _query(self, sql: str, params: Sequence[Any] = ()) -> list[tuple]:
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def is_empty(self) -> bool:
+        return not self._query(
+            "SELECT 1 FROM price_history UNION ALL SELECT 1 FROM historical_points LIMIT 1"
         )
-        resp.raise_for_status()
-        data = resp.json()
-        price = (
-            data.get("data", {})
-                .get("TAO", {})
-                .get("quote", {})
-                .get("USD", {})
-                .get("price")
+
+    def import_data(self, history: HistoryData, series: HistoricalSeries, engine: "CandleEngine") -> None:
+        """把 JSON 存储中的数据一次性导入（首次切换到 SQLite 时）"""
+        for record in history.price_history:
+            self.append("price", record)
+        for event in history.new_subnet_events:
+            self.append("event", event)
+        self.replace_historical(series, engine)
+        self.flush()
+
+    def load_history(self, since_ts: int) -> HistoryData:
+        """只加载 since_ts 之后的近期历史到内存"""
+        prices = self._query(
+            "SELECT timestamp, price_rao, price_tao, price_usd, subnet_count FROM price_history "
+            "WHERE ts >= ? ORDER BY ts, rowid",
+            (since_ts,),
+        )
+        events = self._query(
+            "SELECT timestamp, subnet_id, event FROM subnet_events WHERE ts >= ? ORDER BY ts, rowid",
+            (since_ts,),
+        )
+        return HistoryData(
+            price_history=[
+                PriceRecord(timestamp=r[0], price_rao=r[1], price_tao=r[2], price_usd=r[3], subnet_count=r[4])
+                for r in prices
+            ],
+            new_subnet_events=[SubnetEvent(timestamp=r[0], subnet_id=r[1], event=r[2]) for r in events],
+        )
+
+    def load_blob(self, key: str) -> bytes | None:
+        rows = self._query("SELECT value FROM blobs WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def load_historical_tail(self) -> HistoricalSeries:
+        """只加载最后一个历史点（增量同步的高水位），并统计总点数"""
+        self.historical_count = self._query("SELECT COUNT(*) FROM historical_points")[0][0]
+        rows = self._query("SELECT ts, price_rao, price_tao FROM historical_points ORDER BY ts DESC LIMIT 1")
+        return HistoricalSeries(
+            array("q", (r[0] for r in rows)),
+            array("q", (r[1] for r in rows)),
+            array("d", (r[2] for r in rows)),
+        )
+
+    def load_candle_tails(self) -> "CandleEngine":
+        """每个颗粒度只加载最后一根蜡烛，供实时追加与 candle_update 推送"""
+        engine = CandleEngine()
+        for name, series in engine.series.items():
+            rows = self._query(
+                "SELECT ts, open, high, low, close FROM candles WHERE granularity = ? ORDER BY ts DESC LIMIT 1",
+                (name,),
+            )
+            for ts, o, h, l, c in rows:
+                series.times.append(ts)
+                series.open.append(o)
+                series.high.append(h)
+                series.low.append(l)
+                series.close.append(c)
+        return engine
+
+    def _page(
+        self,
+        columns: str,
+        table: str,
+        where: str,
+        params: tuple,
+        order: str,
+        start_ts: int,
+        end_ts: int | None,
+        limit: int | None,
+        cursor: str | None,
+        pending: dict[int, tuple] | None = None,
+    ) -> tuple[list[tuple], str | None]:
+        """
+        按 ts 升序的范围分页查询（columns 首列须为 ts），游标格式与内存中的 _page_range 一致。
+        pending 为尚未提交的行（ts -> 行），按 ts 覆盖或插入库中的结果，只用于 ts 唯一的查询。
+        """
+        lo_ts, skip = start_ts, 0
+        if cursor:
+            cursor_ts, cursor_skip = _parse_cursor(cursor)
+            if cursor_ts >= start_ts:
+                lo_ts, skip = cursor_ts, cursor_skip
+        sql = f"SELECT {columns} FROM {table} WHERE {where}ts >= ?"
+        args = [*params, lo_ts]
+        if end_ts is not None:
+            sql += " AND ts <= ?"
+            args.append(end_ts)
+        sql += f" ORDER BY {order} LIMIT ? OFFSET ?"
+        args += [limit + 1 if limit is not None else -1, skip]
+        rows = self._query(sql, args)
+        if pending:
+            merged = {r[0]: r for r in rows}
+            merged.update(
+                (ts, row) for ts, row in pending.items() if ts >= lo_ts and (end_ts is None or ts <= end_ts)
+            )
+            rows = [merged[ts] for ts in sorted(merged)]
+            if limit is not None:
+                rows = rows[:limit + 1]
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            next_ts = rows[limit][0]
+            same = sum(1 for r in rows[:limit] if r[0] == next_ts)
+            next_cursor = f"{next_ts}.{same + (skip if next_ts == lo_ts else 0)}"
+            rows = rows[:limit]
+        return rows, next_cursor
+
+    def candle_page(
+        self, granularity: str, start_ts: int, end_ts: int | None, limit: int | None, cursor: str | None
+    ) -> tuple[list[dict], str | None]:
+        with self._buf_lock:
+            pending = {
+                ts: row[1:]
+                for (name, ts), row in (*self._flushing_candles.items(), *self._candles.items())
+                if name == granularity
+            }
+        rows, next_cursor = self._page(
+            "ts, open, high, low, close", "candles", "granularity = ? AND ", (granularity,), "ts",
+            start_ts, end_ts, limit, cursor, pending,
         )
-        if price is not None:
-            logger.info("TAO/USD 价格 (CMC): $%.4f", price)
-            return float(price)
-        logger.warning("CoinMarketCap 响应中未找到 TAO 价格: %s", data)
+        candles = [
+            {"time": ts, "open": round(o, 6), "high": round(h, 6), "low": round(l, 6), "close": round(c, 6)}
+            for ts, o, h, l, c in rows
+        ]
+        return candles, next_cursor
+
+    def candle_count(self, granularity: str, start_ts: int, end_ts: int | None) -> int:
+        sql = "SELECT COUNT(*) FROM candles WHERE granularity = ? AND ts >= ?"
+        args: list[Any] = [granularity, start_ts]
+        if end_ts is not None:
+            sql += " AND ts <= ?"
+            args.append(end_ts)
+        return self._query(sql, args)[0][0]
+
+
+def _load_rollups(db: SqliteStore | None) -> RollupStore:
+    """加载本地降采样数据（SQLite 后端存于 blobs 表，否则为 data/rollups.bin）"""
+    try:
+        if db is not None:
+            data = db.load_blob("rollups")
+        else:
+            data = ROLLUPS_PATH.read_bytes() if ROLLUPS_PATH.exists() else None
+        if data:
+            rollups = RollupStore.from_bytes(data)
+            logger.info("降采样数据已加载: %d 根蜡烛", len(rollups))
+            return rollups
     except Exception:
-        logger.warning("获取 TAO/USD 价格失败 (CMC)")
-    return None
+        logger.exception("加载降采样数据失败")
+    return RollupStore()
+
+
+def _save_rollups(rollups: RollupStore, db: SqliteStore | None) -> None:
+    """保存本地降采样数据（后台防抖写入）"""
+    data = rollups.to_bytes()
+    rollups.dirty = False
+    if db is not None:
+        db.save_blob("rollups", data)
+    else:
+        persistence.schedule(ROLLUPS_PATH, lambda: data)
 
 
-async def _fetch_taostats_history_all(client: httpx.AsyncClient) -> list[dict]:
+def _load_storage(
+    store: HistoryLog | SqliteStore, config: AppConfig, migrate: bool = True
+) -> tuple[HistoryData, HistoricalSeries, RollupStore, CandleEngine]:
     """
-    分页获取 Taostats 全部历史统计数据。
-    每页最多200条，自动翻页直到获取完毕。
-    返回按时间升序排列的记录列表。
+    从存储后端加载近期历史、Taostats 历史缓存、本地降采样数据与 K 线；
+    首次启用 SQLite 时导入 JSON 存储中的数据。
+
+    migrate 为 False（多进程部署的从节点）时只读：不导入 SQLite、不迁移旧版缓存，
+    主节点尚未完成导入时直接从 JSON 存储读取，避免与主节点同时写共享的数据文件。
     """
-    all_records: list[dict] = []
-    page = 1
+    legacy_json = isinstance(store, SqliteStore) and store.is_empty() and (
+        HISTORY_PATH.exists() or HISTORICAL_CACHE_PATH.exists()
+    )
+    if not isinstance(store, SqliteStore) or (legacy_json and not migrate):
+        history = _load_history(HistoryLog(HISTORY_LOG_PATH) if legacy_json else store)
+        cache = _load_historical_cache(migrate)
+        rollups = _load_rollups(None)
+        if legacy_json:
+            logger.info("SQLite 存储尚未由主节点导入，暂从 JSON 存储读取")
+        return history, cache, rollups, CandleEngine.build(cache, _live_price_points(history), rollups)
+
+    if legacy_json:
+        history = _load_history(HistoryLog(HISTORY_LOG_PATH))
+        cache = _load_historical_cache()
+        rollups = _load_rollups(None)
+        store.save_blob("rollups", rollups.to_bytes())
+        store.import_data(history, cache, CandleEngine.build(cache, _live_price_points(history), rollups))
+        logger.info("JSON 存储已导入 SQLite: %s", store.path)
+
+    since_ts = int((datetime.now(timezone.utc) - timedelta(hours=config.raw_retention_hours)).timestamp())
+    history = store.load_history(since_ts)
+    cache = store.load_historical_tail()
+    logger.info(
+        "SQLite 存储已加载: %d 条近期价格记录，%d 条历史缓存", len(history.price_history), store.historical_count
+    )
+    return history, cache, _load_rollups(store), store.load_candle_tails()
+
+
+# ---------------------------------------------------------------------------
+# 子网指标时间序列（须在 MonitorState 前定义）
+# ---------------------------------------------------------------------------
+def _to_float(value: Any) -> float:
+    """把 API 中的数值（可能是字符串）转为 float，无法解析时为 NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class SubnetMetricsStore:
+    """
+    每个子网若干数值字段的时间序列，固定容量的环形缓冲。
+
+    所有子网共享一条采样时间轴 times；每个 (字段, 子网) 一条与之对齐的 array("d")，
+    缺失值为 NaN。内存上界 = capacity × 子网数 × 字段数 × 8 字节；
+    连续一个完整窗口未出现的子网会被回收。
+    """
+
+    def __init__(self, fields: list[str], capacity: int) -> None:
+        self.fields = list(fields)
+        self.capacity = max(1, capacity)
+        self.times = array("q", bytes(8 * self.capacity))
+        self.count = 0  # 累计写入的采样数
+        self.columns: dict[str, dict[int, array]] = {f: {} for f in self.fields}
+        self.last_seen: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def _pos(self, i: int) -> int:
+        """逻辑下标（0 = 当前窗口内最早的采样）转为环形缓冲下标"""
+        return (self.count - len(self) + i) % self.capacity
+
+    def record(self, ts: int, subnets: list[dict[str, Any]]) -> None:
+        pos = self.count % self.capacity
+        self.times[pos] = ts
+        seen: set[int] = set()
+
+        for subnet in subnets:
+            netuid = subnet.get("netuid")
+            if netuid is None:
+                continue
+            netuid = int(netuid)
+            seen.add(netuid)
+            self.last_seen[netuid] = self.count
+            for field in self.fields:
+                col = self.columns[field].get(netuid)
+                if col is None:
+                    col = self.columns[field][netuid] = array("d", [math.nan]) * self.capacity
+                col[pos] = _to_float(subnet.get(field))
+
+        # 本次未出现的子网在该位置写 NaN，整窗未出现的子网直接回收
+        expired = [n for n, last in self.last_seen.items() if last <= self.count - self.capacity]
+        for netuid in expired:
+            del self.last_seen[netuid]
+            for cols in self.columns.values():
+                cols.pop(netuid, None)
+        for cols in self.columns.values():
+            for netuid, col in cols.items():
+                if netuid not in seen:
+                    col[pos] = math.nan
+        self.count += 1
+
+    def _index_range(self, start_ts: int, end_ts: int | None) -> range:
+        n = len(self)
+        key = lambda i: self.times[self._pos(i)]  # noqa: E731
+        lo = bisect.bisect_left(range(n), start_ts, key=key)
+        hi = bisect.bisect_right(range(n), end_ts, key=key) if end_ts is not None else n
+        return range(lo, max(lo, hi))
+
+    def series(
+        self,
+        netuid: int,
+        fields: list[str],
+        start_ts: int,
+        end_ts: int | None = None,
+    ) -> dict[str, Any]:
+        """单个子网在时间范围内的列式数据：{"times": [...], "values": {field: [...]}}"""
+        idx = [self._pos(i) for i in self._index_range(start_ts, end_ts)]
+        values: dict[str, list[float | None]] = {}
+        for field in fields:
+            col = self.columns.get(field, {}).get(netuid)
+            values[field] = [None] * len(idx) if col is None else [
+                None if math.isnan(col[p]) else col[p] for p in idx
+            ]
+        return {"times": [self.times[p] for p in idx], "values": values}
+
+    def cross_section(self, at_ts: int | None, fields: list[str]) -> tuple[int | None, list[dict[str, Any]]]:
+        """所有子网在 at_ts 时刻（不晚于它的最近一次采样）的截面，返回 (采样时间, 行)"""
+        n = len(self)
+        if at_ts is None:
+            i = n - 1
+        else:
+            i = bisect.bisect_right(range(n), at_ts, key=lambda j: self.times[self._pos(j)]) - 1
+        if i < 0:
+            return None, []
+
+        pos = self._pos(i)
+        rows: dict[int, dict[str, Any]] = {}
+        for field in fields:
+            for netuid, col in self.columns.get(field, {}).items():
+                value = col[pos]
+                if not math.isnan(value):
+                    rows.setdefault(netuid, {"netuid": netuid})[field] = value
+        return self.times[pos], [rows[k] for k in sorted(rows)]
+
+
+# ---------------------------------------------------------------------------
+# 告警引擎（须在 MonitorState 前定义）
+# ---------------------------------------------------------------------------
+class _LevelIndex:
+    """
+    同一数值流上的一组阈值，按阈值排序。
+
+    above 规则在 value >= level 时处于触发态，below 规则在 value <= level 时处于触发态。
+    数值从 v0 变到 v1 时，状态翻转的恰好是阈值落在 v0、v1 之间的规则，二分即可定位。
+    """
+
+    def __init__(self, above: list[tuple[float, str]], below: list[tuple[float, str]]) -> None:
+        above.sort()
+        below.sort()
+        self.above_levels = [level for level, _ in above]
+        self.above_ids = [rule_id for _, rule_id in above]
+        self.below_levels = [level for level, _ in below]
+        self.below_ids = [rule_id for _, rule_id in below]
+        self.value: float | None = None
+
+    def update(self, value: float) -> tuple[list[str], list[str]]:
+        """返回 (进入触发态的规则, 离开触发态的规则)；首次调用返回全部规则的状态"""
+        v0, self.value = self.value, value
+        al, bl = self.above_levels, self.below_levels
+
+        if v0 is None:
+            a, b = bisect.bisect_right(al, value), bisect.bisect_left(bl, value)
+            return self.above_ids[:a] + self.below_ids[b:], self.above_ids[a:] + self.below_ids[:b]
+        if value > v0:
+            on = self.above_ids[bisect.bisect_right(al, v0):bisect.bisect_right(al, value)]
+            off = self.below_ids[bisect.bisect_left(bl, v0):bisect.bisect_left(bl, value)]
+            return on, off
+        if value < v0:
+            off = self.above_ids[bisect.bisect_right(al, value):bisect.bisect_right(al, v0)]
+            on = self.below_ids[bisect.bisect_left(bl, value):bisect.bisect_left(bl, v0)]
+            return on, off
+        return [], []
+
+    def nearest(self, value: float) -> float | None:
+        """value 到最近阈值的距离；没有阈值返回 None"""
+        best = None
+        for levels in (self.above_levels, self.below_levels):
+            i = bisect.bisect_left(levels, value)
+            for level in levels[max(0, i - 1):i + 1]:
+                d = abs(level - value)
+                if best is None or d < best:
+                    best = d
+        return best
+
+
+class AlertEngine:
+    """
+    告警引擎：规则按所依赖的数值流分组，每组一个 _LevelIndex。
+
+    - ("price",)：当前注册费，对应 above / below 规则
+    - ("pct", window)：窗口内涨跌幅，对应 pct_change 规则
+    - ("eta", window, eta_seconds)：按窗口趋势外推 eta_seconds 后的价格，对应 eta 规则
+    窗口类数值由每个窗口一条滚动队列计算。每次轮询的代价为 O(分组数 × log n + 翻转的规则数)，
+    与规则总数无关。触发状态与用户规则保存在 data/alert_rules.json，与主配置分开。
+    """
+
+    def __init__(self, rules: list[AlertRule], thresholds: list[AlertThreshold], triggered: set[str]) -> None:
+        self.user_rules: dict[str, AlertRule] = {r.id: r for r in rules}
+        self.triggered = triggered
+        self._thresholds: dict[str, AlertThreshold] = {}
+        self.dirty = False
+        self._windows: dict[int, deque[tuple[int, float]]] = {}
+        self.set_thresholds(thresholds)
+
+    @staticmethod
+    def threshold_id(t: AlertThreshold) -> str:
+        return f"cfg:{t.id}"
+
+    def _assign_threshold_ids(self, thresholds: list[AlertThreshold]) -> None:
+        """
+        为缺少 id（或 id 重复）的阈值分配 id：不带 id 提交的旧客户端按内容沿用已有阈值的 id，
+        其余按内容与重复序号派生，未保存过 id 的旧配置在每次启动、每个进程中得到相同的 id。
+        """
+        explicit = {t.id for t in thresholds if t.id}
+        used: set[str] = set()
+        reusable: dict[tuple, list[str]] = {}
+        for t in self._thresholds.values():
+            if t.id not in explicit:
+                reusable.setdefault((t.type, t.price_tao, t.label), []).append(t.id)
+        for t in thresholds:
+            if t.id and t.id not in used:
+                used.add(t.id)
+                continue
+            key = (t.type, t.price_tao, t.label)
+            candidates = [i for i in reusable.get(key, []) if i not in used]
+            if candidates:
+                t.id = candidates[0]
+            else:
+                n = 0
+                while True:
+                    n += 1
+                    t.id = uuid.uuid5(uuid.NAMESPACE_OID, f"{t.type}:{t.price_tao}:{t.label}:{n}").hex[:12]
+                    if t.id not in used and t.id not in explicit:
+                        break
+            used.add(t.id)
+
+    def set_thresholds(self, thresholds: list[AlertThreshold]) -> None:
+        """
+        配置中的阈值变更后调用：分配稳定 id，转换为规则并重建索引。
+        阈值的触发状态只来自 self.triggered，配置（或 UI 回传）中的 triggered 字段被忽略。
+        """
+        self._assign_threshold_ids(thresholds)
+        self._thresholds = {self.threshold_id(t): t for t in thresholds}
+        self.reindex()
+
+    def thresholds_payload(self, config: AppConfig) -> list[dict[str, Any]]:
+        """配置中的阈值及其当前触发状态（/api/config 返回）"""
+        return [
+            {**t.model_dump(), "triggered": self.threshold_id(t) in self.triggered}
+            for t in config.alert_thresholds
+        ]
+
+    @property
+    def rules(self) -> dict[str, AlertRule]:
+        legacy = {
+            rule_id: AlertRule(id=rule_id, kind=t.type, price_tao=t.price_tao, label=t.label)
+            for rule_id, t in self._thresholds.items()
+        }
+        return {**legacy, **self.user_rules}
+
+    def reindex(self) -> None:
+        """规则增删后重建分组索引（O(n log n)，只在规则变化时发生）"""
+        self._rules = self.rules
+        groups: dict[tuple, tuple[list, list]] = {}
+        for rule in self._rules.values():
+            if rule.kind in ("above", "below"):
+                key, level, side = ("price",), rule.price_tao, rule.kind
+            elif rule.kind == "pct_change":
+                key, level = ("pct", rule.window_seconds), rule.pct
+                side = "above" if rule.pct >= 0 else "below"
+            elif rule.kind == "eta":
+                key, level, side = ("eta", rule.window_seconds, rule.eta_seconds), rule.price_tao, "below"
+            else:
+                continue
+            above, below = groups.setdefault(key, ([], []))
+            (above if side == "above" else below).append((level, rule.id))
+
+        self._groups = {key: _LevelIndex(above, below) for key, (above, below) in groups.items()}
+        needed = {key[1] for key in self._groups if key[0] != "price"}
+        self._windows = {w: self._windows.get(w, deque()) for w in needed}
+        self.triggered &= set(self._rules)
+
+    def add_rule(self, rule: AlertRule) -> AlertRule:
+        if not rule.id:
+            rule.id = uuid.uuid4().hex[:12]
+        self.user_rules[rule.id] = rule
+        self.reindex()
+        self.dirty = True
+        return rule
+
+    def remove_rule(self, rule_id: str) -> bool:
+        if self.user_rules.pop(rule_id, None) is None:
+            return False
+        self.reindex()
+        self.dirty = True
+        return True
+
+    def _group_value(self, key: tuple, ts: int, price: float) -> float | None:
+        if key[0] == "price":
+            return price
+        window = self._windows[key[1]]
+        if len(window) < 2:
+            return None
+        t0, p0 = window[0]
+        if key[0] == "pct":
+            return (price - p0) / p0 * 100 if p0 > 0 else None
+        slope = (price - p0) / (ts - t0) if ts > t0 else 0.0
+        return price + slope * key[2]
+
+    def _describe(self, rule: AlertRule, ts: int, price: float) -> str:
+        label = f" ({rule.label})" if rule.label else ""
+        if rule.kind in ("above", "below"):
+            direction = "低于" if rule.kind == "below" else "高于"
+            return f"注册费 {price:.4f} TAO 已{direction} {rule.price_tao} TAO{label}"
+        t0, p0 = self._windows[rule.window_seconds][0]
+        if rule.kind == "pct_change":
+            change = (price - p0) / p0 * 100
+            return f"注册费 {ts - t0} 秒内变动 {change:+.2f}%（阈值 {rule.pct:+.2f}%）{label}"
+        slope = (price - p0) / (ts - t0) if ts > t0 else 0.0
+        eta = max(0.0, (price - rule.price_tao) / -slope) if slope < 0 else 0.0
+        return f"按近期下降趋势，注册费预计 {eta / 60:.0f} 分钟内降至 {rule.price_tao} TAO{label}"
+
+    def price_proximity(self, price: float) -> float | None:
+        """price 到最近的价格阈值（above / below 规则）的相对距离；没有价格规则或价格未知返回 None"""
+        index = self._groups.get(("price",))
+        if index is None or price <= 0:
+            return None
+        distance = index.nearest(price)
+        return None if distance is None else distance / price
+
+    def evaluate(self, ts: int, price: float) -> list[tuple[AlertRule, str]]:
+        """用最新价格推进所有数值流，返回本次新触发的 (规则, 描述)"""
+        for seconds, window in self._windows.items():
+            window.append((ts, price))
+            while len(window) > 2 and window[1][0] <= ts - seconds:
+                window.popleft()
+
+        fired: list[tuple[AlertRule, str]] = []
+        for key, index in self._groups.items():
+            value = self._group_value(key, ts, price)
+            if value is None:
+                continue
+            on, off = index.update(value)
+            for rule_id in on:
+                if rule_id not in self.triggered:
+                    self.triggered.add(rule_id)
+                    self.dirty = True
+                    rule = self._rules[rule_id]
+                    fired.append((rule, self._describe(rule, ts, price)))
+            for rule_id in off:
+                if rule_id in self.triggered:
+                    # 数值回到阈值范围外，重置触发状态以便下次再次告警
+                    self.triggered.discard(rule_id)
+                    self.dirty = True
+                    logger.info("阈值已重置: %s (%s)", self._rules[rule_id].label or rule_id, key[0])
+        return fired
+
+
+def _load_alert_engine(config: AppConfig) -> AlertEngine:
+    """从 data/alert_rules.json 加载用户规则与触发状态，并合并配置中的阈值"""
+    rules: list[AlertRule] = []
+    triggered: set[str] = set()
+    # 触发状态迁出 config.json 之前保存在阈值的 triggered 字段中，
+    # 只在首次迁移（尚无 alert_rules.json）时读取
+    legacy = [] if ALERT_RULES_PATH.exists() else [t for t in config.alert_thresholds if t.triggered]
+    if ALERT_RULES_PATH.exists():
+        try:
+            raw = json.loads(ALERT_RULES_PATH.read_text(encoding="utf-8"))
+            rules = [AlertRule(**r) for r in raw.get("rules", [])]
+            triggered = set(raw.get("triggered", []))
+            logger.info("告警规则已加载: %d 条", len(rules))
+        except Exception:
+            logger.exception("加载告警规则失败")
+    engine = AlertEngine(rules, config.alert_thresholds, triggered)
+    if legacy:
+        engine.triggered |= {engine.threshold_id(t) for t in legacy}
+        engine.dirty = True
+    return engine
+
+
+def _save_alert_state(engine: AlertEngine) -> None:
+    """保存用户规则与触发状态（后台防抖写入）"""
+    data = {
+        "rules": [r.model_dump() for r in engine.user_rules.values()],
+        "triggered": sorted(engine.triggered),
+    }
+    engine.dirty = False
+    persistence.schedule(
+        ALERT_RULES_PATH,
+        lambda: (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode("utf-8"),
+    )
+
+
+# ---------------------------------------------------------------------------
+# 全局状态
+# ---------------------------------------------------------------------------
+class MonitorState:
+    """
+    运行时状态容器，避免可变全局变量。
+
+    导入时只读取配置与告警规则；历史、历史缓存、降采样数据与 K 线由 _load_from_disk
+    在后台加载（loaded 为 False 期间为空，接口返回部分数据），服务因此可以立即接受连接。
+    """
+
+    def __init__(self) -> None:
+        self.config: AppConfig = _load_config()
+        self.alerts: AlertEngine = _load_alert_engine(self.config)
+        self.db: SqliteStore | None = (
+            SqliteStore(SQLITE_PATH) if self.config.storage_backend == "sqlite" else None
+        )
+        self.history_log: HistoryLog | SqliteStore = self.db or HistoryLog(HISTORY_LOG_PATH)
+        self.loaded = False
+        self.history = HistoryData()
+        self.historical_cache = HistoricalSeries()
+        self.candles = CandleEngine()
+        self.rollups = RollupStore()
+        self.history_index = HistoryIndex(self.history)
+        self.current_price_rao: int = 0
+        self.current_price_tao: float = 0.0
+        self.current_price_usd: float = 0.0
+        self.current_subnet_count: int = 0
+        self.known_subnet_ids: set[int] = set()
+        self.subnets_list: list[dict[str, Any]] = []
+        self.subnet_metrics = SubnetMetricsStore(
+            self.config.subnet_metric_fields,
+            self.config.subnet_metrics_retention_hours * 3600 // max(1, self.config.subnets_poll_interval_seconds),
+        )
+        self.ws_clients: dict[WebSocket, "WSClient"] = {}
+        self.poll_task: asyncio.Task | None = None
+        self.last_usd_fetch: datetime | None = None
+        self.last_history_fetch: datetime | None = None
+        self.history_cache_complete = True
+        # 各项数据最近一次成功更新的 epoch 秒："price" | "subnets" | "tao_usd"
+        self.updated_at: dict[str, float] = {}
+        # 当前 TAO/USD 价格的来源与请求耗时
+        self.usd_quote: dict[str, Any] | None = None
+        # 对外提供的当前数据快照（见 StateSnapshot），首次读取或首次更新时生成
+        self.snapshot: "StateSnapshot | None" = None
+        # 历史缓存 / K 线整体替换时更新的版本（毫秒时间戳），与快照版本共同构成响应的数据版本
+        self.history_version = 0
+
+
+state = MonitorState()
+
+
+def _freshness(item: str, ts: float | None) -> dict[str, Any]:
+    """
+    某项数据的新鲜度：updated_at 为最近一次成功更新的时间（ts，epoch 秒），age_seconds 为距今秒数；
+    超过 stale_after_intervals 个轮询间隔或从未更新过即 stale。
+    """
+    cfg = state.config
+    interval = {
+        "price": cfg.poll_interval_seconds,
+        "subnets": cfg.subnets_poll_interval_seconds,
+        "tao_usd": cfg.usd_poll_interval_seconds,
+    }[item]
+    if ts is None:
+        return {"updated_at": None, "age_seconds": None, "stale": True}
+    age = max(0.0, time.time() - ts)
+    return {
+        "updated_at": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+        "age_seconds": round(age, 1),
+        "stale": age > interval * cfg.stale_after_intervals,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 当前数据快照（读接口与 WebSocket 共用的预序列化响应）
+# ---------------------------------------------------------------------------
+SNAPSHOT_RENDER_SECONDS = 1.0  # 预序列化响应中 age_seconds / stale 的最大滞后
+
+
+class StateSnapshot:
+    """
+    某一时刻对外提供的当前数据，创建后不再修改。各轮询任务（从节点为复制事件）更新完状态后
+    生成新快照并整体替换 state.snapshot；读接口只取一次引用，不会读到更新到一半的状态，
+    且直接返回创建时已序列化好的 JSON。
+
+    version 只在数据变化时递增，从节点沿用主节点的版本号；同一版本每 SNAPSHOT_RENDER_SECONDS
+    秒最多重新序列化一次（rerender），只为刷新 age_seconds / stale / loading。
+    """
+
+    __slots__ = (
+        "version", "price_rao", "price_tao", "tao_usd_rate", "subnet_count", "subnets", "updated_at",
+        "usd_quote", "rendered_at", "price_frame", "current_json", "tao_usd_json", "subnets_json",
+        "etag",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        price_rao: int,
+        price_tao: float,
+        tao_usd_rate: float,
+        subnet_count: int,
+        subnets: list[dict[str, Any]],
+        updated_at: dict[str, float],
+        usd_quote: dict[str, Any] | None,
+    ) -> None:
+        self.version = version
+        self.price_rao = price_rao
+        self.price_tao = price_tao
+        self.tao_usd_rate = tao_usd_rate
+        self.subnet_count = subnet_count
+        self.subnets = subnets
+        self.updated_at = updated_at
+        self.usd_quote = usd_quote
+        self._render()
+
+    @classmethod
+    def capture(cls, version: int) -> "StateSnapshot":
+        """从当前状态生成快照（subnets_list 每次轮询整体替换，不会原地修改，可直接引用）"""
+        return cls(
+            version,
+            state.current_price_rao,
+            state.current_price_tao,
+            state.current_price_usd,
+            state.current_subnet_count,
+            state.subnets_list,
+            dict(state.updated_at),
+            state.usd_quote,
+        )
+
+    def rerender(self) -> "StateSnapshot":
+        return StateSnapshot(
+            self.version, self.price_rao, self.price_tao, self.tao_usd_rate, self.subnet_count,
+            self.subnets, self.updated_at, self.usd_quote,
+        )
+
+    def _render(self) -> None:
+        self.rendered_at = time.time()
+        price = _freshness("price", self.updated_at.get("price"))
+        tao_usd = _freshness("tao_usd", self.updated_at.get("tao_usd"))
+        subnets = _freshness("subnets", self.updated_at.get("subnets"))
+        message = {
+            "type": "price_update",
+            "version": self.version,
+            "timestamp": price["updated_at"] or datetime.now(timezone.utc).isoformat(),
+            "price_rao": self.price_rao,
+            "price_tao": self.price_tao,
+            "price_usd": round(self.price_tao * self.tao_usd_rate, 4) if self.tao_usd_rate else 0.0,
+            "tao_usd_rate": self.tao_usd_rate,
+            "subnet_count": self.subnet_count,
+            "age_seconds": price["age_seconds"],
+            "stale": price["stale"],
+            "freshness": {"price": price, "tao_usd": tao_usd},
+        }
+        self.price_frame = json.dumps(message, ensure_ascii=False)
+        del message["type"]
+        message["freshness"]["subnets"] = subnets
+        message["loading"] = not state.loaded
+        # 弱 ETag：同一版本内只有 age_seconds 随时间变化，过期与加载标志变化时 ETag 随之改变
+        flags = "".join(str(int(f["stale"])) for f in (price, tao_usd, subnets)) + str(int(state.loaded))
+        self.etag = f'W/"{self.version}-{flags}"'
+        self.current_json = _dumps(message)
+        self.tao_usd_json = _dumps({
+            "version": self.version,
+            "tao_usd": self.tao_usd_rate,
+            "timestamp": tao_usd["updated_at"] or datetime.now(timezone.utc).isoformat(),
+            "age_seconds": tao_usd["age_seconds"],
+            "stale": tao_usd["stale"],
+            **(self.usd_quote or {"source": None, "latency_ms": None}),
+        })
+        self.subnets_json = _dumps({
+            "version": self.version, "count": len(self.subnets), **subnets, "subnets": self.subnets,
+        })
+
+    def subnets_meta(self) -> dict[str, Any]:
+        """/api/subnets 列式编码的元数据（与 subnets_json 一致，不含行数据）"""
+        return {
+            "version": self.version,
+            "count": len(self.subnets),
+            **_freshness("subnets", self.updated_at.get("subnets")),
+        }
+
+
+def _publish_snapshot(version: int | None = None) -> StateSnapshot:
+    """
+    状态更新完后生成新快照并整体替换。主节点的版本号在上一版本上递增（起点为毫秒时间戳，
+    主节点切换后不会与旧版本重复），从节点传入主节点广播的版本号。
+    """
+    if version is None:
+        version = state.snapshot.version + 1 if state.snapshot else time.time_ns() // 1_000_000
+    state.snapshot = StateSnapshot.capture(version)
+    response_cache.invalidate()
+    return state.snapshot
+
+
+def _snapshot() -> StateSnapshot:
+    """当前快照；距上次序列化超过 SNAPSHOT_RENDER_SECONDS 时以相同数据重新序列化"""
+    snap = state.snapshot
+    if snap is None:
+        return _publish_snapshot()
+    if time.time() - snap.rendered_at >= SNAPSHOT_RENDER_SECONDS:
+        snap = state.snapshot = snap.rerender()
+    return snap
+
+
+# ---------------------------------------------------------------------------
+# 通知分发
+# ---------------------------------------------------------------------------
+class OsascriptBackend:
+    """通过 osascript 发送 macOS 桌面通知（仅 macOS 可用，其他平台由 _backends() 排除）"""
+
+    async def send(self, title: str, message: str) -> None:
+        escaped_msg = message.replace('"', '\\"')
+        escaped_title = title.replace('"', '\\"')
+        script = (
+            f'display notification "{escaped_msg}" '
+            f'with title "{escaped_title}" sound name "default"'
+        )
+        await _run_notify_command(["osascript", "-e", script])
+
+
+class WebhookBackend:
+    """以 JSON POST 到通用 Webhook"""
+
+    def __init__(self, url: str, client: httpx.AsyncClient) -> None:
+        self.url = url
+        self.client = client
+
+    async def send(self, title: str, message: str) -> None:
+        resp = await self.client.post(
+            self.url,
+            json={"title": title, "message": message, "timestamp": datetime.now(timezone.utc).isoformat()},
+            timeout=NOTIFY_TIMEOUT,
+        )
+        resp.raise_for_status()
+
+
+class CommandBackend:
+    """执行本地命令，title 与 message 作为追加参数"""
+
+    def __init__(self, command: str) -> None:
+        self.argv = shlex.split(command)
+
+    async def send(self, title: str, message: str) -> None:
+        await _run_notify_command([*self.argv, title, message])
+
+
+class FileBackend:
+    """把通知以 JSON Lines 追加到文件（便于测试与审计）"""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    def _append(self, line: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+    async def send(self, title: str, message: str) -> None:
+        line = json.dumps(
+            {"timestamp": datetime.now(timezone.utc).isoformat(), "title": title, "message": message},
+            ensure_ascii=False,
+        )
+        await asyncio.to_thread(self._append, line)
+
+
+async def _run_notify_command(argv: list[str]) -> None:
+    """异步执行外部命令，超时（或被取消）则杀掉进程并回收，不留下僵尸进程"""
+    proc = await asyncio.create_subprocess_exec(
+        *argv,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        await asyncio.wait_for(proc.wait(), NOTIFY_TIMEOUT)
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+
+class NotificationDispatcher:
+    """
+    非阻塞通知分发：notify() 只入队，由后台协程合并、去重后交给 worker 池发送。
+
+    - 去重：相同 (title, message) 在 NOTIFY_DEDUP_SECONDS 内只发一次
+    - 合并：NOTIFY_BATCH_WINDOW 内同一标题的多条通知合并为一条（如一次出现多个新子网）
+    - 后端按当前配置构建，单个后端失败或超时不影响其他后端
+    """
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[tuple[str, str]] | None = None
+        self._deliveries: asyncio.Queue[tuple[str, str]] | None = None
+        self._recent: dict[tuple[str, str], float] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._client: httpx.AsyncClient | None = None
+
+    def start(self) -> None:
+        if self.queue is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        self._deliveries = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._batch_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(NOTIFY_WORKERS)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+        self.queue = self._deliveries = self._client = None
+
+    def notify(self, title: str, message: str) -> None:
+        """入队一条通知，立即返回"""
+        if not state.config.notification_enabled:
+            logger.debug("通知已禁用，跳过: %s", message)
+            return
+
+        now = time.monotonic()
+        key = (title, message)
+        if now - self._recent.get(key, float("-inf")) < NOTIFY_DEDUP_SECONDS:
+            logger.debug("重复通知已忽略: %s", message)
+            return
+        self._recent[key] = now
+        if len(self._recent) > NOTIFY_QUEUE_SIZE:
+            self._recent = {k: t for k, t in self._recent.items() if now - t < NOTIFY_DEDUP_SECONDS}
+
+        self.start()
+        try:
+            self.queue.put_nowait(key)
+        except asyncio.QueueFull:
+            logger.warning("通知队列已满，丢弃: [%s] %s", title, message)
+
+    async def _batch_loop(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            await asyncio.sleep(NOTIFY_BATCH_WINDOW)
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            grouped: dict[str, list[str]] = {}
+            for title, message in batch:
+                grouped.setdefault(title, []).append(message)
+            for title, messages in grouped.items():
+                if len(messages) == 1:
+                    text = messages[0]
+                else:
+                    text = f"共 {len(messages)} 条：" + "；".join(messages[:5])
+                    if len(messages) > 5:
+                        text += " …"
+                self._deliveries.put_nowait((title, text))
+
+    def _backends(self) -> list:
+        cfg = state.config
+        backends: list = []
+        for name in cfg.notification_backends:
+            if name == "osascript":
+                # 非 macOS 平台没有 osascript：不计入后端，避免把未发出的通知记为已送达
+                if sys.platform == "darwin":
+                    backends.append(OsascriptBackend())
+                else:
+                    logger.debug("非 macOS 平台，跳过 osascript 通知后端")
+            elif name == "webhook" and cfg.notification_webhook_url:
+                # 首次需要时才创建（创建 TLS 上下文较慢，不放在启动路径上）
+                if self._client is None:
+                    self._client = httpx.AsyncClient()
+                backends.append(WebhookBackend(cfg.notification_webhook_url, self._client))
+            elif name == "command" and cfg.notification_command:
+                backends.append(CommandBackend(cfg.notification_command))
+            elif name == "file" and cfg.notification_file:
+                backends.append(FileBackend(cfg.notification_file))
+        return backends
+
+    async def _worker(self) -> None:
+        while True:
+            title, message = await self._deliveries.get()
+            backends = self._backends()
+            results = await asyncio.gather(
+                *(asyncio.wait_for(b.send(title, message), NOTIFY_TIMEOUT) for b in backends),
+                return_exceptions=True,
+            )
+            delivered = 0
+            for backend, result in zip(backends, results):
+                if isinstance(result, Exception):
+                    logger.warning("通知发送失败 (%s): %r", type(backend).__name__, result)
+                else:
+                    delivered += 1
+            if delivered:
+                logger.info("通知已发送 (%d/%d 个后端): [%s] %s", delivered, len(backends), title, message)
+            elif backends:
+                logger.warning("通知未送达（%d 个后端均失败）: [%s] %s", len(backends), title, message)
+            else:
+                logger.warning("通知未送达（没有可用的通知后端）: [%s] %s", title, message)
+
+
+notifier = NotificationDispatcher()
+
+
+# ---------------------------------------------------------------------------
+# Taostats API 请求
+# ---------------------------------------------------------------------------
+def _build_headers() -> dict[str, str]:
+    """构造 API 请求头，含可选的 API Key"""
+    headers: dict[str, str] = {"Accept": "application/json"}
+    if state.config.api_key:
+        headers["Authorization"] = state.config.api_key
+    return headers
+
+
+class UpstreamUnavailable(Exception):
+    """上游的熔断器处于打开状态，请求未发出"""
+
+
+class SourceHealth:
+    """
+    单个上游最近的请求结果与熔断器，调度器据此退避，/metrics 据此报告。
+
+    - closed：正常请求，连续失败 circuit_failure_threshold 次后打开；
+    - open：circuit_reset_seconds 内（上游要求的 Retry-After 更长时取其）直接失败，不再等待超时；
+    - half_open：到期后只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.failures = 0
+        self.last_success: float | None = None  # epoch 秒
+        self.last_failure: float | None = None
+        self.last_status: int | None = None
+        self.retry_after: float | None = None  # 上游通过 Retry-After 要求的等待（秒）
+        self.circuit = "closed"
+        self.open_until = 0.0
+        self.probe_started: float | None = None
+
+    def allow(self) -> bool:
+        """本次是否可以发出请求"""
+        if self.circuit == "closed":
+            return True
+        now = time.time()
+        if self.circuit == "open":
+            if now < self.open_until:
+                return False
+            self.circuit = "half_open"
+            self.probe_started = None
+        # 半开：同一时间只放行一个探测；探测未回报结果（如被取消）超过 reset 时长则再放行一个
+        if self.probe_started is not None and now - self.probe_started < state.config.circuit_reset_seconds:
+            return False
+        self.probe_started = now
+        return True
+
+    def open_remaining(self) -> float:
+        return max(0.0, self.open_until - time.time()) if self.circuit == "open" else 0.0
+
+    def success(self) -> None:
+        if self.circuit != "closed":
+            logger.info("上游 %s 已恢复，熔断器关闭", self.name)
+        self.failures = 0
+        self.last_success = time.time()
+        self.last_status = None
+        self.retry_after = None
+        self.circuit = "closed"
+        self.probe_started = None
+
+    def failure(self, status: int | None = None, retry_after: float | None = None) -> None:
+        cfg = state.config
+        self.failures += 1
+        self.last_failure = time.time()
+        self.last_status = status
+        self.retry_after = retry_after
+        if self.circuit == "half_open" or self.failures >= cfg.circuit_failure_threshold:
+            reset = max(float(cfg.circuit_reset_seconds), retry_after or 0.0)
+            if self.circuit != "open":
+                logger.warning("上游 %s 连续失败 %d 次，熔断 %.0f 秒", self.name, self.failures, reset)
+            self.circuit = "open"
+            self.open_until = self.last_failure + reset
+            self.probe_started = None
+
+
+upstream_health: dict[str, SourceHealth] = {
+    name: SourceHealth(name) for name in ("stats", "subnets", "history", "cmc", "coingecko", "binance")
+}
+
+
+def _retry_after_seconds(resp: httpx.Response) -> float | None:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期）"""
+    value = resp.headers.get("Retry-After", "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _circuit_allows(source: str) -> bool:
+    """熔断器打开时记录一次被拒绝的请求并返回 False"""
+    if upstream_health[source].allow():
+        return True
+    METRIC_UPSTREAM_REJECTED.inc(source)
+    logger.debug("上游 %s 熔断中，跳过请求", source)
+    return False
+
+
+def _upstream_failed(source: str, exc: BaseException | None = None) -> None:
+    """记录一次上游请求失败；HTTP 错误时一并记录状态码与 Retry-After"""
+    METRIC_UPSTREAM_ERRORS.inc(source)
+    if isinstance(exc, httpx.HTTPStatusError):
+        upstream_health[source].failure(exc.response.status_code, _retry_after_seconds(exc.response))
+    else:
+        upstream_health[source].failure()
+
+
+async def _fetch_stats(client: httpx.AsyncClient) -> dict[str, Any] | None:
+    """获取 Taostats 最新统计数据"""
+    if not _circuit_allows("stats"):
+        return None
+    try:
+        with METRIC_UPSTREAM_SECONDS.time("stats"):
+            resp = await client.get(STATS_API_URL, headers=_build_headers(), timeout=15)
+        resp.raise_for_status()
+        data = resp.json()
+        logger.debug("Stats API 原始响应: %s", json.dumps(data, ensure_ascii=False)[:500])
+        upstream_health["stats"].success()
+        return data
+    except httpx.HTTPStatusError as exc:
+        logger.error("Stats API 请求失败 (HTTP %d): %s", exc.response.status_code, exc)
+        _upstream_failed("stats", exc)
+    except Exception as exc:
+        logger.exception("Stats API 请求异常")
+        _upstream_failed("stats", exc)
+    return None
+
+
+async def _fetch_subnets(client: httpx.AsyncClient) -> list[dict[str, Any]] | None:
+    """获取子网列表"""
+    if not _circuit_allows("subnets"):
+        return None
+    try:
+        with METRIC_UPSTREAM_SECONDS.time("subnets"):
+            resp = await client.get(SUBNETS_API_URL, headers=_build_headers(), timeout=15)
+        resp.raise_for_status()
+        data = resp.json()
+        logger.debug("Subnets API 原始响应长度: %d", len(json.dumps(data)))
+        upstream_health["subnets"].success()
+        return data
+    except httpx.HTTPStatusError as exc:
+        logger.error("Subnets API 请求失败 (HTTP %d): %s", exc.response.status_code, exc)
+        _upstream_failed("subnets", exc)
+    except Exception as exc:
+        logger.exception("Subnets API 请求异常")
+        _upstream_failed("subnets", exc)
+    return None
+
+
+async def _fetch_history_page(
+    client: httpx.AsyncClient,
+    page: int,
+    extra_params: dict[str, Any] | None = None,
+) -> tuple[list[tuple[int, int]], int]:
+    """
+    获取 Taostats 历史统计的一页，返回 ([(epoch 秒, price_rao)], total_pages)。
+    失败只抛出异常，由 _fetch_history_page_with_retry 在重试耗尽后按页记一次上游失败。
+    """
+    if not _circuit_allows("history"):
+        raise UpstreamUnavailable("Taostats 历史数据接口熔断中")
+    with METRIC_UPSTREAM_SECONDS.time("history"):
+        resp = await client.get(
+            TAOSTATS_HISTORY_URL,
+            headers=_build_headers(),
+            params={"limit": TAOSTATS_HISTORY_PAGE_SIZE, "page": page, **(extra_params or {})},
+            timeout=30,
+        )
+    resp.raise_for_status()
+    upstream_health["history"].success()
+    data = resp.json()
+
+    points: list[tuple[int, int]] = []
+    for r in data.get("data", []):
+        ts = _parse_ts(r.get("timestamp", ""))
+        cost_rao = r.get("subnet_registration_cost")
+        if ts is not None and cost_rao:
+            points.append((ts, int(cost_rao)))
+    total_pages = data.get("pagination", {}).get("total_pages", 1)
+    return points, total_pages
+
+
+class AsyncRateLimiter:
+    """令牌桶限速：把请求均匀地限制在 rate 次/秒以内（rate <= 0 表示不限速）"""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+async def _fetch_history_page_with_retry(
+    client: httpx.AsyncClient,
+    page: int,
+    limiter: AsyncRateLimiter,
+    retries: int,
+    extra_params: dict[str, Any] | None = None,
+) -> tuple[list[tuple[int, int]], int]:
+    """
+    带限速与指数退避重试的单页获取；HTTP 429 时遵循 Retry-After。
+    重试耗尽才向熔断器记一次失败：一页的多次重试不会被算作多次上游失败。
+    """
+    attempt = 0
+    while True:
+        await limiter.acquire()
+        try:
+            return await _fetch_history_page(client, page, extra_params)
+        except UpstreamUnavailable:
+            raise
+        except Exception as exc:
+            if attempt >= retries:
+                _upstream_failed("history", exc)
+                raise
+            delay = min(2 ** attempt, 30) + random.uniform(0, 0.5)
+            if isinstance(exc, httpx.HTTPStatusError):
+                retry_after = _retry_after_seconds(exc.response)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+            attempt += 1
+            logger.warning("历史数据第 %d 页失败（第 %d 次），%.1f 秒后重试: %s", page, attempt, delay, exc)
+            await asyncio.sleep(delay)
+
+
+async def _fetch_taostats_history_all(client: httpx.AsyncClient) -> tuple[HistoricalSeries, bool]:
+    """
+    分页获取 Taostats 全部历史统计数据。
+
+    先取第 1 页得到 total_pages，其余页在并发上限与每秒请求预算内并行获取。
+    每页到达即解析为列式数据并按页序并入结果：连续的页直接追加到序列尾部，
+    乱序先到的页以列式数据暂存到前面的页到达为止，峰值内存不含整段历史的 Python 对象；
+    单页重试耗尽只记录失败并跳过该页，不丢弃其他页。
+    返回 (按时间升序排列的列式数据, 是否所有页都成功)。
+    """
+    cfg = state.config
+    limiter = AsyncRateLimiter(cfg.history_requests_per_second)
+    retries = cfg.history_fetch_retries
+    # 按时间升序翻页，回填期间新产生的记录只会落在最后一页之后
+    params = {"order": "timestamp_asc"}
+
+    try:
+        points, total_pages = await _fetch_history_page_with_retry(client, 1, limiter, retries, params)
+    except UpstreamUnavailable as exc:
+        logger.warning("%s，放弃本次回填", exc)
+        return HistoricalSeries(), False
+    except Exception:
+        logger.exception("获取历史数据第 1 页失败，放弃本次回填")
+        return HistoricalSeries(), False
+
+    series = HistoricalSeries.from_points(points)
+    done = 1
+    failed_pages: list[int] = []
+    semaphore = asyncio.Semaphore(max(1, cfg.history_fetch_concurrency))
+    # 已到达但前面还有页未到的页（失败页记为 None），next_page 为下一个待并入的页
+    waiting: dict[int, HistoricalSeries | None] = {}
+    next_page = 2
+
+    def settle(page: int, part: HistoricalSeries | None) -> None:
+        nonlocal next_page, series
+        waiting[page] = part
+        while next_page in waiting:
+            part = waiting.pop(next_page)
+            next_page += 1
+            if not part:
+                continue
+            # 升序翻页时相邻页只会因翻页期间的新增记录重复几条，extend 直接丢弃这些重复点；
+            # 与已并入的数据交错（上游顺序异常）时才归并
+            overlap = part.times[:bisect.bisect_right(part.times, series.times[-1])] if series.times else ()
+            if series.covers(overlap):
+                series.extend(zip(part.times, part.price_rao))
+            else:
+                series = series.merge(part)
+
+    async def fetch(page: int) -> None:
+        nonlocal done
+        async with semaphore:
+            try:
+                page_points, _ = await _fetch_history_page_with_retry(client, page, limiter, retries, params)
+            except UpstreamUnavailable:
+                failed_pages.append(page)
+                settle(page, None)
+                return
+            except Exception:
+                logger.exception("获取历史数据第 %d 页失败，已跳过", page)
+                failed_pages.append(page)
+                settle(page, None)
+                return
+        settle(page, HistoricalSeries.from_points(page_points))
+        done += 1
+        logger.info(
+            "历史数据加载: %d/%d 页（第 %d 页 %d 条），已并入 %d 条",
+            done, total_pages, page, len(page_points), len(series),
+        )
+
+    await asyncio.gather(*(fetch(page) for page in range(2, total_pages + 1)))
+
+    if failed_pages:
+        logger.warning("历史数据回填不完整，失败页: %s，下次刷新将重新全量回填", sorted(failed_pages))
+    logger.info("历史数据加载完成，共 %d 条记录", len(series))
+    return series, not failed_pages
+
+
+async def _fetch_taostats_history_since(
+    client: httpx.AsyncClient,
+    high_water: int,
+) -> list[tuple[int, int]] | None:
+    """
+    增量获取晚于 high_water 的历史记录。
+    按时间倒序翻页，遇到已缓存的时间戳即停止；中途失败返回 None，
+    避免只拿到最新几页而在缓存中留下空洞。
+    """
+    points: list[tuple[int, int]] = []
+    page = 1
+    params = {"order": "timestamp_desc", "timestamp_start": high_water + 1}
+    limiter = AsyncRateLimiter(state.config.history_requests_per_second)
+
+    while True:
+        try:
+            page_points, total_pages = await _fetch_history_page_with_retry(
+                client, page, limiter, state.config.history_fetch_retries, params
+            )
+        except UpstreamUnavailable as exc:
+            logger.warning("%s，本次增量同步放弃", exc)
+            return None
+        except Exception:
+            logger.exception("增量获取历史数据第 %d 页失败，本次同步放弃", page)
+            return None
+
+        points.extend(p for p in page_points if p[0] > high_water)
+        if page >= total_pages or any(ts <= high_water for ts, _ in page_points):
+            break
+        page += 1
+
+    logger.info("增量历史数据: %d 页，新增 %d 条", page, len(points))
+    return points
+
+
+# ---------------------------------------------------------------------------
+# 价格解析
+# ---------------------------------------------------------------------------
+def _parse_stats(data: dict[str, Any]) -> tuple[int, float, int]:
+    """
+    从 Stats API 响应中提取注册费用和子网数。
+
+    返回: (price_rao, price_tao, subnet_count)
+    """
+    # Taostats 响应可能是 {"data": [...]} 或直接是 dict
+    record = data
+    if isinstance(data, dict) and "data" in data:
+        inner = data["data"]
+        if isinstance(inner, list) and len(inner) > 0:
+            record = inner[0]
+        elif isinstance(inner, dict):
+            record = inner
+
+    price_rao = int(record.get("subnet_registration_cost", 0))
+    price_tao = round(price_rao / RAO_PER_TAO, 4)
+    subnet_count = int(record.get("subnets", 0))
+
+    logger.info(
+        "解析结果 — 注册费: %s RAO (%.4f TAO), 子网数: %d",
+        f"{price_rao:,}",
+        price_tao,
+        subnet_count,
+    )
+    return price_rao, price_tao, subnet_count
+
+
+def _parse_subnets(data: Any) -> list[dict[str, Any]]:
+    """从 Subnets API 响应中提取子网列表"""
+    if isinstance(data, dict) and "data" in data:
+        subnets = data["data"]
+    elif isinstance(data, list):
+        subnets = data
+    else:
+        subnets = []
+
+    if not isinstance(subnets, list):
+        logger.warning("子网数据格式异常: %s", type(subnets))
+        return []
+
+    return subnets
+
+
+# ---------------------------------------------------------------------------
+# 阈值告警检查
+# ---------------------------------------------------------------------------
+def _check_thresholds(price_tao: float, ts: int) -> list[tuple[AlertRule, str]]:
+    """用告警引擎评估当前价格，返回本次新触发的 (规则, 描述)"""
+    fired = state.alerts.evaluate(ts, price_tao)
+    for _rule, msg in fired:
+        logger.warning("阈值告警触发: %s", msg)
+        notifier.notify("TAO 子网价格告警", msg)
+
+    if state.alerts.dirty:
+        _save_alert_state(state.alerts)
+        cluster.publish({"kind": "alert_state", "triggered": sorted(state.alerts.triggered)})
+    return fired
+
+
+# ---------------------------------------------------------------------------
+# WebSocket 广播
+# ---------------------------------------------------------------------------
+class WSClient:
+    """
+    单个 WebSocket 客户端：订阅主题 + 有界发送队列 + 独立的写协程。
+
+    离散事件（新子网、告警）进入有界队列按序发送；价格与 K 线等状态类消息按主题合并，
+    只保留最新一条，并按客户端声明的 max_rate 节流。广播只做入队，慢客户端不会拖慢
+    其他客户端或轮询；队列溢出或单次发送超时的客户端会被断开。
+    """
+
+    def __init__(self, ws: WebSocket) -> None:
+        self.ws = ws
+        self.host = ws.client.host if ws.client else "unknown"
+        self.topics: set[str] = set(WS_DEFAULT_TOPICS)
+        self.min_interval = 0.0  # 同一合并主题两次推送的最小间隔（秒）
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        self.latest: dict[str, str] = {}
+        self.last_sent: dict[str, float] = {}
+        self.writer: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+    def start(self) -> None:
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def wants(self, topic: str) -> bool:
+        return topic in self.topics
+
+    def offer(self, topic: str, payload: str, conflate: bool = False) -> bool:
+        """投递一条已序列化的消息（未订阅的主题直接忽略），队列已满返回 False"""
+        if topic not in self.topics:
+            return True
+        if conflate:
+            self.latest[topic] = payload
+            self._wake.set()
+            return True
+        return self.send_control(payload)
+
+    def send_control(self, payload: str) -> bool:
+        """不受订阅过滤的控制消息（如订阅确认）"""
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            return False
+        self._wake.set()
+        return True
+
+    def subscribe(self, topics: Iterable[Any], max_rate: float | None) -> list[Any]:
+        """替换订阅的主题，返回被忽略的无效主题"""
+        valid, invalid = set(), []
+        for t in topics:
+            if isinstance(t, str) and (
+                t in WS_DEFAULT_TOPICS
+                or (t.startswith("candles:") and t[len("candles:"):] in GRANULARITY_SECONDS)
+            ):
+                valid.add(t)
+            else:
+                invalid.append(t)
+        self.topics = valid
+        self.min_interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        for topic in list(self.latest):
+            if topic not in self.topics:
+                del self.latest[topic]
+        return invalid
+
+    def _next_due(self, now: float) -> float | None:
+        """距最近一个可发送的合并主题还需等待的秒数；没有待发送内容返回 None"""
+        if not self.latest:
+            return None
+        return max(0.0, min(
+            self.last_sent.get(topic, float("-inf")) + self.min_interval - now
+            for topic in self.latest
+        ))
+
+    async def _send(self, payload: str) -> None:
+        await asyncio.wait_for(self.ws.send_text(payload), WS_SEND_TIMEOUT)
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                wait = self._next_due(loop.time())
+                if self.queue.empty() and wait != 0:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                while not self.queue.empty():
+                    await self._send(self.queue.get_nowait())
+
+                now = loop.time()
+                for topic in list(self.latest):
+                    if now - self.last_sent.get(topic, float("-inf")) >= self.min_interval:
+                        payload = self.latest.pop(topic)
+                        self.last_sent[topic] = now
+                        await self._send(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.info("WebSocket 发送失败或超时，断开客户端: %s", self.host)
+            _evict_ws_client(self)
+
+    async def _close(self) -> None:
+        try:
+            await asyncio.wait_for(self.ws.close(), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def stop(self) -> None:
+        """取消写协程（不等待），由 websocket_endpoint 的 finally 或驱逐逻辑调用"""
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
+
+def _evict_ws_client(client: WSClient) -> None:
+    """移除客户端并在后台关闭连接"""
+    if state.ws_clients.pop(client.ws, None) is None:
+        return
+    client.stop()
+    asyncio.create_task(client._close())
+
+
+def _fanout_ws(payload: str, topic: str, conflate: bool = False) -> None:
+    """把已序列化的消息投递到本进程中订阅了 topic 的客户端，队列溢出的客户端被断开"""
+    start = time.perf_counter()
+    overflowed = [
+        c for c in state.ws_clients.values()
+        if c.wants(topic) and not c.offer(topic, payload, conflate)
+    ]
+    METRIC_WS_FANOUT_SECONDS.observe(time.perf_counter() - start, topic)
+    for client in overflowed:
+        _evict_ws_client(client)
+    if overflowed:
+        logger.info("断开发送队列溢出的 WebSocket 客户端: %d 个", len(overflowed))
+
+
+async def _broadcast_ws(message: dict[str, Any] | str, topic: str, conflate: bool = False) -> None:
+    """
+    向订阅了 topic 的客户端广播消息：只序列化一次（传入 str 时视为已序列化），投递到各自的发送队列，
+    主节点同时转发给其他工作进程。conflate=True 时只保留每个客户端该主题的最新值。
+    """
+    has_local = any(c.wants(topic) for c in state.ws_clients.values())
+    if not has_local and not cluster.has_followers:
+        return
+
+    payload = message if isinstance(message, str) else json.dumps(message, ensure_ascii=False)
+    if has_local:
+        _fanout_ws(payload, topic, conflate)
+    cluster.publish({"kind": "ws", "topic": topic, "conflate": conflate, "payload": payload})
+
+
+def _handle_ws_message(client: WSClient, data: str) -> None:
+    """
+    处理客户端消息：
+      {"action": "subscribe", "topics": ["price", "candles:1h"], "max_rate": 0.5}
+      {"action": "ping"}
+    订阅中的无效主题被忽略，并回复 {"type": "error", "invalid_topics": [...]}
+    """
+    try:
+        msg = json.loads(data)
+    except ValueError:
+        return
+    if not isinstance(msg, dict):
+        return
+
+    action = msg.get("action")
+    if action == "subscribe":
+        topics = msg.get("topics")
+        max_rate = msg.get("max_rate")
+        invalid = client.subscribe(
+            topics if isinstance(topics, list) else WS_DEFAULT_TOPICS,
+            float(max_rate) if isinstance(max_rate, (int, float)) else None,
+        )
+        if invalid:
+            client.send_control(json.dumps({
+                "type": "error",
+                "message": "无效的订阅主题",
+                "invalid_topics": invalid,
+            }, ensure_ascii=False))
+        client.send_control(json.dumps({
+            "type": "subscribed",
+            "topics": sorted(client.topics),
+            "max_rate": 1.0 / client.min_interval if client.min_interval else None,
+        }))
+        logger.debug("WebSocket 订阅更新: %s -> %s", client.host, sorted(client.topics))
+    elif action == "ping":
+        client.send_control('{"type":"pong"}')
+
+
+# ---------------------------------------------------------------------------
+# 多进程部署：主节点选举与进程间广播
+# ---------------------------------------------------------------------------
+def _reload_config() -> None:
+    """从磁盘重新加载配置（其他进程修改了 config.json）"""
+    state.config = _load_config()
+    state.alerts.set_thresholds(state.config.alert_thresholds)
+    scheduler.wake()
+    response_cache.invalidate()
+
+
+def _reload_alert_rules() -> None:
+    """从磁盘重新加载用户告警规则；主节点保留自己的触发状态与滚动窗口"""
+    loaded = _load_alert_engine(state.config)
+    state.alerts.user_rules = loaded.user_rules
+    if not cluster.is_leader:
+        state.alerts.triggered = loaded.triggered
+    state.alerts.reindex()
+
+
+async def _load_from_disk(store: HistoryLog | SqliteStore) -> None:
+    """
+    在线程中从存储加载历史、历史缓存、降采样数据与 K 线，完成后在事件循环中一次性替换。
+    主节点在轮询任务开始前调用，从节点每次（重新）连上主节点后调用；只有主节点执行存储的导入与迁移。
+    """
+    start = time.perf_counter()
+    history, cache, rollups, candles = await asyncio.to_thread(
+        _load_storage, store, state.config, cluster.is_leader
+    )
+    index = await asyncio.to_thread(HistoryIndex, history)
+    last_sync, complete = await asyncio.to_thread(_load_history_sync_meta)
+    state.history = history
+    state.history_index = index
+    state.historical_cache = cache
+    state.rollups = rollups
+    state.candles = candles
+    state.last_history_fetch = last_sync if cache else None
+    state.history_cache_complete = complete
+    state.loaded = True
+    if state.snapshot is not None:
+        state.snapshot = state.snapshot.rerender()
+    _bump_history_version()
+    logger.info("存储加载完成，用时 %.2f 秒", time.perf_counter() - start)
+
+
+async def _reload_from_disk() -> None:
+    """从节点（重新）连上主节点后，从共享的存储重建历史、历史缓存与 K 线"""
+    await _load_from_disk(state.db or HistoryLog(HISTORY_LOG_PATH))
+
+
+async def _apply_replicated(event: dict[str, Any]) -> None:
+    """从节点应用主节点广播的状态变更"""
+    kind = event.get("kind")
+
+    if kind == "ws":
+        _fanout_ws(event["payload"], event["topic"], event["conflate"])
+    elif kind == "price":
+        record = PriceRecord(**event["record"])
+        state.current_price_rao = record.price_rao
+        state.current_price_tao = record.price_tao
+        state.current_subnet_count = record.subnet_count
+        state.current_price_usd = event["tao_usd_rate"]
+        history = state.history.price_history
+        if not history or record.timestamp > history[-1].timestamp:
+            ts = _parse_ts(record.timestamp) or 0
+            state.updated_at["price"] = datetime.fromisoformat(record.timestamp).timestamp()
+            history.append(record)
+            state.history_index.price_times.append(ts)
+            state.candles.add(ts, record.price_tao)
+            _trim_history(state.history, state.history_index, state.rollups, state.config)
+        _publish_snapshot(event.get("version"))
+    elif kind == "event":
+        subnet_event = SubnetEvent(**event["event"])
+        events = state.history.new_subnet_events
+        if not events or subnet_event.timestamp >= events[-1].timestamp:
+            events.append(subnet_event)
+            state.history_index.event_times.append(_parse_ts(subnet_event.timestamp) or 0)
+    elif kind == "subnets":
+        state.subnets_list = event["subnets"]
+        state.subnet_metrics.record(event["ts"], state.subnets_list)
+        state.updated_at["subnets"] = event["ts"]
+        _publish_snapshot(event.get("version"))
+    elif kind == "usd":
+        state.current_price_usd = event["tao_usd_rate"]
+        state.updated_at["tao_usd"] = event["ts"]
+        state.usd_quote = event["quote"]
+        _publish_snapshot(event.get("version"))
+    elif kind == "snapshot":
+        state.current_price_rao = event["price_rao"]
+        state.current_price_tao = event["price_tao"]
+        state.current_subnet_count = event["subnet_count"]
+        state.current_price_usd = event["tao_usd_rate"]
+        state.subnets_list = event["subnets"]
+        state.alerts.triggered = set(event["triggered"])
+        state.updated_at = event["updated_at"]
+        state.usd_quote = event["usd_quote"]
+        _publish_snapshot(event.get("version"))
+    elif kind == "alert_state":
+        state.alerts.triggered = set(event["triggered"])
+    elif kind == "history_refresh":
+        if state.db is not None:
+            cache = await asyncio.to_thread(state.db.load_historical_tail)
+            state.candles = await asyncio.to_thread(state.db.load_candle_tails)
+        else:
+            cache = await asyncio.to_thread(_load_historical_cache)
+            state.rollups = await asyncio.to_thread(_load_rollups, None)
+            state.candles = await asyncio.to_thread(
+                CandleEngine.build, cache, _live_price_points(state.history), state.rollups
+            )
+        state.historical_cache = cache
+        _bump_history_version(event.get("version"))
+    elif kind == "reload_config":
+        _reload_config()
+    elif kind == "reload_alerts":
+        _reload_alert_rules()
+
+
+class ClusterNode:
+    """
+    多工作进程协调（uvicorn --workers N）。
+
+    启动时抢占 data/poller.lock 文件锁：抢到的进程成为主节点，运行轮询任务，并在
+    data/pubsub.sock 上向其他进程逐行推送 JSON 状态变更与 WebSocket 广播；其余进程作为
+    从节点，从共享数据文件加载历史后订阅这些变更，为自己的 WebSocket 客户端扇出。
+    主节点退出后，从节点在连接断开时重新抢锁接替。单进程运行时该进程自然成为主节点。
+    """
+
+    def __init__(self) -> None:
+        self.is_leader = False
+        self._lock_fh = None
+        self._server: asyncio.AbstractServer | None = None
+        self._followers: set[asyncio.StreamWriter] = set()
+        self._upstream: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def has_followers(self) -> bool:
+        return bool(self._followers)
+
+    def _try_lock(self) -> bool:
+        if fcntl is None:
+            return True
+        POLLER_LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+        fh = POLLER_LOCK_PATH.open("a")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._lock_fh = fh
+        return True
+
+    async def start(self) -> None:
+        if self._try_lock():
+            await self._become_leader()
+        else:
+            logger.info("轮询主节点已存在，本进程作为从节点运行 (pid %d)", os.getpid())
+            self._task = asyncio.create_task(self._follow_loop())
+
+    async def _become_leader(self) -> None:
+        self.is_leader = True
+        if fcntl is not None:
+            # 持有文件锁即可安全地清理上一任主节点遗留的 socket 文件
+            PUBSUB_SOCKET_PATH.unlink(missing_ok=True)
+            self._server = await asyncio.start_unix_server(
+                self._handle_follower, path=str(PUBSUB_SOCKET_PATH), limit=PUBSUB_LINE_LIMIT
+            )
+        state.poll_task = asyncio.create_task(_poll_loop())
+        logger.info("本进程成为轮询主节点 (pid %d)", os.getpid())
+
+    async def stop(self) -> None:
+        tasks = [t for t in (self._task, state.poll_task) if t is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._followers):
+                writer.close()
+            PUBSUB_SOCKET_PATH.unlink(missing_ok=True)
+        if self._lock_fh is not None:
+            self._lock_fh.close()
+
+    # ---- 主节点 ----
+    async def _handle_follower(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._followers.add(writer)
+        logger.info("从节点已连接（当前共 %d 个）", len(self._followers))
+        self._write(writer, {
+            "kind": "snapshot",
+            "price_rao": state.current_price_rao,
+            "price_tao": state.current_price_tao,
+            "subnet_count": state.current_subnet_count,
+            "tao_usd_rate": state.current_price_usd,
+            "subnets": state.subnets_list,
+            "triggered": sorted(state.alerts.triggered),
+            "updated_at": state.updated_at,
+            "usd_quote": state.usd_quote,
+            "version": _snapshot().version,
+        })
+        try:
+            async for line in reader:
+                # 从节点只会上报配置或告警规则已在磁盘上变更
+                kind = json.loads(line).get("kind")
+                if kind == "reload_config":
+                    _reload_config()
+                    self.publish({"kind": "reload_config"})
+                elif kind == "reload_alerts":
+                    _reload_alert_rules()
+                    self.publish({"kind": "reload_alerts"})
+        except Exception:
+            logger.debug("从节点连接异常关闭")
+        finally:
+            self._followers.discard(writer)
+            writer.close()
+
+    def _write(self, writer: asyncio.StreamWriter, event: dict[str, Any]) -> None:
+        writer.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def publish(self, event: dict[str, Any]) -> None:
+        """主节点向所有从节点推送一条变更；发送缓冲积压过多的从节点被断开"""
+        if not self.is_leader or not self._followers:
+            return
+        line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        for writer in list(self._followers):
+            if writer.transport.get_write_buffer_size() > PUBSUB_MAX_BUFFER:
+                logger.warning("从节点积压过多，断开连接")
+                self._followers.discard(writer)
+                writer.close()
+                continue
+            writer.write(line)
+
+    # ---- 从节点 ----
+    async def _follow_loop(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    str(PUBSUB_SOCKET_PATH), limit=PUBSUB_LINE_LIMIT
+                )
+            except OSError:
+                writer = None
+            if writer is not None:
+                self._upstream = writer
+                logger.info("已连接轮询主节点")
+                try:
+                    # 先建立订阅再从磁盘重建，之后收到的变更按时间戳去重
+                    await _reload_from_disk()
+                    async for line in reader:
+                        await _apply_replicated(json.loads(line))
+                except Exception:
+                    logger.exception("与主节点的连接异常")
+                finally:
+                    self._upstream = None
+                    writer.close()
+                logger.warning("与轮询主节点的连接已断开")
+
+            if self._try_lock():
+                await self._become_leader()
+                return
+            await asyncio.sleep(1)
+
+    # ---- 配置变更通知 ----
+    async def _notify_changed(self, kind: str, path: Path) -> None:
+        """
+        只立即写出被修改的文件再通知其他进程；历史、缓存等其余待写内容仍按防抖窗口写盘。
+        没有其他进程时无需通知，该文件也按防抖窗口写盘。
+        """
+        if not self._followers and self._upstream is None:
+            return
+        await asyncio.to_thread(persistence.flush, (path,))
+        if self.is_leader:
+            self.publish({"kind": kind})
+        elif self._upstream is not None:
+            self._write(self._upstream, {"kind": kind})
+
+    async def config_changed(self) -> None:
+        """本进程修改了 config.json：落盘后通知其他进程重新加载"""
+        await self._notify_changed("reload_config", CONFIG_PATH)
+
+    async def alerts_changed(self) -> None:
+        """本进程修改了告警规则：落盘后通知其他进程重新加载"""
+        await self._notify_changed("reload_alerts", ALERT_RULES_PATH)
+
+
+cluster = ClusterNode()
+
+
+# ---------------------------------------------------------------------------
+# 新子网检测
+# ---------------------------------------------------------------------------
+def _detect_new_subnets(subnets: list[dict[str, Any]]) -> list[int]:
+    """检测新上线的子网，返回新子网 ID 列表"""
+    current_ids: set[int] = set()
+    for s in subnets:
+        sid = s.get("netuid") or s.get("subnet_id") or s.get("id")
+        if sid is not None:
+            current_ids.add(int(sid))
+
+    if not state.known_subnet_ids:
+        # 首次运行，初始化已知子网集合
+        state.known_subnet_ids = current_ids
+        logger.info("初始化已知子网 ID 集合，共 %d 个", len(current_ids))
+        return []
+
+    new_ids = sorted(current_ids - state.known_subnet_ids)
+    if new_ids:
+        logger.info("检测到 %d 个新子网: %s", len(new_ids), new_ids)
+        state.known_subnet_ids = current_ids
+    return new_ids
+
+
+# ---------------------------------------------------------------------------
+# 历史数据裁剪
+# ---------------------------------------------------------------------------
+def _trim_history(history: HistoryData, index: HistoryIndex, rollups: RollupStore, config: AppConfig) -> int:
+    """
+    分层保留：超过 raw_retention_hours 的原始价格记录先降采样进 rollups 再删除，
+    rollups 中各层级按各自的保留期逐级并入或删除。借助时间索引二分定位，返回原始数据的截止时间。
+    """
+    now_ts = int(datetime.now(timezone.utc).timestamp())
+    cutoff_ts = now_ts - config.raw_retention_hours * 3600
+    n = bisect.bisect_left(index.price_times, cutoff_ts)
+    if n:
+        rollups.add_raw(zip(index.price_times[:n], (r.price_tao for r in history.price_history[:n])))
+    rollups.age_out(now_ts, config.rollup_5m_retention_days, config.rollup_1h_retention_days)
+
+    trimmed, trimmed_events = index.trim_before(history, cutoff_ts)
+    if trimmed > 0:
+        logger.info("%d 条过期价格记录已降采样并裁剪 (>%dh)", trimmed, config.raw_retention_hours)
+    if trimmed_events > 0:
+        logger.info("裁剪了 %d 条过期子网事件 (>%dh)", trimmed_events, config.raw_retention_hours)
+    return cutoff_ts
+
+
+# ---------------------------------------------------------------------------
+# TAO/USD 价格（多来源对冲请求）
+# ---------------------------------------------------------------------------
+async def _cmc_usd_price(client: httpx.AsyncClient) -> float | None:
+    resp = await client.get(
+        CMC_PRICE_URL,
+        headers={"X-CMC_PRO_API_KEY": CMC_API_KEY, "Accept": "application/json"},
+        params={"symbol": "TAO", "convert": "USD"},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    return resp.json().get("data", {}).get("TAO", {}).get("quote", {}).get("USD", {}).get("price")
+
+
+async def _coingecko_usd_price(client: httpx.AsyncClient) -> float | None:
+    resp = await client.get(
+        COINGECKO_PRICE_URL,
+        headers={"Accept": "application/json"},
+        params={"ids": "bittensor", "vs_currencies": "usd"},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    return resp.json().get("bittensor", {}).get("usd")
+
+
+async def _binance_usd_price(client: httpx.AsyncClient) -> float | None:
+    # TAO/USDT 现货价，USDT 视同 USD
+    resp = await client.get(BINANCE_PRICE_URL, params={"symbol": "TAOUSDT"}, timeout=10)
+    resp.raise_for_status()
+    return resp.json().get("price")
+
+
+USD_PRICE_SOURCES: dict[str, Callable[[httpx.AsyncClient], Awaitable[Any]]] = {
+    "cmc": _cmc_usd_price,
+    "coingecko": _coingecko_usd_price,
+    "binance": _binance_usd_price,
+}
+
+
+class PriceQuote:
+    """某个来源的一次 TAO/USD 报价"""
+
+    __slots__ = ("source", "price", "fetched_at", "latency")
+
+    def __init__(self, source: str, price: float, fetched_at: float, latency: float) -> None:
+        self.source = source
+        self.price = price
+        self.fetched_at = fetched_at  # epoch 秒
+        self.latency = latency  # 秒
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"source": self.source, "latency_ms": round(self.latency * 1000, 1)}
+
+
+class UsdPriceCache:
+    """
+    各来源最近一次（非离群）的报价与最近一次采用的价格。
+    报价在 usd_price_ttl_seconds 内有效：采用的价格在有效期内直接复用，
+    新报价与其他来源有效报价的中位数偏离超过 usd_outlier_pct% 时视为离群值，不写入缓存；
+    没有其他来源的有效报价时，与同一来源上一次的有效报价比较。
+    """
+
+    def __init__(self) -> None:
+        self.quotes: dict[str, PriceQuote] = {}
+        self.accepted: PriceQuote | None = None
+
+    def put(self, quote: PriceQuote) -> None:
+        self.quotes[quote.source] = quote
+
+    def offer(self, quote: PriceQuote, ttl: float, pct: float) -> bool:
+        """非离群值时写入缓存并返回 True"""
+        if self.is_outlier(quote, ttl, pct):
+            METRIC_USD_PRICE_OUTLIERS.inc(quote.source)
+            logger.warning("TAO/USD 报价 %.4f (%s) 偏离其他来源超过 %.1f%%，已忽略", quote.price, quote.source, pct)
+            return False
+        self.put(quote)
+        return True
+
+    def fresh(self, ttl: float, exclude: str | None = None) -> list[PriceQuote]:
+        cutoff = time.time() - ttl
+        return [q for q in self.quotes.values() if q.fetched_at >= cutoff and q.source != exclude]
+
+    def cached(self, ttl: float) -> PriceQuote | None:
+        if self.accepted is not None and self.accepted.fetched_at >= time.time() - ttl:
+            return self.accepted
+        return None
+
+    def is_outlier(self, quote: PriceQuote, ttl: float, pct: float) -> bool:
+        others = sorted(q.price for q in self.fresh(ttl, exclude=quote.source) or self.fresh(ttl))
+        if not others:
+            return False
+        mid = len(others) // 2
+        reference = others[mid] if len(others) % 2 else (others[mid - 1] + others[mid]) / 2
+        return abs(quote.price - reference) / reference * 100 > pct
+
+
+usd_prices = UsdPriceCache()
+# 对冲请求中未被采用、仍在进行的请求（保留引用直到完成，结果只写入报价缓存）
+_usd_stragglers: set[asyncio.Task] = set()
+
+
+def _usd_straggler_done(task: asyncio.Task) -> None:
+    _usd_stragglers.discard(task)
+    if task.cancelled() or task.exception() is not None or task.result() is None:
+        return
+    cfg = state.config
+    usd_prices.offer(task.result(), cfg.usd_price_ttl_seconds, cfg.usd_outlier_pct)
+
+
+async def _fetch_usd_quote(client: httpx.AsyncClient, source: str) -> PriceQuote | None:
+    """向单个来源请求报价"""
+    start = time.perf_counter()
+    try:
+        with METRIC_UPSTREAM_SECONDS.time(source):
+            price = await USD_PRICE_SOURCES[source](client)
+        price = float(price) if price is not None else None
+    except Exception as exc:
+        logger.warning("获取 TAO/USD 价格失败 (%s): %r", source, exc)
+        _upstream_failed(source, exc)
+        return None
+    if price is None or not math.isfinite(price) or price <= 0:
+        logger.warning("%s 响应中未找到有效的 TAO 价格", source)
+        _upstream_failed(source)
+        return None
+    upstream_health[source].success()
+    return PriceQuote(source, price, time.time(), time.perf_counter() - start)
+
+
+async def _fetch_tao_usd_price(client: httpx.AsyncClient) -> PriceQuote | None:
+    """
+    获取 TAO/USD 价格：有效期内的已采用价格直接复用；否则按 usd_price_sources 的顺序对冲请求——
+    先请求第一个来源，usd_hedge_delay_seconds 内没有得到可用报价（或已失败）再加请求下一个，
+    采用最先返回且不是离群值的报价。熔断中的来源直接跳过；落后的请求在后台完成，只更新报价缓存。
+    本轮所有报价都被判为离群（如行情剧烈波动）时，若至少两个来源作答，采用其中位数。
+    """
+    cfg = state.config
+    ttl = cfg.usd_price_ttl_seconds
+    cached = usd_prices.cached(ttl)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    queue = [name for name in cfg.usd_price_sources if name in USD_PRICE_SOURCES]
+    pending: set[asyncio.Task] = set()
+    answered: list[PriceQuote] = []
+    accepted: PriceQuote | None = None
+    while accepted is None and (queue or pending):
+        if queue:
+            source = queue.pop(0)
+            if _circuit_allows(source):
+                pending.add(asyncio.create_task(_fetch_usd_quote(client, source)))
+            if not pending:
+                continue
+        done, pending = await asyncio.wait(
+            pending, timeout=cfg.usd_hedge_delay_seconds if queue else None, return_when=asyncio.FIRST_COMPLETED
+        )
+        # 同一批完成的报价都交给缓存，采用其中第一个非离群值
+        for task in done:
+            quote = task.result()
+            if quote is None:
+                continue
+            answered.append(quote)
+            if usd_prices.offer(quote, ttl, cfg.usd_outlier_pct) and accepted is None:
+                accepted = quote
+
+    for task in pending:
+        _usd_stragglers.add(task)
+        task.add_done_callback(_usd_straggler_done)
+    if accepted is None and len(answered) >= 2:
+        answered.sort(key=lambda q: q.price)
+        accepted = answered[len(answered) // 2]
+        usd_prices.put(accepted)
+    METRIC_USD_PRICE_SECONDS.observe(time.perf_counter() - start)
+    if accepted is None:
+        return None
+    usd_prices.accepted = accepted
+    METRIC_USD_PRICE_ANSWERS.inc(accepted.source)
+    logger.info("TAO/USD 价格 (%s，%.0f ms): $%.4f", accepted.source, accepted.latency * 1000, accepted.price)
+    return accepted
 
-    while True:
-        try:
-            resp = await client.get(
-                TAOSTATS_HISTORY_URL,
-                headers=_build_headers(),
-                params={"limit": 200, "page": page},
-                timeout=30,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-
-            records = data.get("data", [])
-            pagination = data.get("pagination", {})
-            total_pages = pagination.get("total_pages", 1)
-
-            normalized = []
-            for r in records:
-                ts = r.get("timestamp", "")
-                cost_rao = r.get("subnet_registration_cost")
-                if ts and cost_rao:
-                    # 标准化时间戳格式（去除毫秒，统一为 +00:00）
-                    ts_clean = ts.rstrip("Z").split(".")[0] + "+00:00"
-                    normalized.append({
-                        "timestamp": ts_clean,
-                        "price_rao": int(cost_rao),
-                        "price_tao": round(int(cost_rao) / RAO_PER_TAO, 6),
-                    })
-
-            all_records.extend(normalized)
-            logger.info(
-                "历史数据加载: 第 %d/%d 页，本页 %d 条，累计 %d 条",
-                page, total_pages, len(normalized), len(all_records),
-            )
 
-            if page >= total_pages:
-                break
-            page += 1
+# ---------------------------------------------------------------------------
+# Taostats 历史缓存同步
+# ---------------------------------------------------------------------------
+def _historical_count() -> int:
+    """Taostats 历史缓存点数（SQLite 后端内存中只保留最后一个点，总数由存储维护）"""
+    return state.db.historical_count if state.db is not None else len(state.historical_cache)
 
-        except Exception:
-            logger.exception("获取历史数据第 %d 页失败，停止翻页", page)
-            break
 
-    # 按时间戳升序排列
-    all_records.sort(key=lambda r: r.get("timestamp", ""))
-    logger.info("历史数据加载完成，共 %d 条记录", len(all_records))
-    return all_records
+async def _refresh_historical_cache(client: httpx.AsyncClient) -> bool:
+    """
+    缓存为空或上次回填不完整时全量回填，否则只拉取高水位之后的新数据并追加合并。
+    作为独立的轮询任务与价格轮询并发运行；返回是否同步成功。
+    """
+    series = state.historical_cache
+    synced_at = datetime.now(timezone.utc)
+    complete = True
+    incremental = bool(series and state.history_cache_complete)
+
+    if incremental:
+        high_water = series.times[-1]
+        logger.info("增量同步 Taostats 历史数据（高水位 %d）...", high_water)
+        points = await _fetch_taostats_history_since(client, high_water)
+        if points is None:
+            return False
+        added = series.extend(points)
+    else:
+        logger.info("开始全量加载 Taostats 历史数据缓存...")
+        new_series, complete = await _fetch_taostats_history_all(client)
+        if not new_series:
+            return False
+        series = state.historical_cache = new_series
+        added = len(series)
+
+    state.last_history_fetch = synced_at
+    state.history_cache_complete = complete
+    if added:
+        # 历史缓存变化时才重建 K 线：在线程中基于降采样数据与实时历史的副本构建，
+        # 再补上构建期间轮询新增的价格，最后原子替换
+        live = _live_price_points(state.history)
+        rollups = RollupStore.from_bytes(state.rollups.to_bytes())
+        if state.db is not None and incremental:
+            # SQLite 增量同步：只写入新增的点，并只重建（upsert）新增点所在的周之后的蜡烛
+            new_points = series.tail(added)
+            state.db.extend_historical(new_points)
+            candles = await asyncio.to_thread(state.db.rebuild_candles, new_points.times[0], live, rollups)
+        else:
+            candles = await asyncio.to_thread(CandleEngine.build, series, live, rollups)
+        last_ts = live[-1][0] if live else 0
+        for ts, price in _live_price_points(state.history):
+            if ts > last_ts:
+                candles.add(ts, price)
+        if state.db is not None:
+            # SQLite 后端：K 线与历史点在库中，内存中只保留每个颗粒度的最后一根蜡烛与最后一个历史点
+            if incremental:
+                state.db.upsert_candles(candles)
+            else:
+                state.db.replace_historical(series, candles)
+            candles = candles.tails()
+            state.historical_cache = series.tail()
+        else:
+            _save_historical_cache(series)
+        state.candles = candles
+    _save_history_sync_meta(series, synced_at, complete)
+    if added:
+        if state.db is not None or cluster.has_followers:
+            # 先落盘：SQLite 中的历史点与 K 线随即可查，从节点可重新映射缓存文件
+            await asyncio.to_thread(persistence.flush)
+        _bump_history_version()
+        if cluster.has_followers:
+            cluster.publish({"kind": "history_refresh", "version": state.history_version})
+    return True
 
 
 # ---------------------------------------------------------------------------
-# 价格解析
+# 服务端降采样
 # ---------------------------------------------------------------------------
-def _parse_stats(data: dict[str, Any]) -> tuple[int, float, int]:
+def _lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> list[int]:
     """
-    从 Stats API 响应中提取注册费用和子网数。
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（升序，含首尾）。
 
-    返回: (price_rao, price_tao, subnet_count)
+    首尾之间均分为 threshold - 2 个桶，每个桶保留与「上一保留点、下一桶均值」
+    构成三角形面积最大的点，能在大幅减少点数的同时保留峰谷形状。
     """
-    # Taostats 响应可能是 {"data": [...]} 或直接是 dict
-    record = data
-    if isinstance(data, dict) and "data" in data:
-        inner = data["data"]
-        if isinstance(inner, list) and len(inner) > 0:
-            record = inner[0]
-        elif isinstance(inner, dict):
-            record = inner
-
-    price_rao = int(record.get("subnet_registration_cost", 0))
-    price_tao = round(price_rao / RAO_PER_TAO, 4)
-    subnet_count = int(record.get("subnets", 0))
+    n = len(xs)
+    if threshold >= n or n <= 2:
+        return list(range(n))
+    if threshold <= 2:
+        return [0, n - 1]
+
+    every = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # 下一个桶的均值点（最后一个桶的下一桶即终点）
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        if nlo >= nhi:
+            nlo, nhi = n - 1, n
+        avg_x = sum(xs[nlo:nhi]) / (nhi - nlo)
+        avg_y = sum(ys[nlo:nhi]) / (nhi - nlo)
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        picked.append(best)
+        a = best
+    picked.append(n - 1)
+    return picked
+
+
+class DownsampleCache:
+    """
+    降采样结果的 LRU 缓存。
 
-    logger.info(
-        "解析结果 — 注册费: %s RAO (%.4f TAO), 子网数: %d",
-        f"{price_rao:,}",
-        price_tao,
-        subnet_count,
-    )
-    return price_rao, price_tao, subnet_count
+    历史数据只追加不修改，(首条时间, 末条时间, 条数) 唯一确定一个窗口的内容，
+    与 max_points 一起作为键；窗口随新数据滑动时键自然变化，无需显式失效。
+    """
 
+    def __init__(self, capacity: int = DOWNSAMPLE_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self._entries: dict[tuple, list] = {}
 
-def _parse_subnets(data: Any) -> list[dict[str, Any]]:
-    """从 Subnets API 响应中提取子网列表"""
-    if isinstance(data, dict) and "data" in data:
-        subnets = data["data"]
-    elif isinstance(data, list):
-        subnets = data
-    else:
-        subnets = []
+    def get_or_compute(self, key: tuple, compute: Callable[[], list]) -> list:
+        value = self._entries.pop(key, None)
+        if value is None:
+            value = compute()
+            if len(self._entries) >= self.capacity:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = value
+        return value
 
-    if not isinstance(subnets, list):
-        logger.warning("子网数据格式异常: %s", type(subnets))
-        return []
 
-    return subnets
+history_downsample_cache = DownsampleCache()
 
 
-# ---------------------------------------------------------------------------
-# OHLC K 线聚合
-# ---------------------------------------------------------------------------
-def _build_ohlc(records: list[dict], granularity_seconds: int) -> list[dict]:
+def _downsample_indices(
+    times: Sequence[int], values: Callable[[], Sequence[float]], max_points: int | None
+) -> Sequence[int]:
     """
-    将价格记录列表聚合为 OHLC 蜡烛图数据。
-
-    records: [{"timestamp": "ISO8601", "price_tao": float}, ...]
-    granularity_seconds: 每根蜡烛的时间跨度（秒）
-    返回: [{"time": unix_ts, "open": float, "high": float, "low": float, "close": float}]
+    对一个价格窗口做 LTTB 降采样，返回保留点在窗口内的下标（结果按窗口缓存）。
+    values 只在未命中缓存时才被调用。
     """
-    if not records:
-        return []
+    n = len(times)
+    if max_points is None or n <= max_points:
+        return range(n)
+    key = (times[0], times[-1], n, max_points)
+    return history_downsample_cache.get_or_compute(key, lambda: _lttb(times, values(), max_points))
+
+
+def _choose_granularity(first: str, start_ts: int, end_ts: int | None, max_points: int) -> str:
+    """从 first 起按颗粒度由细到粗，选出窗口内蜡烛数不超过 max_points 的第一个颗粒度"""
+    names = list(GRANULARITY_SECONDS)
+    for name in names[names.index(first):]:
+        series = state.candles.series[name]
+        bucket = series.bucket_start(start_ts)
+        if state.db is not None:
+            count = state.db.candle_count(name, bucket, end_ts)
+        else:
+            lo, hi, _ = _page_range(series.times, bucket, end_ts, None, None)
+            count = hi - lo
+        if count <= max_points:
+            return name
+    return names[-1]
 
-    buckets: dict[int, list[float]] = {}
 
-    for r in records:
-        ts_str = r.get("timestamp", "")
-        if not ts_str:
-            continue
-        try:
-            # 处理不同的时间戳格式
-            ts_str_clean = ts_str.rstrip("Z").split(".")[0]
-            if "+" not in ts_str_clean and len(ts_str_clean) == 19:
-                ts_str_clean += "+00:00"
-            ts = datetime.fromisoformat(ts_str_clean)
-            if ts.tzinfo is None:
-                ts = ts.replace(tzinfo=timezone.utc)
-            bucket = int(ts.timestamp()) // granularity_seconds * granularity_seconds
-            price = float(r.get("price_tao", 0))
-            if price > 0:
-                buckets.setdefault(bucket, []).append(price)
-        except Exception:
+# ---------------------------------------------------------------------------
+# 各上游的轮询任务
+# ---------------------------------------------------------------------------
+async def _poll_usd(client: httpx.AsyncClient) -> bool:
+    """刷新 TAO/USD 价格"""
+    quote = await _fetch_tao_usd_price(client)
+    if quote is None:
+        return False
+    state.current_price_usd = quote.price
+    state.usd_quote = quote.as_dict()
+    state.last_usd_fetch = datetime.now(timezone.utc)
+    state.updated_at["tao_usd"] = quote.fetched_at
+    snapshot = _publish_snapshot()
+    cluster.publish({
+        "kind": "usd", "tao_usd_rate": quote.price, "ts": quote.fetched_at, "quote": state.usd_quote,
+        "version": snapshot.version,
+    })
+    return True
+
+
+async def _poll_stats(client: httpx.AsyncClient) -> bool:
+    """拉取注册费：记录历史、更新 K 线、检查告警、广播，然后裁剪过期数据"""
+    stage = StageTimer(METRIC_POLL_STAGE_SECONDS)
+    stats_data = await _fetch_stats(client)
+    stage.mark("fetch_stats")
+    if stats_data is None:
+        return False
+
+    now_dt = datetime.now(timezone.utc)
+    now = now_dt.isoformat()
+    now_ts = int(now_dt.timestamp())
+    price_rao, price_tao, subnet_count = _parse_stats(stats_data)
+    state.current_price_rao = price_rao
+    state.current_price_tao = price_tao
+    state.current_subnet_count = subnet_count
+    state.updated_at["price"] = now_dt.timestamp()
+    snapshot = _publish_snapshot()
+
+    price_usd = round(price_tao * state.current_price_usd, 4) if state.current_price_usd else 0.0
+
+    # 记录价格历史
+    record = PriceRecord(
+        timestamp=now,
+        price_rao=price_rao,
+        price_tao=price_tao,
+        price_usd=price_usd,
+        subnet_count=subnet_count,
+    )
+    state.history.price_history.append(record)
+    state.history_index.price_times.append(now_ts)
+    state.history_log.append("price", record)
+    state.candles.add(now_ts, price_tao)
+    if state.db is not None:
+        state.db.upsert_candles(state.candles)
+    cluster.publish({
+        "kind": "price", "record": record.model_dump(), "tao_usd_rate": state.current_price_usd,
+        "version": snapshot.version,
+    })
+
+    # 检查阈值告警
+    fired = _check_thresholds(price_tao, now_ts)
+
+    # 广播 WebSocket 更新（价格与 K 线为状态类消息，按客户端合并节流）
+    await _broadcast_ws(snapshot.price_frame, "price", conflate=True)
+    for name, series in state.candles.series.items():
+        if not series:
             continue
+        await _broadcast_ws({
+            "type": "candle_update",
+            "granularity": name,
+            "candle": series.candle(-1),
+        }, f"candles:{name}", conflate=True)
+    for rule, msg in fired:
+        await _broadcast_ws({
+            "type": "alert_triggered",
+            "timestamp": now,
+            "rule_id": rule.id,
+            "owner": rule.owner,
+            "label": rule.label,
+            "direction": rule.kind,
+            "price_tao": rule.price_tao,
+            "current_price_tao": price_tao,
+            "message": msg,
+        }, "alerts")
+    stage.mark("stats")
+
+    # 裁剪历史数据；增量已写入日志，只在日志足够长时才折叠成快照
+    cutoff_ts = _trim_history(state.history, state.history_index, state.rollups, state.config)
+    if state.rollups.dirty:
+        _save_rollups(state.rollups, state.db)
+    if state.db is not None:
+        state.db.trim_before(cutoff_ts)
+    if state.history_log.should_compact():
+        # rotate 与复制快照之间没有 await：快照恰好包含改名前日志中的全部记录
+        state.history_log.rotate()
+        snapshot = HistoryData.model_construct(
+            price_history=list(state.history.price_history),
+            new_subnet_events=list(state.history.new_subnet_events),
+        )
+        await asyncio.to_thread(state.history_log.compact, snapshot)
+    stage.mark("trim")
+    return True
+
+
+async def _poll_subnets(client: httpx.AsyncClient) -> bool:
+    """拉取子网列表：记录子网指标并检测新子网"""
+    stage = StageTimer(METRIC_POLL_STAGE_SECONDS)
+    subnets_data = await _fetch_subnets(client)
+    stage.mark("fetch_subnets")
+    if subnets_data is None:
+        return False
+
+    now_dt = datetime.now(timezone.utc)
+    now = now_dt.isoformat()
+    now_ts = int(now_dt.timestamp())
+    subnets = _parse_subnets(subnets_data)
+    state.subnets_list = subnets
+    state.subnet_metrics.record(now_ts, subnets)
+    state.updated_at["subnets"] = now_dt.timestamp()
+
+    # 新子网事件先于快照提交（及其在从节点上的复制），同一数据版本的缓存响应不会缺少事件
+    new_ids = _detect_new_subnets(subnets)
+    for sid in new_ids:
+        event = SubnetEvent(
+            timestamp=now,
+            subnet_id=sid,
+            event="new_subnet_detected",
+        )
+        state.history.new_subnet_events.append(event)
+        state.history_index.event_times.append(now_ts)
+        state.history_log.append("event", event)
+        cluster.publish({"kind": "event", "event": event.model_dump()})
+    snapshot = _publish_snapshot()
+    cluster.publish({"kind": "subnets", "ts": now_ts, "subnets": subnets, "version": snapshot.version})
+
+    for sid in new_ids:
+        notifier.notify(
+            "TAO 新子网上线",
+            f"检测到新子网 #{sid} 已上线",
+        )
+        await _broadcast_ws({
+            "type": "new_subnet",
+            "timestamp": now,
+            "subnet_id": sid,
+        }, "subnets")
+    stage.mark("subnets")
+    return True
 
-    candles = []
-    prev_close: float | None = None
-
-    for ts, prices in sorted(buckets.items()):
-        close = prices[-1]
-        # 用前一蜡烛的收盘价作为本蜡烛的开盘价（标准日K处理方式）
-        # 当每个时间区间只有1个数据点时（如每日快照），这能使蜡烛
-        # 显示方向（涨/跌）而不是扁平线
-        open_price = prev_close if prev_close is not None else prices[0]
-        high = max(max(prices), open_price)
-        low = min(min(prices), open_price)
-
-        candles.append({
-            "time": ts,
-            "open": round(open_price, 6),
-            "high": round(high, 6),
-            "low": round(low, 6),
-            "close": round(close, 6),
-        })
-        prev_close = close
 
-    return candles
+async def _poll_once(client: httpx.AsyncClient) -> None:
+    """
+    不经调度器、按固定顺序执行一轮：到期时刷新 USD 价格与历史缓存，再并发拉取 Stats 与 Subnets。
+    供基准测试与手动排查使用；服务运行时由 PollScheduler 按各自的间隔调度。
+    """
+    if _seconds_since(state.last_usd_fetch) >= state.config.usd_poll_interval_seconds:
+        await _poll_usd(client)
+    if not state.historical_cache or _seconds_since(state.last_history_fetch) >= state.config.history_refresh_interval_seconds:
+        await _refresh_historical_cache(client)
+    await asyncio.gather(_poll_stats(client), _poll_subnets(client))
 
 
 # ---------------------------------------------------------------------------
-# 阈值告警检查
+# 轮询调度
 # ---------------------------------------------------------------------------
-def _check_thresholds(price_tao: float) -> None:
-    """检查当前价格是否触发告警阈值"""
-    changed = False
-    for threshold in state.config.alert_thresholds:
-        crossed = (
-            (threshold.type == "below" and price_tao <= threshold.price_tao)
-            or (threshold.type == "above" and price_tao >= threshold.price_tao)
-        )
+def _upstream_status_message(job: "PollJob") -> dict[str, Any]:
+    """熔断器状态变化时推送给订阅 status 主题的客户端，附带受影响数据的新鲜度"""
+    health = upstream_health[job.source]
+    return {
+        "type": "upstream_status",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "source": job.source,
+        "circuit": health.circuit,
+        "failures": health.failures,
+        "retry_in_seconds": round(health.open_remaining(), 1),
+        "freshness": _freshness(job.item, state.updated_at.get(job.item)) if job.item else None,
+    }
 
-        if crossed and not threshold.triggered:
-            threshold.triggered = True
-            changed = True
-            direction = "低于" if threshold.type == "below" else "高于"
-            msg = (
-                f"注册费 {price_tao:.4f} TAO 已{direction} "
-                f"{threshold.price_tao} TAO ({threshold.label})"
-            )
-            logger.warning("阈值告警触发: %s", msg)
-            _send_macos_notification("TAO 子网价格告警", msg)
 
-        elif not crossed and threshold.triggered:
-            # 价格回到阈值范围外，重置触发状态以便下次再次告警
-            threshold.triggered = False
-            changed = True
-            logger.info("阈值已重置: %s (%.4f TAO)", threshold.label, threshold.price_tao)
+def _seconds_since(dt: datetime | None) -> float:
+    return math.inf if dt is None else (datetime.now(timezone.utc) - dt).total_seconds()
 
-    if changed:
-        _save_config(state.config)
 
+def _stats_interval() -> float:
+    """注册费接近任一价格告警阈值时缩短轮询间隔，以便更及时地发现穿越"""
+    cfg = state.config
+    proximity = state.alerts.price_proximity(state.current_price_tao)
+    if proximity is not None and proximity * 100 <= cfg.fast_poll_proximity_pct:
+        return min(cfg.poll_interval_seconds, cfg.fast_poll_interval_seconds)
+    return cfg.poll_interval_seconds
 
-# ---------------------------------------------------------------------------
-# WebSocket 广播
-# ---------------------------------------------------------------------------
-async def _broadcast_ws(message: dict[str, Any]) -> None:
-    """向所有已连接的 WebSocket 客户端广播消息"""
-    if not state.ws_clients:
-        return
 
-    payload = json.dumps(message, ensure_ascii=False)
-    disconnected: set[WebSocket] = set()
+def _usd_initial_delay() -> float:
+    return max(0.0, state.config.usd_poll_interval_seconds - _seconds_since(state.last_usd_fetch))
+
+
+def _history_initial_delay() -> float:
+    """历史缓存仍新鲜（上次同步距今不足刷新间隔）时，延后到到期再同步"""
+    if not state.historical_cache or not state.history_cache_complete:
+        return 0.0
+    return max(0.0, state.config.history_refresh_interval_seconds - _seconds_since(state.last_history_fetch))
+
 
-    for ws in state.ws_clients:
+class PollJob:
+    """一个上游的独立轮询任务：run 返回是否成功，interval 返回当前的基础间隔（秒）"""
+
+    def __init__(
+        self,
+        name: str,
+        source: str | None,
+        run: Callable[[httpx.AsyncClient], Awaitable[bool]],
+        interval: Callable[[], float],
+        initial_delay: Callable[[], float] | None = None,
+        item: str | None = None,
+    ) -> None:
+        self.name = name
+        self.source = source  # upstream_health 的键；同时请求多个来源（USD 价格）时为 None
+        self.item = item  # 本任务更新的数据项（见 _freshness），None 表示不直接对外提供
+        self.run = run
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.failures = 0
+        self.running = False
+        self.last_end = 0.0  # 上次运行结束的 epoch 秒
+        self.next_run: float | None = None  # 下次运行的 epoch 秒
+
+
+class PollScheduler:
+    """
+    每个上游一个独立的轮询协程，互不阻塞：
+
+    - 成功后等待 interval()，并加上 ±poll_jitter 的随机抖动，避免各任务（及多个部署）同时请求上游；
+    - 失败后指数退避：POLL_BACKOFF_BASE × 2^(n-1)，上限 poll_backoff_max_seconds，
+      在 [0.5, 1] 倍之间随机（full jitter）；上游返回 Retry-After（如 HTTP 429）时至少等待该时长；
+    - 配置变更时 wake() 唤醒所有等待中的任务，按新的间隔重新计算等待时间。
+    """
+
+    def __init__(self) -> None:
+        self.jobs: dict[str, PollJob] = {}
+        self._wake: asyncio.Event | None = None
+
+    def add(self, job: PollJob) -> None:
+        self.jobs[job.name] = job
+
+    def is_running(self, name: str) -> bool:
+        job = self.jobs.get(name)
+        return job is not None and job.running
+
+    def wake(self) -> None:
+        """唤醒所有等待中的任务（已在等待的 waiter 不受随后 clear 的影响）"""
+        if self._wake is not None:
+            self._wake.set()
+            self._wake.clear()
+
+    def next_delay(self, job: PollJob, ok: bool) -> float:
+        cfg = state.config
+        if ok:
+            return max(1.0, job.interval() * (1 + random.uniform(-cfg.poll_jitter, cfg.poll_jitter)))
+        exponent = min(job.failures - 1, POLL_BACKOFF_MAX_EXPONENT)
+        backoff = min(cfg.poll_backoff_max_seconds, POLL_BACKOFF_BASE * 2 ** exponent)
+        delay = backoff * random.uniform(0.5, 1.0)
+        health = upstream_health.get(job.source)
+        if health is None:
+            return delay
+        if health.retry_after is not None:
+            delay = max(delay, health.retry_after)
+        # 熔断期间的请求会被直接拒绝，不必早于半开探测的时间点重试
+        return max(delay, health.open_remaining())
+
+    def _first_run(self, job: PollJob) -> float:
+        return time.time() + (job.initial_delay() if job.initial_delay else 0.0)
+
+    async def _sleep_until(self, deadline: float) -> None:
+        """等待到 deadline（epoch 秒）；被 wake() 唤醒时提前返回"""
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
         try:
-            await ws.send_text(payload)
-        except Exception:
-            disconnected.add(ws)
+            await asyncio.wait_for(self._wake.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run_job(self, job: PollJob, client: httpx.AsyncClient) -> None:
+        job.next_run = self._first_run(job)
+        while True:
+            await self._sleep_until(job.next_run)
+            if time.time() < job.next_run:
+                # 被唤醒（配置变更）：按新的间隔重新计算；失败退避中的任务保持原计划
+                if not job.failures:
+                    job.next_run = (
+                        job.last_end + self.next_delay(job, True) if job.last_end else self._first_run(job)
+                    )
+                continue
+
+            health = upstream_health.get(job.source)
+            circuit = health.circuit if health else None
+            job.running = True
+            start = time.perf_counter()
+            try:
+                ok = await job.run(client)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("轮询任务 %s 发生未预期的异常", job.name)
+                ok = False
+            finally:
+                job.running = False
+            METRIC_POLL_SECONDS.observe(time.perf_counter() - start, job.name)
+
+            job.failures = 0 if ok else job.failures + 1
+            job.last_end = time.time()
+            delay = self.next_delay(job, ok)
+            job.next_run = job.last_end + delay
+            if ok:
+                METRIC_POLL_RUNS.inc(job.name, "ok")
+            else:
+                METRIC_POLL_RUNS.inc(job.name, "error")
+                logger.warning("轮询任务 %s 失败（连续 %d 次），%.1f 秒后重试", job.name, job.failures, delay)
+            if health is not None and health.circuit != circuit:
+                await _broadcast_ws(_upstream_status_message(job), "status")
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        self._wake = asyncio.Event()
+        tasks = [asyncio.create_task(self._run_job(job, client)) for job in self.jobs.values()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._wake = None
+
+
+scheduler = PollScheduler()
+scheduler.add(PollJob("stats", "stats", _poll_stats, _stats_interval, item="price"))
+scheduler.add(PollJob(
+    "subnets", "subnets", _poll_subnets, lambda: state.config.subnets_poll_interval_seconds, item="subnets",
+))
+scheduler.add(PollJob(
+    "usd", None, _poll_usd, lambda: state.config.usd_poll_interval_seconds, _usd_initial_delay, item="tao_usd",
+))
+scheduler.add(PollJob(
+    "history", "history", _refresh_historical_cache,
+    lambda: state.config.history_refresh_interval_seconds, _history_initial_delay,
+))
+
 
-    if disconnected:
-        state.ws_clients -= disconnected
-        logger.info("清理已断开的 WebSocket 客户端: %d 个", len(disconnected))
+async def _poll_loop() -> None:
+    """后台轮询任务：先加载存储（服务此时已在接受连接），再由调度器按各上游的间隔轮询"""
+    if not state.loaded:
+        await _load_from_disk(state.history_log)
+    cfg = state.config
+    logger.info(
+        "轮询任务已启动：Stats %d 秒（临近告警阈值时 %d 秒）、Subnets %d 秒、USD %d 秒、历史缓存 %d 秒",
+        cfg.poll_interval_seconds, cfg.fast_poll_interval_seconds, cfg.subnets_poll_interval_seconds,
+        cfg.usd_poll_interval_seconds, cfg.history_refresh_interval_seconds,
+    )
+    async with httpx.AsyncClient() as client:
+        try:
+            await scheduler.run(client)
+        except asyncio.CancelledError:
+            logger.info("轮询任务被取消")
+            raise
 
 
 # ---------------------------------------------------------------------------
-# 新子网检测
+# 响应编码与压缩（批量数据接口）
 # ---------------------------------------------------------------------------
-def _detect_new_subnets(subnets: list[dict[str, Any]]) -> list[int]:
-    """检测新上线的子网，返回新子网 ID 列表"""
-    current_ids: set[int] = set()
-    for s in subnets:
-        sid = s.get("netuid") or s.get("subnet_id") or s.get("id")
-        if sid is not None:
-            current_ids.add(int(sid))
+def _dumps(obj: Any) -> bytes:
+    """快速 JSON 编码：安装了 orjson 时使用 orjson，否则用紧凑格式的标准库 json"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
-    if not state.known_subnet_ids:
-        # 首次运行，初始化已知子网集合
-        state.known_subnet_ids = current_ids
-        logger.info("初始化已知子网 ID 集合，共 %d 个", len(current_ids))
-        return []
 
-    new_ids = sorted(current_ids - state.known_subnet_ids)
-    if new_ids:
-        logger.info("检测到 %d 个新子网: %s", len(new_ids), new_ids)
-        state.known_subnet_ids = current_ids
-    return new_ids
+def _encode_columnar(meta: dict[str, Any], columns: list[tuple[str, str, Sequence]]) -> bytes:
+    """
+    列式二进制编码，客户端可直接用 TypedArray / DataView 读取：
 
+        8 字节魔数 TAOCOL01 + uint32 头部长度（小端）+ UTF-8 JSON 头部 + 各数值列的原始字节
 
-# ---------------------------------------------------------------------------
-# 历史数据裁剪
-# ---------------------------------------------------------------------------
-def _trim_history(history: HistoryData, max_hours: int = 168) -> None:
-    """裁剪超过 max_hours 小时的历史记录（保留7天本地实时数据）"""
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=max_hours)
-    cutoff_str = cutoff.isoformat()
+    头部为 {"rows": n, "columns": [{"name", "type"}], "values": {...}, "meta": {...}}。
+    type 为 "i8"（int64）或 "f8"（float64）的列按顺序紧跟在头部之后，每列 n * 8 字节（小端），
+    头部以空格补齐使数据区 8 字节对齐；type 为 "json" 的列（如字符串）直接放在头部的 values 中。
+    """
+    rows = len(columns[0][2]) if columns else 0
+    header: dict[str, Any] = {"rows": rows, "columns": [], "values": {}, "meta": meta}
+    blobs = []
+    for name, kind, values in columns:
+        header["columns"].append({"name": name, "type": kind})
+        if kind == "json":
+            header["values"][name] = list(values)
+            continue
+        col = values if isinstance(values, array) else array("q" if kind == "i8" else "d", values)
+        if sys.byteorder != "little":
+            col = array(col.typecode, col)
+            col.byteswap()
+        blobs.append(col.tobytes())
+
+    head = _dumps(header)
+    head += b" " * (-(len(_COLUMNAR_MAGIC) + 4 + len(head)) % 8)
+    return b"".join([_COLUMNAR_MAGIC, struct.pack("<I", len(head)), head, *blobs])
+
+
+def _rows_to_columns(rows: list[dict[str, Any]]) -> list[tuple[str, str, list]]:
+    """把字典列表转为列：全部为数值（或缺失）的字段编码为 f8（缺失为 NaN），其余为 json 列"""
+    names: dict[str, None] = {}
+    for row in rows:
+        names.update(dict.fromkeys(row))
+    columns = []
+    for name in names:
+        values = [row.get(name) for row in rows]
+        numeric = all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values)
+        if numeric:
+            columns.append((name, "f8", [math.nan if v is None else float(v) for v in values]))
+        else:
+            columns.append((name, "json", values))
+    return columns
+
+
+def _wants_columnar(request: Request, fmt: str | None) -> bool:
+    """format=columnar 或 Accept 中包含列式媒体类型时返回二进制列式编码"""
+    if fmt is not None:
+        if fmt not in ("json", "columnar"):
+            raise HTTPException(status_code=400, detail=f"未知的响应格式: {fmt}")
+        return fmt == "columnar"
+    return COLUMNAR_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def _encoded_response(request: Request, body: bytes, media_type: str) -> Response:
+    """
+    客户端接受 br 且安装了 brotli 时以 brotli 压缩；
+    其余情况原样返回，由 GZipMiddleware 按 Accept-Encoding 做 gzip 压缩。
+    """
+    headers = {"Vary": "Accept"}
+    if (
+        brotli is not None
+        and len(body) >= COMPRESS_MIN_SIZE
+        and "br" in request.headers.get("accept-encoding", "")
+    ):
+        if len(body) >= COMPRESS_THREAD_MIN_SIZE:
+            body = await asyncio.to_thread(brotli.compress, body, quality=5)
+        else:
+            body = brotli.compress(body, quality=5)
+        headers["Content-Encoding"] = "br"
+        headers["Vary"] = "Accept, Accept-Encoding"
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _not_modified(request: Request, etag: str) -> Response | None:
+    """If-None-Match 与 etag 匹配时返回 304，否则返回 None"""
+    if not _etag_matches(request.headers.get("if-none-match"), etag):
+        return None
+    METRIC_RESPONSE_CACHE.inc("not_modified")
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def _snapshot_response(request: Request, snapshot: StateSnapshot, field: str) -> Response:
+    """直接返回快照中预先序列化的 JSON；带快照的 ETag，支持条件请求"""
+    not_modified = _not_modified(request, snapshot.etag)
+    if not_modified is not None:
+        return not_modified
+    return Response(
+        content=getattr(snapshot, field),
+        media_type="application/json",
+        headers={"X-State-Version": str(snapshot.version), "ETag": snapshot.etag, "Cache-Control": "no-cache"},
+    )
 
-    before = len(history.price_history)
-    history.price_history = [
-        r for r in history.price_history if r.timestamp >= cutoff_str
-    ]
-    trimmed = before - len(history.price_history)
-    if trimmed > 0:
-        logger.info("裁剪了 %d 条过期价格记录 (>%dh)", trimmed, max_hours)
 
-    before_events = len(history.new_subnet_events)
-    history.new_subnet_events = [
-        e for e in history.new_subnet_events if e.timestamp >= cutoff_str
-    ]
-    trimmed_events = before_events - len(history.new_subnet_events)
-    if trimmed_events > 0:
-        logger.info("裁剪了 %d 条过期子网事件 (>%dh)", trimmed_events, max_hours)
+async def _bulk_response(
+    request: Request,
+    fmt: str | None,
+    meta: dict[str, Any],
+    rows_key: str,
+    rows: Callable[[], list],
+    columns: Callable[[], list[tuple[str, str, Sequence]]],
+) -> Response:
+    """按内容协商返回 JSON（meta 加上 rows_key: rows()）或列式二进制（meta + columns()）"""
+    if _wants_columnar(request, fmt):
+        return await _encoded_response(request, _encode_columnar(meta, columns()), COLUMNAR_MEDIA_TYPE)
+    return await _encoded_response(request, _dumps({**meta, rows_key: rows()}), "application/json")
 
 
 # ---------------------------------------------------------------------------
-# 轮询主循环
+# 条件请求与响应缓存（只读接口）
 # ---------------------------------------------------------------------------
-async def _poll_loop() -> None:
-    """后台轮询任务：定时拉取 API 数据并处理"""
-    logger.info(
-        "轮询任务已启动，间隔 %d 秒",
-        state.config.poll_interval_seconds,
-    )
+def _data_version(path: str) -> str:
+    """
+    只读接口所依赖数据的版本：当前快照版本（每次轮询提交新数据时递增）
+    加上历史版本（历史缓存刷新、存储加载完成时更新）；
+    SQLite 后端下在库上查询的接口再加上库的提交计数，防抖写盘落地后缓存随之失效
+    """
+    snapshot_version = state.snapshot.version if state.snapshot else 0
+    version = f"{snapshot_version}.{state.history_version}"
+    if state.db is not None and path.startswith(RESPONSE_CACHE_DB_PATHS):
+        version += f".{state.db.commits}"
+    return version
 
-    async with httpx.AsyncClient() as client:
-        while True:
-            try:
-                await _poll_once(client)
-            except asyncio.CancelledError:
-                logger.info("轮询任务被取消")
-                raise
-            except Exception:
-                logger.exception("轮询过程中发生未预期的异常")
 
-            await asyncio.sleep(state.config.poll_interval_seconds)
+def _bump_history_version(version: int | None = None) -> None:
+    """历史缓存 / K 线整体替换后调用；从节点传入主节点广播的版本"""
+    state.history_version = version if version is not None else time.time_ns() // 1_000_000
+    response_cache.invalidate()
 
 
-async def _poll_once(client: httpx.AsyncClient) -> None:
-    """执行一次完整的轮询周期"""
-    now = datetime.now(timezone.utc).isoformat()
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 的弱比较（忽略 W/ 前缀），支持逗号分隔的多个值与 *"""
+    if not if_none_match:
+        return False
+    bare = etag.removeprefix("W/")
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == bare:
+            return True
+    return False
 
-    # ---- 每 5 分钟刷新一次 TAO/USD 价格 ----
-    need_usd = (
-        state.last_usd_fetch is None
-        or (datetime.now(timezone.utc) - state.last_usd_fetch).total_seconds() > 300
-    )
-    if need_usd:
-        usd_price = await _fetch_tao_usd_price(client)
-        if usd_price is not None:
-            state.current_price_usd = usd_price
-            state.last_usd_fetch = datetime.now(timezone.utc)
-
-    # ---- 每 6 小时刷新一次 Taostats 历史缓存 ----
-    need_history = (
-        not state.historical_cache
-        or state.last_history_fetch is None
-        or (datetime.now(timezone.utc) - state.last_history_fetch).total_seconds() > 21600
-    )
-    if need_history:
-        logger.info("开始刷新 Taostats 历史数据缓存（约需30秒）...")
-        new_history = await _fetch_taostats_history_all(client)
-        if new_history:
-            state.historical_cache = new_history
-            state.last_history_fetch = datetime.now(timezone.utc)
-            _save_historical_cache(new_history)
-
-    # 并发请求 Stats 和 Subnets API
-    stats_data, subnets_data = await asyncio.gather(
-        _fetch_stats(client),
-        _fetch_subnets(client),
-    )
 
-    # ---- 处理 Stats 数据 ----
-    if stats_data is not None:
-        price_rao, price_tao, subnet_count = _parse_stats(stats_data)
-        state.current_price_rao = price_rao
-        state.current_price_tao = price_tao
-        state.current_subnet_count = subnet_count
+def _representation(headers: Headers) -> str:
+    """同一 URL 的不同表示形式：是否协商为列式编码，以及响应体的内容编码"""
+    kind = "columnar" if COLUMNAR_MEDIA_TYPE in headers.get("accept", "") else "json"
+    accept_encoding = headers.get("accept-encoding", "")
+    if brotli is not None and "br" in accept_encoding:
+        return f"{kind}-br"
+    return f"{kind}-gzip" if "gzip" in accept_encoding else kind
 
-        price_usd = round(price_tao * state.current_price_usd, 4) if state.current_price_usd else 0.0
 
-        # 记录价格历史
-        record = PriceRecord(
-            timestamp=now,
-            price_rao=price_rao,
-            price_tao=price_tao,
-            price_usd=price_usd,
-            subnet_count=subnet_count,
-        )
-        state.history.price_history.append(record)
+class CachedResponse:
+    __slots__ = ("version", "status", "headers", "body", "route")
 
-        # 检查阈值告警
-        _check_thresholds(price_tao)
+    def __init__(self, version: str, status: int, headers: list, body: bytes, route: Any) -> None:
+        self.version = version
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.route = route
 
-        # 广播 WebSocket 更新
-        await _broadcast_ws({
-            "type": "price_update",
-            "timestamp": now,
-            "price_rao": price_rao,
-            "price_tao": price_tao,
-            "price_usd": price_usd,
-            "tao_usd_rate": state.current_price_usd,
-            "subnet_count": subnet_count,
-        })
 
-    # ---- 处理 Subnets 数据 ----
-    if subnets_data is not None:
-        subnets = _parse_subnets(subnets_data)
-        state.subnets_list = subnets
-
-        new_ids = _detect_new_subnets(subnets)
-        for sid in new_ids:
-            event = SubnetEvent(
-                timestamp=now,
-                subnet_id=sid,
-                event="new_subnet_detected",
-            )
-            state.history.new_subnet_events.append(event)
-            _send_macos_notification(
-                "TAO 新子网上线",
-                f"检测到新子网 #{sid} 已上线",
-            )
-            await _broadcast_ws({
-                "type": "new_subnet",
-                "timestamp": now,
-                "subnet_id": sid,
-            })
+class ResponseCache:
+    """
+    只读接口完整响应（压缩后的字节与响应头）的 LRU 缓存，总大小受 response_cache_max_mb 限制。
+    条目绑定数据版本；轮询或历史刷新提交新数据时 invalidate() 整体清空。
+    inflight 记录正在计算的键：同一键的并发请求等待第一个请求的结果，不重复计算。
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[tuple, CachedResponse] = {}
+        self.size = 0
+        self.inflight: dict[tuple, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple, version: str) -> CachedResponse | None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry.version != version:
+            self.size -= len(entry.body)
+            return None
+        self._entries[key] = entry
+        return entry
+
+    def put(self, key: tuple, entry: CachedResponse) -> None:
+        max_bytes = state.config.response_cache_max_mb * 1024 * 1024
+        if len(entry.body) > max_bytes // 4:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old.body)
+        while self._entries and (
+            self.size + len(entry.body) > max_bytes or len(self._entries) >= RESPONSE_CACHE_MAX_ENTRIES
+        ):
+            self.size -= len(self._entries.pop(next(iter(self._entries))).body)
+        self._entries[key] = entry
+        self.size += len(entry.body)
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMiddleware:
+    """
+    纯 ASGI 中间件：缓存 RESPONSE_CACHE_PATHS 下 GET 请求的完整响应。
+    位于 GZip 之外，缓存的是压缩后的字节。
+
+    键为 路径 + 规范化的查询参数 + 表示形式（见 _representation），条目与 _data_version(路径) 绑定。
+    ETag 由数据版本、表示形式与键的摘要组成；只有键存在同版本的缓存条目（即已成功计算过的 200 响应）
+    且 If-None-Match 匹配时才返回 304，无效请求（如错误的游标）总会执行路由并得到相应的错误。
+    Cache-Control: no-cache 让浏览器缓存响应但每次带 ETag 重新验证。
+    按相对时间窗口（hours / days）查询的响应还绑定当前轮询间隔，即使数据版本不变（如上游中断期间），
+    窗口起点也最多滞后一个轮询间隔。
+    """
 
-    # 裁剪并持久化历史数据
-    _trim_history(state.history)
-    _save_history(state.history)
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(RESPONSE_CACHE_PATHS)
+            or not state.config.response_cache_enabled
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        path = scope["path"]
+        params = sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        query = urlencode(params)
+        version = self._version(path, params)
+        variant = _representation(headers)
+        key = (path, query, variant)
+        digest = hashlib.blake2b(f"{path}?{query}".encode(), digest_size=6).hexdigest()
+        etag = f'"{version}-{variant}-{digest}"'
+        entry = response_cache.get(key, version)
+        result = "hit"
+        if entry is None and key in response_cache.inflight:
+            entry = await asyncio.shield(response_cache.inflight[key])
+            if entry is not None and entry.version != version:
+                entry = None
+            result = "shared"
+        if entry is not None:
+            scope["route"] = entry.route
+            if _etag_matches(headers.get("if-none-match"), etag):
+                METRIC_RESPONSE_CACHE.inc("not_modified")
+                await self._send(send, 304, [], b"", etag)
+            else:
+                METRIC_RESPONSE_CACHE.inc(result)
+                await self._send(send, entry.status, entry.headers, entry.body, etag)
+            return
+
+        METRIC_RESPONSE_CACHE.inc("miss")
+        if key in response_cache.inflight:
+            await self.app(scope, receive, send)
+            return
+        future = asyncio.get_running_loop().create_future()
+        response_cache.inflight[key] = future
+        entry = None
+        try:
+            entry = await self._fill(scope, receive, send, params, version, etag)
+            if entry is not None:
+                response_cache.put(key, entry)
+        finally:
+            response_cache.inflight.pop(key, None)
+            future.set_result(entry)
+
+    @staticmethod
+    def _version(path: str, params: list[tuple[str, str]]) -> str:
+        version = _data_version(path)
+        if path.startswith(RESPONSE_CACHE_RELATIVE_PATHS) and all(k != "from" for k, _ in params):
+            version += f".w{int(time.time() // max(1, state.config.poll_interval_seconds))}"
+        return version
+
+    async def _fill(
+        self,
+        scope: dict,
+        receive: Callable,
+        send: Callable,
+        params: list[tuple[str, str]],
+        version: str,
+        etag: str,
+    ) -> CachedResponse | None:
+        """执行下游应用并原样转发响应，200 且计算期间数据版本未变时返回可缓存的条目"""
+        status = 0
+        response_headers: list = []
+        chunks: list[bytes] = []
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = list(message.get("headers", []))
+                if status == 200:
+                    message = {**message, "headers": [*response_headers, *self._validators(etag)]}
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+        if status != 200 or self._version(scope["path"], params) != version:
+            return None
+        return CachedResponse(version, status, response_headers, b"".join(chunks), scope.get("route"))
+
+    @staticmethod
+    def _validators(etag: str) -> list[tuple[bytes, bytes]]:
+        return [(b"etag", etag.encode("latin-1")), (b"cache-control", b"no-cache")]
+
+    async def _send(self, send: Callable, status: int, headers: list, body: bytes, etag: str) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": [*headers, *self._validators(etag)]})
+        await send({"type": "http.response.body", "body": body})
 
 
 # ---------------------------------------------------------------------------
@@ -702,17 +4527,23 @@ async def _poll_once(client: httpx.AsyncClient) -> None:
 # ---------------------------------------------------------------------------
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    """应用生命周期管理：启动轮询任务，关闭时取消"""
+    """应用生命周期管理：启动通知分发并参与主节点选举（主节点运行轮询任务），关闭时取消"""
     logger.info("TAO 子网监控服务启动中...")
-    state.poll_task = asyncio.create_task(_poll_loop())
+    logger.info(
+        "JSON 编码: %s，响应压缩: %s",
+        "orjson" if orjson is not None else "json（未安装 orjson）",
+        "br, gzip" if brotli is not None else "gzip（未安装 brotli）",
+    )
+    notifier.start()
+    lag_task = asyncio.create_task(_monitor_loop_lag())
+    await cluster.start()
     yield
     logger.info("TAO 子网监控服务关闭中...")
-    if state.poll_task:
-        state.poll_task.cancel()
-        try:
-            await state.poll_task
-        except asyncio.CancelledError:
-            pass
+    lag_task.cancel()
+    await cluster.stop()
+    await notifier.stop()
+    await asyncio.to_thread(persistence.flush)
+    state.history_log.close()
     logger.info("服务已停止")
 
 
@@ -722,118 +4553,393 @@ app = FastAPI(
     version="2.0.0",
     lifespan=lifespan,
 )
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE)
+app.add_middleware(ResponseCacheMiddleware)
+
+
+# ---------------------------------------------------------------------------
+# 运行指标：HTTP 中间件、事件循环延迟、抓取时计算的仪表与 /metrics
+# ---------------------------------------------------------------------------
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件：按路由模板（而非原始路径，避免路径参数导致标签膨胀）记录
+    HTTP 请求耗时与响应体大小。位于 GZip 之外，统计的是实际发送的字节数。
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            method = scope["method"]
+            METRIC_HTTP_SECONDS.observe(time.perf_counter() - start, method, route, str(status))
+            METRIC_HTTP_RESPONSE_BYTES.observe(size, method, route)
+
+
+app.add_middleware(MetricsMiddleware)
+
+_loop_lag = 0.0
+
+
+async def _monitor_loop_lag() -> None:
+    """定时休眠并测量实际唤醒时间与预期的差值，即事件循环被阻塞的时长"""
+    global _loop_lag
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        _loop_lag = max(0.0, loop.time() - expected)
+        METRIC_LOOP_LAG_SECONDS.observe(_loop_lag)
+
+
+def _collect_ws_queue_depth(lines: list[str]) -> None:
+    """各 WebSocket 客户端待发送消息数的分布（抓取时计算）"""
+    name = "tao_monitor_ws_client_queue_depth"
+    counts = [0] * (len(QUEUE_DEPTH_BUCKETS) + 1)
+    total = 0
+    for client in state.ws_clients.values():
+        depth = client.queue.qsize() + len(client.latest)
+        counts[bisect.bisect_left(QUEUE_DEPTH_BUCKETS, depth)] += 1
+        total += depth
+    lines.append(f"# HELP {name} WebSocket 客户端待发送消息数（抓取时的分布）")
+    lines.append(f"# TYPE {name} histogram")
+    _render_histogram(lines, name, (), (), QUEUE_DEPTH_BUCKETS, counts, total)
+
+
+metrics.gauge("tao_monitor_ws_clients", "本进程的 WebSocket 连接数", lambda: len(state.ws_clients))
+metrics.gauge("tao_monitor_price_history_records", "本地价格历史条数", lambda: len(state.history.price_history))
+metrics.gauge("tao_monitor_subnet_events", "新子网事件条数", lambda: len(state.history.new_subnet_events))
+metrics.gauge("tao_monitor_historical_cache_points", "Taostats 历史缓存点数", _historical_count)
+metrics.labeled_gauge(
+    "tao_monitor_rollup_candles", "降采样层级的蜡烛数", ["tier"],
+    lambda: [((name,), len(series)) for name, series in state.rollups.tiers.items()],
+)
+metrics.labeled_gauge(
+    "tao_monitor_candles", "内存中各颗粒度的蜡烛数", ["granularity"],
+    lambda: [((name,), len(series)) for name, series in state.candles.series.items()],
+)
+metrics.gauge("tao_monitor_subnets", "当前子网数", lambda: len(state.subnets_list))
+metrics.gauge("tao_monitor_alert_rules", "告警规则数（含配置阈值）", lambda: len(state.alerts.rules))
+metrics.gauge(
+    "tao_monitor_notify_queue_size", "通知队列长度", lambda: notifier.queue.qsize() if notifier.queue else 0
+)
+metrics.gauge("tao_monitor_event_loop_lag_last_seconds", "最近一次采样的事件循环延迟", lambda: _loop_lag)
+metrics.gauge("tao_monitor_is_leader", "本进程是否为轮询主节点", lambda: int(cluster.is_leader))
+metrics.gauge("tao_monitor_response_cache_entries", "响应缓存条目数", lambda: len(response_cache))
+metrics.gauge("tao_monitor_response_cache_bytes", "响应缓存占用的字节数", lambda: response_cache.size)
+metrics.labeled_gauge(
+    "tao_monitor_poll_next_run_seconds", "距各轮询任务下次运行的秒数", ["job"],
+    lambda: [((job.name,), max(0.0, job.next_run - time.time())) for job in scheduler.jobs.values() if job.next_run],
+)
+metrics.labeled_gauge(
+    "tao_monitor_poll_consecutive_failures", "各轮询任务的连续失败次数", ["job"],
+    lambda: [((job.name,), job.failures) for job in scheduler.jobs.values()],
+)
+metrics.labeled_gauge(
+    "tao_monitor_upstream_circuit_state", "各上游熔断器状态（0 关闭，1 半开，2 打开）", ["source"],
+    lambda: [((name,), {"closed": 0, "half_open": 1, "open": 2}[h.circuit]) for name, h in upstream_health.items()],
+)
+metrics.labeled_gauge(
+    "tao_monitor_data_age_seconds", "各项数据距最近一次成功更新的秒数", ["item"],
+    lambda: [((item,), time.time() - ts) for item, ts in state.updated_at.items()],
+)
+metrics.gauge("tao_monitor_price_tao", "当前注册费（TAO）", lambda: state.current_price_tao)
+metrics.collector(_collect_ws_queue_depth)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 文本格式的运行指标（多进程部署时为本进程的指标）"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # ---------------------------------------------------------------------------
 # API 端点
 # ---------------------------------------------------------------------------
 @app.get("/api/current")
-async def get_current():
-    """获取当前注册费用、子网数量和 USD 价格"""
-    price_usd = round(state.current_price_tao * state.current_price_usd, 4) if state.current_price_usd else 0.0
-    return {
-        "price_rao": state.current_price_rao,
-        "price_tao": state.current_price_tao,
-        "price_usd": price_usd,
-        "tao_usd_rate": state.current_price_usd,
-        "subnet_count": state.current_subnet_count,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+async def get_current(request: Request):
+    """
+    获取当前注册费用、子网数量和 USD 价格。
+    timestamp 为注册费最近一次成功更新的时间；上游故障期间继续返回最后的值，
+    并通过 age_seconds / stale 及 freshness（价格、汇率、子网列表各自的新鲜度）标明。
+    返回当前快照预先序列化的 JSON，version 为快照版本（同时在 X-State-Version 响应头中）。
+    """
+    return _snapshot_response(request, _snapshot(), "current_json")
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """存活探针：进程能响应即返回 200"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+    就绪探针：存储加载完成后返回 200；加载期间返回 503，此时各接口只返回部分数据。
+    Taostats 历史缓存的后台回填不影响就绪状态，通过 history_backfilling 报告。
+    """
+    body = {
+        "ready": state.loaded,
+        "leader": cluster.is_leader,
+        "history_records": len(state.history.price_history),
+        "historical_cache_points": _historical_count(),
+        "history_backfilling": scheduler.is_running("history"),
     }
+    return JSONResponse(body, status_code=200 if state.loaded else 503)
 
 
 @app.get("/api/history")
-async def get_history(hours: int = 24):
-    """获取价格历史记录（默认最近 24 小时）"""
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-    cutoff_str = cutoff.isoformat()
-
-    filtered = [
-        r.model_dump() for r in state.history.price_history
-        if r.timestamp >= cutoff_str
-    ]
+async def get_history(
+    request: Request,
+    hours: int = 24,
+    from_ts: int | None = Query(None, alias="from"),
+    to_ts: int | None = Query(None, alias="to"),
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    max_points: int | None = Query(None, ge=3),
+    fmt: str | None = Query(None, alias="format"),
+):
+    """
+    获取价格历史记录（默认最近 24 小时）。
 
-    return {
+    from / to: 可选的 epoch 秒时间范围（闭区间），指定 from 时忽略 hours
+    limit / cursor: 分页；响应中的 next_cursor 非空时用它请求下一页
+    max_points: 可选，按 price_tao 用 LTTB 算法把（本页）价格记录降采样到至多 max_points 个点
+    format: "json"（默认）| "columnar"（列式二进制：time / price_rao / price_tao / price_usd / subnet_count，
+        time 为 epoch 秒；也可通过 Accept: application/vnd.tao.columnar 协商）
+    """
+    start_ts = from_ts if from_ts is not None else int(
+        (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+    )
+    # 两种存储后端的原始记录都只保留 raw_retention_hours，全部在内存中（SQLite 只作持久化）
+    index = state.history_index
+    lo, hi, next_cursor = _page_range(index.price_times, start_ts, to_ts, limit, cursor)
+    page = state.history.price_history[lo:hi]
+    page_times = index.price_times[lo:hi]
+    picked = _downsample_indices(page_times, lambda: [r.price_tao for r in page], max_points)
+    selected = [page[i] for i in picked]
+    selected_times = [page_times[i] for i in picked]
+
+    def records() -> list[dict]:
+        return [r.model_dump() for r in selected]
+
+    def field(name: str) -> list:
+        return [getattr(r, name) for r in selected]
+
+    # 子网事件按本页覆盖的时间窗口切分，使各页事件互不重叠
+    page_start = index.price_times[lo] if cursor and lo < len(index.price_times) else start_ts
+    ev_lo = bisect.bisect_left(index.event_times, page_start)
+    if next_cursor is not None:
+        ev_hi = bisect.bisect_left(index.event_times, index.price_times[hi])
+    elif to_ts is not None:
+        ev_hi = bisect.bisect_right(index.event_times, to_ts)
+    else:
+        ev_hi = len(index.event_times)
+    events = [e.model_dump() for e in state.history.new_subnet_events[ev_lo:max(ev_lo, ev_hi)]]
+
+    meta = {
         "hours": hours,
-        "count": len(filtered),
-        "price_history": filtered,
-        "new_subnet_events": [
-            e.model_dump() for e in state.history.new_subnet_events
-            if e.timestamp >= cutoff_str
-        ],
+        "from": start_ts,
+        "to": to_ts,
+        "count": len(selected),
+        "new_subnet_events": events,
+        "next_cursor": next_cursor,
+        "loading": not state.loaded,
     }
+    return await _bulk_response(request, fmt, meta, "price_history", records, lambda: [
+        ("time", "i8", selected_times),
+        ("price_rao", "i8", field("price_rao")),
+        ("price_tao", "f8", field("price_tao")),
+        ("price_usd", "f8", field("price_usd")),
+        ("subnet_count", "i8", field("subnet_count")),
+    ])
 
 
 @app.get("/api/kline")
-async def get_kline(granularity: str = "1d", days: int = 365):
+async def get_kline(
+    request: Request,
+    granularity: str = "1d",
+    days: int = 365,
+    from_ts: int | None = Query(None, alias="from"),
+    to_ts: int | None = Query(None, alias="to"),
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    max_points: int | None = Query(None, ge=1),
+    fmt: str | None = Query(None, alias="format"),
+):
     """
     获取 K 线 OHLC 数据。
 
-    granularity: "5m" | "1h" | "4h" | "1d" | "1w"
-    days: 返回最近多少天的数据（默认365天）
+    granularity: "5m" | "1h" | "4h" | "1d" | "1w" | "auto"
+    days: 返回最近多少天的数据（默认365天），指定 from 时忽略
+    from / to: 可选的 epoch 秒时间范围（含 from 所在的蜡烛）
+    limit / cursor: 分页；响应中的 next_cursor 非空时用它请求下一页
+    max_points: 可选，窗口内蜡烛数超过该值时自动改用更粗的颗粒度（响应中的 granularity 为实际颗粒度）；
+        granularity=auto 时从 5m 开始选择，未指定 max_points 则以 KLINE_AUTO_MAX_POINTS 为上限
+    format: "json"（默认）| "columnar"（列式二进制：time / open / high / low / close 平行数组，
+        也可通过 Accept: application/vnd.tao.columnar 协商）
     """
-    gran_secs = GRANULARITY_SECONDS.get(granularity, 86400)
-    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-    cutoff_str = cutoff.isoformat()
-
-    all_records: list[dict] = []
-
-    # 1. 加入 Taostats 历史缓存数据
-    for r in state.historical_cache:
-        if r.get("timestamp", "") >= cutoff_str:
-            all_records.append(r)
+    start_ts = from_ts if from_ts is not None else int(
+        (datetime.now(timezone.utc) - timedelta(days=days)).timestamp()
+    )
 
-    # 2. 加入本地实时历史（监控期间累积的高频数据）
-    for r in state.history.price_history:
-        if r.timestamp >= cutoff_str:
-            all_records.append({
-                "timestamp": r.timestamp,
-                "price_rao": r.price_rao,
-                "price_tao": r.price_tao,
-            })
+    if granularity == "auto":
+        name = "5m"
+        max_points = max_points or KLINE_AUTO_MAX_POINTS
+    else:
+        name = granularity if granularity in state.candles.series else "1d"
+    if max_points is not None:
+        if state.db is not None:
+            name = await asyncio.to_thread(_choose_granularity, name, start_ts, to_ts, max_points)
+        else:
+            name = _choose_granularity(name, start_ts, to_ts, max_points)
+    series = state.candles.series[name]
+    if state.db is not None:
+        candles, next_cursor = await asyncio.to_thread(
+            state.db.candle_page, name, series.bucket_start(start_ts), to_ts, limit, cursor
+        )
+        count = len(candles)
 
-    # 构建 OHLC 蜡烛数据
-    candles = _build_ohlc(all_records, gran_secs)
+        def rows() -> list[dict]:
+            return candles
 
-    return {
-        "granularity": granularity,
-        "gran_secs": gran_secs,
+        def columns() -> list[tuple[str, str, Sequence]]:
+            return [(key, "i8" if key == "time" else "f8", [c[key] for c in candles])
+                    for key in ("time", "open", "high", "low", "close")]
+    else:
+        # 直接切片预先物化的蜡烛；列式编码时各列切片即原始字节
+        lo, hi, next_cursor = _page_range(series.times, series.bucket_start(start_ts), to_ts, limit, cursor)
+        count = hi - lo
+
+        def rows() -> list[dict]:
+            return [series.candle(i) for i in range(lo, hi)]
+
+        def columns() -> list[tuple[str, str, Sequence]]:
+            return [
+                ("time", "i8", series.times[lo:hi]),
+                ("open", "f8", series.open[lo:hi]),
+                ("high", "f8", series.high[lo:hi]),
+                ("low", "f8", series.low[lo:hi]),
+                ("close", "f8", series.close[lo:hi]),
+            ]
+
+    meta = {
+        "granularity": name,
+        "gran_secs": GRANULARITY_SECONDS[name],
         "days": days,
-        "count": len(candles),
-        "candles": candles,
+        "from": start_ts,
+        "to": to_ts,
+        "count": count,
+        "next_cursor": next_cursor,
+        "loading": not state.loaded,
     }
+    return await _bulk_response(request, fmt, meta, "candles", rows, columns)
 
 
 @app.get("/api/tao-usd")
-async def get_tao_usd():
-    """获取当前 TAO/USD 汇率"""
-    return {
-        "tao_usd": state.current_price_usd,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-    }
+async def get_tao_usd(request: Request):
+    """获取当前 TAO/USD 汇率，及其来源（source）与该来源的请求耗时（latency_ms）"""
+    return _snapshot_response(request, _snapshot(), "tao_usd_json")
 
 
 @app.get("/api/config")
 async def get_config():
-    """获取当前告警配置"""
-    return state.config.model_dump()
+    """获取当前告警配置（阈值带当前触发状态）"""
+    return {**state.config.model_dump(), "alert_thresholds": state.alerts.thresholds_payload(state.config)}
 
 
 @app.post("/api/config")
 async def save_config(new_config: AppConfig):
     """保存告警配置"""
     state.config = new_config
+    state.alerts.set_thresholds(new_config.alert_thresholds)
     _save_config(new_config)
+    scheduler.wake()
+    response_cache.invalidate()
+    await cluster.config_changed()
     logger.info("配置已通过 API 更新")
-    return {"success": True, "config": new_config.model_dump()}
+    return {
+        "success": True,
+        "config": {**new_config.model_dump(), "alert_thresholds": state.alerts.thresholds_payload(new_config)},
+    }
+
+
+@app.get("/api/alerts/rules")
+async def get_alert_rules(owner: str | None = None):
+    """获取告警规则（含配置中的阈值）及其触发状态，可按 owner 过滤"""
+    rules = [
+        {**r.model_dump(), "triggered": r.id in state.alerts.triggered}
+        for r in state.alerts.rules.values()
+        if owner is None or r.owner == owner
+    ]
+    return {"count": len(rules), "rules": rules}
+
+
+@app.post("/api/alerts/rules")
+async def add_alert_rule(rule: AlertRule):
+    """新增告警规则（id 为空时自动生成）"""
+    if rule.kind not in ("above", "below", "pct_change", "eta"):
+        raise HTTPException(status_code=400, detail=f"未知的规则类型: {rule.kind}")
+    if rule.kind in ("pct_change", "eta") and rule.window_seconds <= 0:
+        raise HTTPException(status_code=400, detail="window_seconds 必须为正数")
+    rule = state.alerts.add_rule(rule)
+    _save_alert_state(state.alerts)
+    await cluster.alerts_changed()
+    logger.info("告警规则已添加: %s (%s)", rule.id, rule.kind)
+    return {"success": True, "rule": rule.model_dump()}
+
+
+@app.delete("/api/alerts/rules/{rule_id}")
+async def delete_alert_rule(rule_id: str):
+    """删除用户告警规则（配置中的阈值请通过 /api/config 修改）"""
+    if not state.alerts.remove_rule(rule_id):
+        raise HTTPException(status_code=404, detail=f"规则不存在: {rule_id}")
+    _save_alert_state(state.alerts)
+    await cluster.alerts_changed()
+    return {"success": True}
 
 
 @app.get("/api/subnets")
-async def get_subnets():
-    """获取当前子网列表"""
-    return {
-        "count": len(state.subnets_list),
-        "subnets": state.subnets_list,
-    }
+async def get_subnets(request: Request, fmt: str | None = Query(None, alias="format")):
+    """
+    获取当前子网列表（来自当前快照，JSON 为预先序列化的内容）。
+
+    format: "json"（默认）| "columnar"（列式二进制：数值字段为 f8 列，其余字段为 json 列）
+    """
+    snapshot = _snapshot()
+    columnar = _wants_columnar(request, fmt)
+    etag = snapshot.etag[:-1] + ('-columnar"' if columnar else '"')
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    if columnar:
+        body = _encode_columnar(snapshot.subnets_meta(), _rows_to_columns(snapshot.subnets))
+        response = await _encoded_response(request, body, COLUMNAR_MEDIA_TYPE)
+    else:
+        response = await _encoded_response(request, snapshot.subnets_json, "application/json")
+    response.headers["X-State-Version"] = str(snapshot.version)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.get("/api/subnet-registrations")
@@ -878,6 +4984,43 @@ async def get_subnet_registrations():
     }
 
 
+@app.get("/api/subnet-metrics/{netuid}")
+async def get_subnet_metrics(
+    netuid: int,
+    fields: str | None = None,
+    hours: int = 24,
+    from_ts: int | None = Query(None, alias="from"),
+    to_ts: int | None = Query(None, alias="to"),
+):
+    """
+    获取单个子网的指标时间序列（列式）。
+
+    fields: 逗号分隔的字段名，默认为配置中的全部字段
+    from / to: 可选的 epoch 秒时间范围，指定 from 时忽略 hours
+    """
+    store = state.subnet_metrics
+    field_list = fields.split(",") if fields else store.fields
+    start_ts = from_ts if from_ts is not None else int(
+        (datetime.now(timezone.utc) - timedelta(hours=hours)).timestamp()
+    )
+    data = store.series(netuid, field_list, start_ts, to_ts)
+    return {"netuid": netuid, "fields": field_list, "count": len(data["times"]), **data}
+
+
+@app.get("/api/subnet-metrics")
+async def get_subnet_metrics_cross_section(at: int | None = None, fields: str | None = None):
+    """
+    获取所有子网在某一时刻的指标截面。
+
+    at: epoch 秒，取不晚于该时刻的最近一次采样；默认最新一次
+    fields: 逗号分隔的字段名，默认为配置中的全部字段
+    """
+    store = state.subnet_metrics
+    field_list = fields.split(",") if fields else store.fields
+    sample_ts, rows = store.cross_section(at, field_list)
+    return {"timestamp": sample_ts, "fields": field_list, "count": len(rows), "subnets": rows}
+
+
 # ---------------------------------------------------------------------------
 # WebSocket 端点
 # ---------------------------------------------------------------------------
@@ -885,36 +5028,28 @@ async def get_subnet_registrations():
 async def websocket_endpoint(ws: WebSocket):
     """WebSocket 连接端点，用于实时推送价格更新"""
     await ws.accept()
-    state.ws_clients.add(ws)
-    client_host = ws.client.host if ws.client else "unknown"
+    client = WSClient(ws)
+    state.ws_clients[ws] = client
+    client_host = client.host
     logger.info("WebSocket 客户端已连接: %s (当前共 %d 个)", client_host, len(state.ws_clients))
 
-    # 连接后立即推送当前价格
-    try:
-        price_usd = round(state.current_price_tao * state.current_price_usd, 4) if state.current_price_usd else 0.0
-        await ws.send_json({
-            "type": "price_update",
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "price_rao": state.current_price_rao,
-            "price_tao": state.current_price_tao,
-            "price_usd": price_usd,
-            "tao_usd_rate": state.current_price_usd,
-            "subnet_count": state.current_subnet_count,
-        })
-    except Exception:
-        logger.exception("WebSocket 初始推送失败")
+    # 连接后立即推送当前价格（附带新鲜度，上游故障期间客户端可据此提示数据已过期）
+    client.offer("price", _snapshot().price_frame, conflate=True)
+    client.start()
 
     try:
         while True:
-            # 保持连接，接收客户端消息（心跳等）
+            # 接收客户端消息（订阅、心跳）
             data = await ws.receive_text()
             logger.debug("收到 WebSocket 消息: %s", data)
+            _handle_ws_message(client, data)
     except WebSocketDisconnect:
         logger.info("WebSocket 客户端断开: %s", client_host)
     except Exception:
         logger.debug("WebSocket 连接异常关闭: %s", client_host)
     finally:
-        state.ws_clients.discard(ws)
+        client.stop()
+        state.ws_clients.pop(ws, None)
 
 
 # ---------------------------------------------------------------------------
@@ -942,11 +5077,15 @@ if STATIC_DIR.exists():
 # ---------------------------------------------------------------------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8888))
-    logger.info("启动服务器，端口: %d", port)
+    # WORKERS > 1 时以多进程运行：一个进程轮询，其余进程分担 HTTP / WebSocket 流量
+    workers = int(os.environ.get("WORKERS", 1))
+    logger.info("启动服务器，端口: %d，工作进程: %d", port, workers)
     uvicorn.run(
-        "monitor:app",
+        # 单进程时直接传入 app，避免 uvicorn 按字符串再次导入本模块
+        app if workers == 1 else "monitor:app",
         host="0.0.0.0",
         port=port,
         reload=False,
+        workers=workers,
         log_level="info",
     )
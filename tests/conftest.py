@@ -0,0 +1,41 @@
+"""
+monitor 在导入时即加载配置与状态，因此在导入前把配置文件、数据目录指向临时目录，
+并把上游 API 指向不可达的本地地址，测试不会读写真实数据，也不会访问外网。
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+_TMP_DIR = Path(tempfile.mkdtemp(prefix="tao-test-"))
+_UPSTREAM = "http://127.0.0.1:9"
+
+os.environ.update({
+    "TAO_MONITOR_CONFIG": str(_TMP_DIR / "config.json"),
+    "TAO_MONITOR_DATA_DIR": str(_TMP_DIR / "data"),
+    "TAOSTATS_API_BASE": _UPSTREAM,
+    "CMC_API_BASE": _UPSTREAM,
+    "COINGECKO_API_BASE": _UPSTREAM,
+    "BINANCE_API_BASE": _UPSTREAM,
+})
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
+
+import monitor  # noqa: E402
+
+
+@pytest.fixture
+def m():
+    return monitor
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """每个测试使用一份默认配置，修改不会影响其他测试"""
+    cfg = monitor.AppConfig()
+    monkeypatch.setattr(monitor.state, "config", cfg)
+    return cfg
@@ -0,0 +1,116 @@
+def test_level_index_first_update_reports_state(m):
+    index = m._LevelIndex([(10.0, "a10"), (20.0, "a20")], [(5.0, "b5"), (15.0, "b15")])
+    on, off = index.update(12.0)
+    assert sorted(on) == ["a10", "b15"]
+    assert sorted(off) == ["a20", "b5"]
+
+
+def test_level_index_crossings(m):
+    index = m._LevelIndex([(10.0, "a10"), (20.0, "a20")], [(5.0, "b5"), (15.0, "b15")])
+    index.update(12.0)
+    assert index.update(12.0) == ([], [])
+    # 上穿 15、20：a20 进入触发态，b15 离开触发态
+    assert index.update(21.0) == (["a20"], ["b15"])
+    # 恰好等于阈值时处于触发态
+    assert index.update(20.0) == ([], [])
+    # 一次跨过多个阈值
+    on, off = index.update(4.0)
+    assert sorted(on) == ["b15", "b5"]
+    assert sorted(off) == ["a10", "a20"]
+
+
+def test_level_index_nearest(m):
+    index = m._LevelIndex([(10.0, "a")], [(30.0, "b")])
+    assert index.nearest(12.0) == 2.0
+    assert index.nearest(29.0) == 1.0
+    assert m._LevelIndex([], []).nearest(1.0) is None
+
+
+def test_engine_fires_once_and_rearms(m, config):
+    engine = m.AlertEngine([m.AlertRule(id="r1", kind="below", price_tao=100.0)], [], set())
+    assert engine.evaluate(1, 150.0) == []
+    fired = engine.evaluate(2, 90.0)
+    assert [rule.id for rule, _ in fired] == ["r1"]
+    assert "r1" in engine.triggered
+    # 仍低于阈值，不重复告警
+    assert engine.evaluate(3, 80.0) == []
+    # 回到阈值以上后重置，再次下穿重新告警
+    assert engine.evaluate(4, 120.0) == []
+    assert "r1" not in engine.triggered
+    assert [rule.id for rule, _ in engine.evaluate(5, 95.0)] == ["r1"]
+
+
+def test_engine_pct_change_window(m, config):
+    rule = m.AlertRule(id="drop", kind="pct_change", pct=-10.0, window_seconds=600)
+    engine = m.AlertEngine([rule], [], set())
+    assert engine.evaluate(0, 100.0) == []
+    assert engine.evaluate(300, 95.0) == []
+    assert [r.id for r, _ in engine.evaluate(600, 89.0)] == ["drop"]
+
+
+def test_engine_remove_rule_clears_trigger(m, config):
+    engine = m.AlertEngine([m.AlertRule(id="r1", kind="above", price_tao=10.0)], [], set())
+    engine.evaluate(1, 20.0)
+    assert engine.triggered == {"r1"}
+    assert engine.remove_rule("r1")
+    assert engine.triggered == set()
+    assert engine.evaluate(2, 30.0) == []
+
+
+def _threshold(m, price, label="", id="", triggered=False, type="below"):
+    return m.AlertThreshold(id=id, price_tao=price, type=type, label=label, triggered=triggered)
+
+
+def test_threshold_ids_are_stable_and_distinct(m, config):
+    thresholds = [_threshold(m, 100.0, "dup"), _threshold(m, 100.0, "dup")]
+    engine = m.AlertEngine([], thresholds, set())
+    ids = [t.id for t in thresholds]
+    assert all(ids) and ids[0] != ids[1]
+
+    # 未保存过 id 的旧配置在另一个进程 / 重启后得到相同的 id
+    again = [_threshold(m, 100.0, "dup"), _threshold(m, 100.0, "dup")]
+    m.AlertEngine([], again, set())
+    assert [t.id for t in again] == ids
+
+    # 两个重复阈值各自触发、互不覆盖
+    engine.evaluate(1, 150.0)
+    assert len(engine.evaluate(2, 90.0)) == 2
+
+
+def test_label_edit_keeps_trigger_state(m, config):
+    engine = m.AlertEngine([], [_threshold(m, 100.0, "old")], set())
+    engine.evaluate(1, 150.0)
+    assert len(engine.evaluate(2, 90.0)) == 1
+    (t,) = engine._thresholds.values()
+
+    engine.set_thresholds([_threshold(m, 100.0, "new", id=t.id)])
+    assert engine.triggered == {engine.threshold_id(t)}
+    assert engine.evaluate(3, 80.0) == []
+
+
+def test_client_without_ids_reuses_existing_ids(m, config):
+    engine = m.AlertEngine([], [_threshold(m, 100.0, "a"), _threshold(m, 200.0, "b", type="above")], set())
+    ids = {t.label: t.id for t in engine._thresholds.values()}
+    posted = [_threshold(m, 200.0, "b", type="above"), _threshold(m, 100.0, "a"), _threshold(m, 50.0, "c")]
+    engine.set_thresholds(posted)
+    assert posted[0].id == ids["b"] and posted[1].id == ids["a"]
+    assert posted[2].id not in ids.values()
+
+
+def test_config_triggered_flag_is_ignored_after_migration(m, config, monkeypatch, tmp_path):
+    rules_path = tmp_path / "alert_rules.json"
+    monkeypatch.setattr(m, "ALERT_RULES_PATH", rules_path)
+    config.alert_thresholds = [_threshold(m, 100.0, "a", triggered=True)]
+
+    # 首次迁移：没有 alert_rules.json，沿用配置中的触发状态
+    engine = m._load_alert_engine(config)
+    assert engine.triggered == {engine.threshold_id(config.alert_thresholds[0])}
+
+    # 迁移之后配置（或 UI 回传）中残留的 triggered 不再压制真实的下穿
+    rules_path.write_text('{"rules": [], "triggered": []}', encoding="utf-8")
+    engine = m._load_alert_engine(config)
+    assert engine.triggered == set()
+    engine.set_thresholds([_threshold(m, 100.0, "a", id=config.alert_thresholds[0].id, triggered=True)])
+    assert engine.triggered == set()
+    engine.evaluate(1, 150.0)
+    assert len(engine.evaluate(2, 90.0)) == 1
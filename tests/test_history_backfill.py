@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+PAGE_SIZE = 5
+TOTAL = 23
+BASE_TS = 1_700_000_000
+
+
+def _row(i):
+    ts = datetime.fromtimestamp(BASE_TS + i * 60, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {"timestamp": ts, "subnet_registration_cost": str((100 + i) * 10**9)}
+
+
+@pytest.fixture
+def backfill(m, config, monkeypatch):
+    config.history_requests_per_second = 0
+    config.history_fetch_retries = 2
+    config.circuit_failure_threshold = 100
+    monkeypatch.setattr(m, "TAOSTATS_HISTORY_PAGE_SIZE", PAGE_SIZE)
+    monkeypatch.setitem(m.upstream_health, "history", m.SourceHealth("history"))
+
+    sleep = asyncio.sleep
+
+    async def no_wait(delay, *args):
+        await sleep(0)
+
+    monkeypatch.setattr(m.asyncio, "sleep", no_wait)
+
+    def run(handler):
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await m._fetch_taostats_history_all(client)
+
+        return asyncio.run(go())
+
+    return run
+
+
+def _pages(request, rows):
+    page = int(request.url.params["page"])
+    total_pages = (len(rows) + PAGE_SIZE - 1) // PAGE_SIZE
+    data = rows[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+    return page, httpx.Response(200, json={"data": data, "pagination": {"total_pages": total_pages}})
+
+
+def test_backfill_merges_pages_in_order(m, backfill):
+    rows = [_row(i) for i in range(TOTAL)]
+    series, complete = backfill(lambda request: _pages(request, rows)[1])
+    assert complete
+    assert list(series.times) == [BASE_TS + i * 60 for i in range(TOTAL)]
+    assert series.price_tao[-1] == 100 + TOTAL - 1
+
+
+def test_backfill_drops_boundary_duplicates_and_merges_out_of_order_pages(m, backfill):
+    rows = [_row(i) for i in range(TOTAL)]
+    # 第 3 页重复第 2 页的最后一条；第 4 页整体早于前面的页（上游顺序异常）
+    pages = {p: rows[(p - 1) * PAGE_SIZE:p * PAGE_SIZE] for p in range(1, 6)}
+    pages[3] = [pages[2][-1], *pages[3]]
+    pages[4], pages[1] = pages[1], pages[4]
+
+    def handler(request):
+        page = int(request.url.params["page"])
+        return httpx.Response(200, json={"data": pages[page], "pagination": {"total_pages": 5}})
+
+    series, complete = backfill(handler)
+    assert complete
+    assert list(series.times) == [BASE_TS + i * 60 for i in range(TOTAL)]
+
+
+def test_failed_page_is_skipped_and_counted_once(m, backfill, monkeypatch):
+    rows = [_row(i) for i in range(TOTAL)]
+    attempts = {}
+    failures = []
+    upstream_failed = m._upstream_failed
+    monkeypatch.setattr(m, "_upstream_failed", lambda *args: (failures.append(args), upstream_failed(*args)))
+
+    def handler(request):
+        page, resp = _pages(request, rows)
+        attempts[page] = attempts.get(page, 0) + 1
+        if page == 2:
+            return httpx.Response(503)
+        if page == 3 and attempts[page] == 1:
+            return httpx.Response(502)  # 偶发失败，重试后成功
+        return resp
+
+    series, complete = backfill(handler)
+    assert not complete
+    assert attempts[2] == 3
+    assert len(series) == TOTAL - PAGE_SIZE
+    assert BASE_TS + 5 * 60 not in series.times
+    # 失败页的 3 次尝试只记一次上游失败，重试后成功的页不记失败
+    assert [source for source, _ in failures] == ["history"]
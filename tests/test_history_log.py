@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+
+def _record(m, i):
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+    return m.PriceRecord(timestamp=ts.isoformat(), price_rao=i * m.RAO_PER_TAO, price_tao=float(i), subnet_count=64)
+
+
+def _event(m, i, subnet_id):
+    ts = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i)
+    return m.SubnetEvent(timestamp=ts.isoformat(), subnet_id=subnet_id, event="new")
+
+
+def _prices(history):
+    return [r.price_tao for r in history.price_history]
+
+
+def test_replay_restores_appended_records(m, tmp_path):
+    log = m.HistoryLog(tmp_path / "history.log")
+    for i in range(1, 4):
+        log.append("price", _record(m, i))
+    log.append("event", _event(m, 2, 7))
+    log.close()
+
+    history = m.HistoryData()
+    assert m.HistoryLog(tmp_path / "history.log").replay(history) == 4
+    assert _prices(history) == [1.0, 2.0, 3.0]
+    assert [e.subnet_id for e in history.new_subnet_events] == [7]
+
+
+def test_replay_skips_records_already_in_snapshot_and_torn_lines(m, tmp_path):
+    path = tmp_path / "history.log"
+    log = m.HistoryLog(path)
+    for i in range(1, 4):
+        log.append("price", _record(m, i))
+    log.append("event", _event(m, 1, 5))
+    log.close()
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write('{"k":"price","timestamp":')  # 崩溃时只写了一半的行
+
+    history = m.HistoryData(price_history=[_record(m, 1), _record(m, 2)], new_subnet_events=[_event(m, 1, 5)])
+    assert m.HistoryLog(path).replay(history) == 1
+    assert _prices(history) == [1.0, 2.0, 3.0]
+    assert len(history.new_subnet_events) == 1
+
+
+def test_should_compact_after_compact_every_appends(m, tmp_path):
+    log = m.HistoryLog(tmp_path / "history.log", compact_every=3)
+    for i in range(1, 3):
+        log.append("price", _record(m, i))
+    assert not log.should_compact()
+    log.append("price", _record(m, 3))
+    assert log.should_compact()
+    log.rotate()
+    assert log.pending == 0
+    assert not log.should_compact()
+    log.close()
+
+
+def test_appends_during_compaction_are_kept(m, monkeypatch, tmp_path):
+    monkeypatch.setattr(m, "HISTORY_PATH", tmp_path / "history.json")
+    log = m.HistoryLog(tmp_path / "history.log")
+    history = m.HistoryData()
+    for i in range(1, 4):
+        record = _record(m, i)
+        history.price_history.append(record)
+        log.append("price", record)
+
+    log.rotate()
+    snapshot = history.model_copy(deep=True)
+    # 快照在线程中写入期间，新的轮询结果继续追加到新的日志文件
+    log.append("price", _record(m, 4))
+    log.compact(snapshot)
+    log.append("price", _record(m, 5))
+    log.close()
+
+    assert not log.rotated_path.exists()
+    loaded = m._load_history(m.HistoryLog(tmp_path / "history.log"))
+    assert _prices(loaded) == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_crash_before_compact_replays_rotated_log(m, monkeypatch, tmp_path):
+    monkeypatch.setattr(m, "HISTORY_PATH", tmp_path / "history.json")
+    log = m.HistoryLog(tmp_path / "history.log")
+    for i in range(1, 3):
+        log.append("price", _record(m, i))
+    log.rotate()
+    log.append("price", _record(m, 3))
+    log.close()
+    # 快照尚未写入就崩溃：改名后的日志与当前日志都要回放
+    assert log.rotated_path.exists()
+
+    loaded = m._load_history(m.HistoryLog(tmp_path / "history.log"))
+    assert _prices(loaded) == [1.0, 2.0, 3.0]
+
+    # 再次折叠时，遗留的 .compacting 日志与当前日志合并后一起写入快照
+    log = m.HistoryLog(tmp_path / "history.log")
+    log.rotate()
+    log.compact(loaded)
+    assert not log.rotated_path.exists()
+    assert _prices(m._load_history(m.HistoryLog(tmp_path / "history.log"))) == [1.0, 2.0, 3.0]
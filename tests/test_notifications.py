@@ -0,0 +1,53 @@
+import asyncio
+import sys
+import time
+
+import pytest
+
+
+def test_osascript_backend_only_on_macos(m, config, monkeypatch, tmp_path):
+    config.notification_backends = ["osascript", "file"]
+    config.notification_file = str(tmp_path / "notify.jsonl")
+    dispatcher = m.NotificationDispatcher()
+
+    monkeypatch.setattr(sys, "platform", "linux")
+    assert [type(b) for b in dispatcher._backends()] == [m.FileBackend]
+    monkeypatch.setattr(sys, "platform", "darwin")
+    assert [type(b) for b in dispatcher._backends()] == [m.OsascriptBackend, m.FileBackend]
+
+
+def test_worker_warns_when_no_backend_delivers(m, config, monkeypatch, caplog):
+    config.notification_backends = ["osascript"]
+    monkeypatch.setattr(sys, "platform", "linux")
+
+    async def run():
+        dispatcher = m.NotificationDispatcher()
+        dispatcher._deliveries = asyncio.Queue()
+        dispatcher._deliveries.put_nowait(("title", "message"))
+        task = asyncio.create_task(dispatcher._worker())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with caplog.at_level("INFO", logger=m.logger.name):
+        asyncio.run(run())
+    assert "通知未送达" in caplog.text
+    assert "通知已发送" not in caplog.text
+
+
+def test_timed_out_command_is_killed_and_reaped(m, monkeypatch):
+    monkeypatch.setattr(m, "NOTIFY_TIMEOUT", 0.2)
+    procs = []
+    create = asyncio.create_subprocess_exec
+
+    async def spy(*args, **kwargs):
+        proc = await create(*args, **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", spy)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(m._run_notify_command([sys.executable, "-c", "import time; time.sleep(30)"]))
+    assert time.monotonic() - start < 10
+    assert procs[0].returncode is not None
@@ -0,0 +1,57 @@
+from array import array
+
+import pytest
+from fastapi import HTTPException
+
+
+def _walk(m, times, start_ts, end_ts, limit):
+    """按游标逐页读取，返回每页的 (lo, hi)"""
+    pages, cursor = [], None
+    while True:
+        lo, hi, cursor = m._page_range(times, start_ts, end_ts, limit, cursor)
+        pages.append((lo, hi))
+        if cursor is None:
+            return pages
+
+
+def test_page_range_bounds(m):
+    times = array("q", [10, 20, 30, 40, 50])
+    assert m._page_range(times, 20, 40, None, None) == (1, 4, None)
+    assert m._page_range(times, 0, None, None, None) == (0, 5, None)
+    assert m._page_range(times, 60, None, None, None) == (5, 5, None)
+    assert m._page_range(times, 35, 31, None, None) == (3, 3, None)
+
+
+def test_cursor_pages_cover_range_once(m):
+    times = array("q", [10, 20, 20, 20, 30, 40, 40, 50])
+    pages = _walk(m, times, 15, 45, 2)
+    assert pages == [(1, 3), (3, 5), (5, 7)]
+    assert [i for lo, hi in pages for i in range(lo, hi)] == list(range(1, 7))
+
+
+def test_cursor_within_same_second(m):
+    times = array("q", [10, 20, 20, 20, 30])
+    lo, hi, cursor = m._page_range(times, 0, None, 2, None)
+    assert (lo, hi, cursor) == (0, 2, "20.1")
+    assert m._page_range(times, 0, None, 2, cursor) == (2, 4, "30.0")
+
+
+def test_cursor_survives_trim(m):
+    times = array("q", [10, 20, 30, 40, 50])
+    _, _, cursor = m._page_range(times, 0, None, 2, None)
+    assert cursor == "30.0"
+    del times[:1]  # 裁剪掉最旧的记录，游标仍指向同一条
+    lo, hi, _ = m._page_range(times, 0, None, 2, cursor)
+    assert list(times[lo:hi]) == [30, 40]
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "1.2.3", "x.1", ""])
+def test_invalid_cursor_rejected(m, cursor):
+    times = array("q", [10, 20])
+    if not cursor:
+        # 空游标视为首页
+        assert m._page_range(times, 0, None, 1, cursor)[:2] == (0, 1)
+        return
+    with pytest.raises(HTTPException) as exc:
+        m._page_range(times, 0, None, 1, cursor)
+    assert exc.value.status_code == 400
@@ -0,0 +1,34 @@
+import asyncio
+
+
+def test_flush_keys_writes_only_those_keys(m, tmp_path):
+    service = m.PersistenceService(debounce=3600)
+    config_path, history_path = tmp_path / "config.json", tmp_path / "history.json"
+    service.schedule(config_path, lambda: b"config")
+    service.schedule(history_path, lambda: b"history")
+
+    service.flush((config_path,))
+    assert config_path.read_bytes() == b"config"
+    assert not history_path.exists()
+    assert list(service._pending) == [history_path]
+
+    service.flush()
+    assert history_path.read_bytes() == b"history"
+    assert not service._pending
+
+
+def test_schedule_coalesces_writes(m, tmp_path):
+    service = m.PersistenceService(debounce=3600)
+    path = tmp_path / "config.json"
+    service.schedule(path, lambda: b"first")
+    service.schedule(path, lambda: b"second")
+    service.flush()
+    assert path.read_bytes() == b"second"
+
+
+def test_config_change_without_other_processes_does_not_flush(m, monkeypatch):
+    calls = []
+    monkeypatch.setattr(m.persistence, "flush", lambda *args: calls.append(args))
+    node = m.ClusterNode()
+    asyncio.run(node.config_changed())
+    assert calls == []
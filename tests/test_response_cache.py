@@ -0,0 +1,41 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(m, config, monkeypatch):
+    monkeypatch.setattr(m.state, "history", m.HistoryData())
+    monkeypatch.setattr(m.state, "history_index", m.HistoryIndex(m.state.history))
+    m.response_cache.invalidate()
+    yield TestClient(m.app)
+    m.response_cache.invalidate()
+
+
+def test_not_modified_only_for_cached_key(client):
+    first = client.get("/api/history?hours=24")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert client.get("/api/history?hours=24", headers={"If-None-Match": etag}).status_code == 304
+
+    # 其他查询参数的 ETag 不同；即使带上当前 ETag，无效请求也返回错误而不是 304
+    assert client.get("/api/history?hours=12").headers["etag"] != etag
+    bad = client.get("/api/history?hours=24&cursor=garbage", headers={"If-None-Match": etag})
+    assert bad.status_code == 400
+
+
+def test_not_modified_requires_cached_entry(m, client):
+    etag = client.get("/api/history?hours=24").headers["etag"]
+    m.response_cache.invalidate()
+    assert client.get("/api/history?hours=24", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_relative_window_expires_with_poll_interval(m, client, config, monkeypatch):
+    now = 1_700_000_000.0
+    monkeypatch.setattr(m.time, "time", lambda: now)
+    etag = client.get("/api/history?hours=24").headers["etag"]
+    absolute = client.get("/api/history?from=0").headers["etag"]
+
+    # 数据版本不变（如上游中断），但已过一个轮询间隔：相对窗口重新计算，绝对区间仍可复用
+    now += config.poll_interval_seconds
+    assert client.get("/api/history?hours=24", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/history?from=0", headers={"If-None-Match": absolute}).status_code == 304
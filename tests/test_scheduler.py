@@ -0,0 +1,61 @@
+import pytest
+
+
+def _job(m, interval=60.0, source="stats"):
+    async def run(_client):
+        return True
+
+    return m.PollJob("test", source, run, lambda: interval)
+
+
+@pytest.fixture
+def health(m, monkeypatch):
+    h = m.SourceHealth("stats")
+    monkeypatch.setitem(m.upstream_health, "stats", h)
+    return h
+
+
+def test_success_delay_is_jittered_interval(m, config, health):
+    job = _job(m, interval=60.0)
+    for _ in range(100):
+        assert 60.0 * (1 - config.poll_jitter) <= m.scheduler.next_delay(job, True) <= 60.0 * (1 + config.poll_jitter)
+
+
+def test_failure_backoff_grows_and_is_capped(m, config, health):
+    job = _job(m)
+    for failures in range(1, 12):
+        job.failures = failures
+        expected = min(config.poll_backoff_max_seconds, m.POLL_BACKOFF_BASE * 2 ** (failures - 1))
+        for _ in range(20):
+            assert expected * 0.5 <= m.scheduler.next_delay(job, False) <= expected
+
+
+def test_failure_delay_honours_retry_after(m, config, health):
+    job = _job(m)
+    job.failures = 1
+    health.retry_after = 120.0
+    assert m.scheduler.next_delay(job, False) >= 120.0
+
+
+def test_failure_delay_waits_for_open_circuit(m, config, health):
+    job = _job(m)
+    for _ in range(config.circuit_failure_threshold):
+        health.failure()
+    assert health.circuit == "open"
+    job.failures = 1
+    assert m.scheduler.next_delay(job, False) >= config.circuit_reset_seconds - 1
+
+
+def test_job_without_source(m, config):
+    job = _job(m, source=None)
+    job.failures = 2
+    assert m.POLL_BACKOFF_BASE <= m.scheduler.next_delay(job, False) <= m.POLL_BACKOFF_BASE * 2
+
+
+@pytest.mark.parametrize("failures", [1025, 10**6])
+def test_failure_backoff_does_not_overflow(m, config, health, failures):
+    # 上游连续失败数天（如 API key 被吊销）后退避仍停留在上限，不会抛出 OverflowError
+    job = _job(m)
+    job.failures = failures
+    delay = m.scheduler.next_delay(job, False)
+    assert config.poll_backoff_max_seconds * 0.5 <= delay <= config.poll_backoff_max_seconds
@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def data_dir(m, monkeypatch, tmp_path):
+    for name in ("HISTORY_PATH", "HISTORY_LOG_PATH", "HISTORICAL_CACHE_PATH", "LEGACY_HISTORICAL_CACHE_PATH",
+                 "ROLLUPS_PATH", "SQLITE_PATH"):
+        monkeypatch.setattr(m, name, tmp_path / getattr(m, name).name)
+    return tmp_path
+
+
+def _write_json_storage(m, n=10):
+    now = datetime.now(timezone.utc)
+    records = [
+        m.PriceRecord(
+            timestamp=(now - timedelta(minutes=n - i)).isoformat(),
+            price_rao=(100 + i) * m.RAO_PER_TAO,
+            price_tao=100.0 + i,
+            subnet_count=64,
+        )
+        for i in range(n)
+    ]
+    m._save_history(m.HistoryData(price_history=records))
+    legacy = [{"timestamp": r.timestamp, "price_rao": r.price_rao} for r in records]
+    m.LEGACY_HISTORICAL_CACHE_PATH.write_text(json.dumps(legacy), encoding="utf-8")
+
+
+def _files(path):
+    return {p.name: p.stat().st_mtime_ns for p in path.iterdir()}
+
+
+def test_follower_does_not_import_or_migrate(m, config, data_dir):
+    _write_json_storage(m)
+    store = m.SqliteStore(m.SQLITE_PATH)
+    before = _files(data_dir)
+
+    history, cache, _, _ = m._load_storage(store, config, migrate=False)
+    assert len(history.price_history) == 10
+    assert len(cache) == 10
+    assert store.is_empty()
+    assert not m.HISTORICAL_CACHE_PATH.exists()
+    assert not m.persistence._pending
+    after = _files(data_dir)
+    assert {k: v for k, v in after.items() if k in before} == before
+
+
+def test_leader_imports_json_into_sqlite(m, config, data_dir):
+    _write_json_storage(m)
+    store = m.SqliteStore(m.SQLITE_PATH)
+    history, cache, _, _ = m._load_storage(store, config, migrate=True)
+    assert not store.is_empty()
+    assert len(history.price_history) == 10
+    assert store.historical_count == 10
+    m.persistence.flush()
+    assert m.HISTORICAL_CACHE_PATH.exists()